@@ -73,6 +73,13 @@ log = logging.getLogger(__name__)
     "These must match what the config in the spec repo contains."
     "Ex: 'apigentools -av v1 -av v2 test' (Default: None to run all)",
 )
+@click.option(
+    "--reuse-containers",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_REUSE_CONTAINERS", False, __type=bool),
+    help="Run configured commands with `docker exec` in one long-lived container "
+    + "per image and environment instead of a new container for every command",
+)
 @click.option(
     "--skip-version-check",
     is_flag=True,
@@ -3,10 +3,15 @@
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2019-Present Datadog, Inc.
 import abc
+import contextlib
 import glob
 import logging
 import os
+import signal
 import subprocess
+import sys
+import threading
+import time
 
 import chevron
 
@@ -17,6 +22,8 @@ from apigentools.utils import (
     change_cwd,
     fmt_cmd_out_for_log,
     get_full_spec_file_name,
+    get_full_spec_file_name_for_format,
+    get_full_spec_format,
     glob_re,
     run_command,
     check_for_legacy_config,
@@ -28,6 +35,8 @@ log = logging.getLogger(__name__)
 def run_command_with_config(command_class, click_ctx, **kwargs):
     click_ctx.obj.update(kwargs)
     cmd = command_class({}, click_ctx.obj)
+    if click_ctx.obj.get("reuse_containers"):
+        cmd.container_sessions = ContainerSessions()
 
     with change_cwd(click_ctx.obj.get("spec_repo_dir")):
         configfile = os.path.join(
@@ -38,7 +47,8 @@ def run_command_with_config(command_class, click_ctx, **kwargs):
         except OSError:
             check_for_legacy_config(click_ctx, configfile)
         try:
-            click_ctx.exit(cmd.run())
+            with cmd.container_sessions or contextlib.nullcontext():
+                click_ctx.exit(cmd.run())
         except errors.ApigentoolsError as e:
             log.error("Apigentools error: %s", e)
         except subprocess.CalledProcessError as e:
@@ -47,10 +57,159 @@ def run_command_with_config(command_class, click_ctx, **kwargs):
             click_ctx.exit(1)
 
 
+def _exit_on_sigterm(signum, frame):
+    sys.exit(128 + signum)
+
+
+class ContainerSessions:
+    """Long-lived containers to run commands in with ``docker exec`` instead of
+    starting a new container for every command. One container is started for
+    every combination of image ID, environment and ``docker run`` options, so
+    images rebuilt under the same name get a new container.
+
+    The containers are kept running with ``tail -f /dev/null``; images that
+    don't provide ``tail`` (or aren't available locally yet) aren't kept running
+    and their commands run in new containers as usual.
+
+    Use as a context manager, all started containers are removed on exit, including
+    exit caused by ``KeyboardInterrupt`` or ``SIGTERM``. Containers belong to the
+    process that started them, so copies sent to other processes start empty.
+    """
+
+    def __init__(self):
+        # (image ID, environment, options, cwd) -> container name or ``None``
+        # if the image can't be kept running
+        self.containers = {}
+        # image name -> ID of the image the last container was started from
+        self.image_ids = {}
+        self._previous_sigterm_handler = None
+
+    def __getstate__(self):
+        return {"containers": {}, "image_ids": {}, "_previous_sigterm_handler": None}
+
+    def __enter__(self):
+        if threading.current_thread() is threading.main_thread():
+            self._previous_sigterm_handler = signal.signal(
+                signal.SIGTERM, _exit_on_sigterm
+            )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        finally:
+            if self._previous_sigterm_handler is not None:
+                signal.signal(signal.SIGTERM, self._previous_sigterm_handler)
+                self._previous_sigterm_handler = None
+
+    def get_image_id(self, image):
+        """Get ID of a local image
+
+        :param image: Name of the image
+        :type image: ``str``
+        :return: ID of the image or ``None`` if it's not available locally
+        :rtype: ``str`` or ``NoneType``
+        """
+        try:
+            res = run_command(
+                ["docker", "image", "inspect", "--format", "{{.Id}}", image]
+            )
+        except subprocess.CalledProcessError:
+            return None
+        return res.stdout.strip()
+
+    def get_container(self, image, environment, docker_run_options=None):
+        """Get name of container to run commands in, starting it if needed
+
+        :param image: Image of the container
+        :type image: ``str``
+        :param environment: Environment variables of the container
+        :type environment: ``dict``
+        :param docker_run_options: Additional options for ``docker run``
+        :type docker_run_options: ``list`` of ``str`` or ``NoneType``
+        :return: Name of the container or ``None`` if the command should run
+            in a new container
+        :rtype: ``str`` or ``NoneType``
+        """
+        image_id = self.get_image_id(image)
+        if image_id is None:
+            # "docker run" pulls the image, the next command gets a container
+            return None
+        if self.image_ids.get(image, image_id) != image_id:
+            # the image was rebuilt, containers of the old one aren't needed anymore
+            self.remove_containers(self.image_ids[image])
+        self.image_ids[image] = image_id
+
+        key = (
+            image_id,
+            tuple(sorted(environment.items())),
+            tuple(docker_run_options or ()),
+            os.getcwd(),
+        )
+        if key not in self.containers:
+            name = "apigentools-session-{}-{}".format(os.getpid(), time.time())
+            log.info("Starting container %s from image %s", name, image)
+            cmd = [
+                "docker",
+                "run",
+                "--detach",
+                "--rm",
+                "--name",
+                name,
+                "-v",
+                "{}:{}".format(os.getcwd(), "/tmp/spec-repo"),
+                # keep the container running until it's removed
+                "--entrypoint",
+                "tail",
+            ]
+            for k, v in environment.items():
+                cmd.extend(["-e", "{}={}".format(k, v)])
+            cmd.extend(docker_run_options or [])
+            cmd.extend([image_id, "-f", "/dev/null"])
+            try:
+                run_command(cmd)
+                self.containers[key] = name
+            except subprocess.CalledProcessError:
+                log.warning(
+                    "Can't keep container of image %s running (does it provide "
+                    "'tail'?), running its commands in new containers",
+                    image,
+                )
+                self.containers[key] = None
+        return self.containers[key]
+
+    def remove_containers(self, image_id):
+        """Remove containers started from given image
+
+        :param image_id: ID of the image
+        :type image_id: ``str``
+        """
+        for key in [k for k in self.containers if k[0] == image_id]:
+            self._remove_container(self.containers.pop(key))
+
+    def _remove_container(self, name):
+        if name is None:
+            return
+        log.info("Removing container %s", name)
+        try:
+            run_command(["docker", "rm", "--force", name])
+        except subprocess.CalledProcessError:
+            log.warning("Failed removing container %s", name)
+
+    def close(self):
+        """Remove all started containers"""
+        while self.containers:
+            _, name = self.containers.popitem()
+            self._remove_container(name)
+        self.image_ids.clear()
+
+
 class Command(abc.ABC):
     def __init__(self, config, args):
         self.config = config
         self.args = args
+        # if set, commands run in long-lived containers with `docker exec`
+        self.container_sessions = None
 
     def yield_lang_version(self, languages=None, versions=None):
         languages = set(
@@ -65,8 +224,21 @@ class Command(abc.ABC):
             for version in sorted(versions & allowed_versions):
                 yield language, version
 
+    def get_full_spec_format(self):
+        """Get format of full spec files to write
+
+        :return: ``"json"`` or ``"yaml"``
+        :rtype: ``str``
+        """
+        return self.args.get("full_spec_format") or get_full_spec_format(
+            self.args.get("full_spec_file")
+        )
+
     def yield_lang_version_specfile(self, languages=None, versions=None):
         """Yield valid combinations of (language, version, specfile)."""
+        full_spec_file = get_full_spec_file_name_for_format(
+            self.args.get("full_spec_file"), self.get_full_spec_format()
+        )
         for language, version in self.yield_lang_version(languages, versions):
             language_config = self.config.get_language_config(language)
             spec_version_dir = os.path.join(constants.SPEC_REPO_SPEC_DIR, version)
@@ -74,13 +246,57 @@ class Command(abc.ABC):
                 language
                 if language_config.spec_sections_for(version)
                 != self.config.spec_sections_for(version)
+                or language_config.operation_filter_for(version) is not None
                 else None
             )
             yield language, version, os.path.join(
                 spec_version_dir,
-                get_full_spec_file_name(self.args.get("full_spec_file"), suffix),
+                get_full_spec_file_name(full_spec_file, suffix),
             )
 
+    def get_full_spec_variants(self, languages=None, versions=None):
+        """Get all full spec files to write, grouped by spec version
+
+        :return: Mapping of spec versions to mappings of full spec file paths to
+            spec sections to merge into them
+        :rtype: ``dict``
+        """
+        variants = {}
+        for language, version, fs_file in self.yield_lang_version_specfile(
+            languages, versions
+        ):
+            variants.setdefault(version, {}).setdefault(
+                fs_file,
+                self.config.get_language_config(language).spec_sections_for(version),
+            )
+        return variants
+
+    def get_operation_filters(self, languages=None, versions=None):
+        """Get filters of operations to apply to full spec files
+
+        :return: Mapping of full spec file paths to filters of operations (as dicts)
+        :rtype: ``dict``
+        """
+        operation_filters = {}
+        for language, version, fs_file in self.yield_lang_version_specfile(
+            languages, versions
+        ):
+            language_config = self.config.get_language_config(language)
+            operation_filter = language_config.operation_filter_for(version)
+            if operation_filter is not None:
+                operation_filters[fs_file] = operation_filter.dict()
+        return operation_filters
+
+    def get_cache_dir(self):
+        """Get directory for caching artifacts between runs
+
+        :return: Path to the cache directory or ``None`` if caching is disabled
+        :rtype: ``str`` or ``NoneType``
+        """
+        if self.args.get("no_cache"):
+            return None
+        return constants.SPEC_REPO_CACHE_DIR
+
     def setup_git_config(self, cwd=None):
         """Update git config for this repository to use the provided author's email/name.
 
@@ -180,7 +396,6 @@ class Command(abc.ABC):
                         ["docker", "build", context, "-t", image_name, "-f", dockerfile]
                     )
                 image = image_name
-            # dockerize
             workdir = os.path.join(
                 "/tmp/spec-repo",
                 cwd,
@@ -189,6 +404,18 @@ class Command(abc.ABC):
                     chevron_vars,
                 ),
             )
+            container = None
+            if self.container_sessions is not None and to_run:
+                container = self.container_sessions.get_container(
+                    image, additional_env, docker_run_options
+                )
+            if container is not None:
+                run_command(
+                    ["docker", "exec", "--workdir", workdir, container] + to_run,
+                    **run_command_args
+                )
+                return
+            # dockerize
             dockerized = [
                 "docker",
                 "run",
@@ -3,13 +3,17 @@
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2019-Present Datadog, Inc.
 import collections
+import concurrent.futures
+import contextlib
 import copy
 import datetime
+import hashlib
 import json
 import logging
 import os
 import re
 import subprocess
+import tempfile
 
 import chevron
 import click
@@ -17,20 +21,76 @@ import click
 from apigentools import __version__, constants
 from apigentools.commands.command import Command, run_command_with_config
 from apigentools.commands.templates import TemplatesCommand
+from apigentools.config import (
+    ConfigCommand,
+    ContainerImageBuild,
+    FunctionArgument,
+    PathRelativeTo,
+)
 from apigentools.constants import GENERATION_BLACKLIST_FILENAME
 from apigentools.utils import (
+    directory_digest,
+    fmt_cmd_out_for_log,
     get_current_commit,
     run_command,
-    write_full_spec,
+    set_log,
+    set_log_level,
+    write_full_specs,
     env_or_val,
     change_cwd,
 )
 
 log = logging.getLogger(__name__)
 
+# generate command of a worker process, see ``_init_generate_worker``
+_worker_command = None
+
 REPO_SSH_URL = "git@github.com:{}/{}.git"
 REPO_HTTPS_URL = "https://{}github.com/{}/{}.git"
 
+# options of "openapi-generator generate" and their keys in "openapi-generator batch" configs
+BATCH_CONFIG_OPTIONS = {
+    "-c": "!include",
+    "--config": "!include",
+    "-g": "generatorName",
+    "--generator-name": "generatorName",
+    "--http-user-agent": "httpUserAgent",
+    "-i": "inputSpec",
+    "--input-spec": "inputSpec",
+    "-o": "outputDir",
+    "--output": "outputDir",
+    "-t": "templateDir",
+    "--template-dir": "templateDir",
+}
+# options taking comma separated "key=value" pairs
+BATCH_CONFIG_MAP_OPTIONS = {
+    "-p": "additionalProperties",
+    "--additional-properties": "additionalProperties",
+    "--import-mappings": "importMappings",
+    "--instantiation-types": "instantiationTypes",
+    "--type-mappings": "typeMappings",
+}
+
+
+def _parse_batch_map_option(value):
+    """Parse value of an option taking comma separated ``key=value`` pairs
+
+    :param value: Value of the option, e.g. ``object=interface{},any=interface{}``
+    :type value: ``str``
+    :return: Mapping of the keys to values or ``None`` if the value can't be split
+        into pairs unambiguously (e.g. a value contains a comma)
+    :rtype: ``dict`` or ``NoneType``
+    """
+    mapping = {}
+    for item in value.split(","):
+        k, sep, v = item.partition("=")
+        # the item is a part of the previous value if it doesn't contain "=" or
+        # a quoted value isn't closed within it
+        if not sep or not k or (v[:1] in ("'", '"') and (len(v) < 2 or v[-1] != v[0])):
+            return None
+        mapping[k] = v
+    return mapping
+
 
 @click.command()
 @click.option(
@@ -59,6 +119,16 @@ REPO_HTTPS_URL = "https://{}github.com/{}/{}.git"
     + "Note that if some languages override config's spec_sections, additional "
     + "files will be generated with name pattern 'full_spec.<lang>.yaml'",
 )
+@click.option(
+    "--full-spec-format",
+    type=click.Choice(
+        [constants.FULL_SPEC_FORMAT_JSON, constants.FULL_SPEC_FORMAT_YAML]
+    ),
+    default=env_or_val("APIGENTOOLS_FULL_SPEC_FORMAT", None),
+    help="Format of the full spec files to write (default: based on extension of the "
+    + "full spec file). With 'json', '.yaml' extension of the full spec file is replaced "
+    + "by '.json'",
+)
 @click.option(
     "--additional-stamp",
     multiple=True,
@@ -90,18 +160,107 @@ REPO_HTTPS_URL = "https://{}github.com/{}/{}.git"
     default=False,
     help="Delete generated files in output_dir before generation",
 )
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_NO_CACHE", False, __type=bool),
+    help="Don't reuse results of previous runs stored in .apigentools-cache (merged full specs, parsed spec sections, patched templates) "
+    + "and regenerate languages/versions even if their inputs didn't change",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=env_or_val("APIGENTOOLS_JOBS", 1, __type=int),
+    help="Number of parallel jobs to use, e.g. for parsing spec sections and "
+    + "generating clients for multiple languages/versions (default: 1)",
+)
+@click.option(
+    "--batch",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_BATCH", False, __type=bool),
+    help="Generate all languages/versions that use the 'openapi_generator_generate' "
+    + "function with the same container options by a single 'openapi-generator batch' run",
+)
 @click.option(
     "--filter-sections",
     help="Specify spec sections to filter out from the output",
     default=env_or_val("APIGENTOOLS_FILTER_SECTIONS", (), __type=list),
     multiple=True,
 )
+@click.option(
+    "--prune-components",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_PRUNE_COMPONENTS", False, __type=bool),
+    help="Remove components that aren't referenced from paths of the full spec files, "
+    + "neither directly nor through other components",
+)
 @click.pass_context
 def generate(ctx, **kwargs):
     """Generate client code"""
     run_command_with_config(GenerateCommand, ctx, **kwargs)
 
 
+def _init_generate_worker(cmd, log_level):
+    """Set up a worker process generating languages/versions
+
+    Workers started with the ``spawn`` start method don't inherit log handlers
+    configured by the main process, so they're configured again here. The command
+    is only sent once per worker instead of with every job.
+
+    :param cmd: The generate command
+    :type cmd: ``GenerateCommand``
+    :param log_level: Log level of the main process
+    :type log_level: ``int``
+    """
+    global _worker_command
+    _worker_command = cmd
+    toplog = logging.getLogger(__name__.split(".")[0])
+    if not toplog.handlers:
+        set_log(toplog)
+    set_log_level(toplog, log_level)
+
+
+def _generate_language_version_job(language, version, input_spec):
+    """Generate client code for one language/version in a worker process
+    set up by ``_init_generate_worker``
+
+    All log messages of the job are prefixed with ``[<language>/<version>]``, so that
+    logs of jobs running in parallel can be told apart.
+
+    :param language: Language to generate
+    :type language: ``str``
+    :param version: Version to generate
+    :type version: ``str``
+    :param input_spec: Path to the full spec file to generate from
+    :type input_spec: ``str``
+    :return: Return code (``0`` on success) and fingerprint of generation inputs,
+        see ``GenerateCommand.generate_language_version``
+    :rtype: ``tuple``
+    """
+    prefix = "[{l}/{v}] ".format(l=language, v=version)
+    factory = logging.getLogRecordFactory()
+
+    def prefixed_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.msg = prefix + str(record.msg)
+        return record
+
+    logging.setLogRecordFactory(prefixed_factory)
+    cmd = _worker_command
+    try:
+        # containers started by the main process aren't shared with workers
+        with cmd.container_sessions or contextlib.nullcontext():
+            return cmd.generate_language_version(language, version, input_spec)
+    except subprocess.CalledProcessError as e:
+        # output of the process is lost when the error is sent to the main process
+        log.error("Failed running subprocess: %s", e.cmd)
+        log.error(fmt_cmd_out_for_log(e, False))
+        raise
+    finally:
+        logging.setLogRecordFactory(factory)
+
+
 class GenerateCommand(Command):
     __cached_codegen_version = None
     # NOTE: update docs/spec_repo.md when changing this
@@ -139,7 +298,9 @@ class GenerateCommand(Command):
 
         return inner
 
-    def run_language_commands(self, language, version, cwd, chevron_vars=None):
+    def run_language_commands(
+        self, language, version, cwd, chevron_vars=None, commands=None
+    ):
         """Runs commands specified in language settings for given language and phase
 
         :param language: Language to run commands for
@@ -150,9 +311,12 @@ class GenerateCommand(Command):
         :type cwd: ``str``
         :param chevron_vars: Placeholders to replace in command
         :type chevron_vars: ``dict``
+        :param commands: Commands to run instead of all commands of the language/version
+        :type commands: ``list`` of ``ConfigCommand`` or ``NoneType``
         """
         lc = self.config.get_language_config(language)
-        commands = lc.commands_for(version)
+        if commands is None:
+            commands = lc.commands_for(version)
         log.info("Running commands for %s/%s", language, version)
 
         use_builtin_templates = not bool(lc.templates_config_for(version))
@@ -210,13 +374,13 @@ class GenerateCommand(Command):
             stamp + ("spec repo commit {commit}".format(commit=spec_repo_commit),)
         return "; ".join(stamp + (self.args.get("additional_stamp", ())))
 
-    def write_dot_apigentools_info(self, language_config, version):
-        """Write a record for language/version in .apigentools-info file in the top-level directory of the language
+    def read_dot_apigentools_info(self, language_config):
+        """Read .apigentools-info file in the top-level directory of the language
 
-        :param language_config: Config of language to write .apigentools-info for
+        :param language_config: Config of language to read .apigentools-info for
         :type language: ``LanguageConfig``
-        :param version: Version to write .apigentools-info record for
-        :type version: ``str``
+        :return: Content of the file, empty if it doesn't exist or is outdated
+        :rtype: ``dict``
         """
         outfile = os.path.join(language_config.generated_lang_dir, ".apigentools-info")
         loaded = {}
@@ -229,6 +393,20 @@ class GenerateCommand(Command):
                 if str(loaded.get("info_version")) == "1":
                     log.info("Detected .apigentools-info version 1, will rewrite")
                     loaded = {}
+        return loaded
+
+    def write_dot_apigentools_info(self, language_config, version, fingerprint=None):
+        """Write a record for language/version in .apigentools-info file in the top-level directory of the language
+
+        :param language_config: Config of language to write .apigentools-info for
+        :type language: ``LanguageConfig``
+        :param version: Version to write .apigentools-info record for
+        :type version: ``str``
+        :param fingerprint: Fingerprint of inputs the language/version was generated from
+        :type fingerprint: ``str`` or ``NoneType``
+        """
+        outfile = os.path.join(language_config.generated_lang_dir, ".apigentools-info")
+        loaded = self.read_dot_apigentools_info(language_config)
 
         info = {
             "additional_stamps": self.args.get("additional_stamp"),
@@ -241,8 +419,107 @@ class GenerateCommand(Command):
             "regenerated": str(datetime.datetime.utcnow()),
             "spec_repo_commit": get_current_commit("."),
         }
-        with open(outfile, "w") as f:
+        if fingerprint is not None:
+            loaded["spec_versions"][version]["input_fingerprint"] = fingerprint
+        # write to a temporary file first, so that jobs generating other versions
+        # of the language never see a partially written file
+        tmpfile = "{}.{}.tmp".format(outfile, os.getpid())
+        with open(tmpfile, "w") as f:
             json.dump(loaded, f, indent=4)
+        os.replace(tmpfile, outfile)
+
+    def get_input_fingerprint(self, language, version, input_spec):
+        """Compute fingerprint of all inputs of generation of language/version
+
+        The fingerprint covers content of the full spec file, the templates tree,
+        the language config file, the rendered command lines including their
+        container options and the apigentools version.
+
+        :param language: Language to compute the fingerprint for
+        :type language: ``str``
+        :param version: Version to compute the fingerprint for
+        :type version: ``str``
+        :param input_spec: Path to the full spec file to generate from
+        :type input_spec: ``str``
+        :return: Hex digest of the fingerprint
+        :rtype: ``str``
+        """
+        language_config = self.config.get_language_config(language)
+        chevron_vars = language_config.chevron_vars_for(version, input_spec)
+        chevron_vars["cwd"] = language_config.generated_lang_version_dir_for(version)
+
+        commands = []
+        for command in language_config.commands_for(version) or []:
+            # rendering modifies function arguments in place, so render a copy
+            commandline = self._render_command_args(
+                copy.deepcopy(command.commandline), chevron_vars
+            )
+            container_opts = command.container_opts
+            image = container_opts.image if container_opts else None
+            if isinstance(image, ContainerImageBuild):
+                image = self._render_command_args(image.dict(), chevron_vars)
+            commands.append(
+                {
+                    "commandline": [
+                        part.dict() if isinstance(part, FunctionArgument) else part
+                        for part in commandline
+                    ],
+                    "container_opts": container_opts.dict() if container_opts else None,
+                    "image": image,
+                }
+            )
+
+        fingerprint = hashlib.sha256()
+        fingerprint.update(
+            json.dumps(
+                {"apigentools_version": __version__, "commands": commands},
+                sort_keys=True,
+                default=str,
+            ).encode("utf-8")
+        )
+        with open(input_spec, "rb") as f:
+            fingerprint.update(hashlib.sha256(f.read()).digest())
+        language_config_file = os.path.join(
+            constants.SPEC_REPO_CONFIG_DIR,
+            constants.SPEC_REPO_LANGUAGES_CONFIG_DIR,
+            "{lang}_{v}.json".format(lang=language, v=version),
+        )
+        if os.path.exists(language_config_file):
+            with open(language_config_file, "rb") as f:
+                fingerprint.update(hashlib.sha256(f.read()).digest())
+        templates_dir = os.path.join(
+            constants.SPEC_REPO_TEMPLATES_DIR, language, version
+        )
+        if language_config.templates_config_for(version) and os.path.isdir(
+            templates_dir
+        ):
+            fingerprint.update(directory_digest(templates_dir).encode("utf-8"))
+        return fingerprint.hexdigest()
+
+    def is_up_to_date(self, language, version, fingerprint):
+        """Check whether language/version was already generated from the same inputs
+
+        :param language: Language to check
+        :type language: ``str``
+        :param version: Version to check
+        :type version: ``str``
+        :param fingerprint: Fingerprint of the current generation inputs
+        :type fingerprint: ``str``
+        :return: Whether the fingerprint recorded in .apigentools-info matches
+        :rtype: ``bool``
+        """
+        if self.args.get("no_cache") or self.args.get("delete_generated_files"):
+            return False
+        language_config = self.config.get_language_config(language)
+        if not os.path.isdir(language_config.generated_lang_version_dir_for(version)):
+            return False
+        recorded = (
+            self.read_dot_apigentools_info(language_config)
+            .get("spec_versions", {})
+            .get(version, {})
+            .get("input_fingerprint")
+        )
+        return recorded == fingerprint
 
     def run(self):
         info = collections.defaultdict(dict)
@@ -250,34 +527,29 @@ class GenerateCommand(Command):
 
         # first, generate full spec for all major versions of the API
         filter_sections = frozenset(self.args.get("filter_sections", ()))
+        for version, variants in self.get_full_spec_variants().items():
+            write_full_specs(
+                constants.SPEC_REPO_SPEC_DIR,
+                version,
+                variants,
+                filter_sections,
+                jobs=self.args.get("jobs", 1),
+                cache_dir=self.get_cache_dir(),
+                full_spec_format=self.get_full_spec_format(),
+                operation_filters=self.get_operation_filters(),
+                prune_components=self.args.get("prune_components", False),
+            )
         for language, version, fs_file in self.yield_lang_version_specfile():
             info[language][version] = fs_file
-
             if fs_file in fs_files:
                 log.info(f"Reuse {fs_file} for {language} and {version}")
                 continue
             fs_files.add(fs_file)
-
-            # Generate full spec file is needed
-            write_full_spec(
-                constants.SPEC_REPO_SPEC_DIR,
-                version,
-                self.config.get_language_config(language).spec_sections_for(version),
-                fs_file,
-                filter_sections,
-            )
             log.info(f"Generated {fs_file} for {language}/{version}")
 
         pull_repo = self.args.get("clone_repo")
-
-        # now, for each language generate a client library for every major version that is explicitly
-        # listed in its settings (meaning that we can have languages that don't support all major
-        # API versions)
-        for language, versions in info.items():
+        for language in info:
             language_config = self.config.get_language_config(language)
-            general_chevron_vars = language_config.chevron_vars_for()
-            general_chevron_vars["stamp"] = self.get_stamp()
-
             # Clone the language target repo into the output directory
             if pull_repo:
                 self.pull_repository(language_config, branch=self.args.get("branch"))
@@ -285,39 +557,336 @@ class GenerateCommand(Command):
             if self.args.get("delete_generated_files"):
                 self.remove_generated_files(language_config)
 
-            for version, input_spec in versions.items():
-                if self.args.get("skip_templates"):
+        # now, for each language generate a client library for every major version that is explicitly
+        # listed in its settings (meaning that we can have languages that don't support all major
+        # API versions)
+        targets = [
+            (language, version, input_spec)
+            for language, versions in info.items()
+            for version, input_spec in versions.items()
+        ]
+        if self.args.get("batch"):
+            retval = self.generate_targets_batch(targets, self.args.get("jobs", 1))
+        else:
+            retval = self.generate_targets(targets, self.args.get("jobs", 1))
+        if retval != 0:
+            return retval
+
+        for language in info:
+            language_config = self.config.get_language_config(language)
+            self.render_downstream_templates(
+                language_config, language_config.chevron_vars_for()
+            )
+
+        return 0
+
+    def prepare_language_version(self, language, version, input_spec):
+        """Prepare templates of language/version and check whether it needs generating
+
+        :param language: Language to prepare
+        :type language: ``str``
+        :param version: Version to prepare
+        :type version: ``str``
+        :param input_spec: Path to the full spec file to generate from
+        :type input_spec: ``str``
+        :return: Return code (``0`` on success) and fingerprint of generation inputs
+            (``None`` if the language/version is up to date)
+        :rtype: ``tuple``
+        """
+        if self.args.get("skip_templates"):
+            log.info(
+                "Skipping templates processing for {}/{}".format(language, version)
+            )
+        else:
+            tpl_cmd_args = copy.deepcopy(self.args)
+            tpl_cmd_args["languages"] = [language]
+            tpl_cmd_args["api_versions"] = [version]
+            template_cmd = TemplatesCommand(self.config, tpl_cmd_args)
+            retval = template_cmd.run()
+            if retval != 0:
+                return retval, None
+        fingerprint = self.get_input_fingerprint(language, version, input_spec)
+        if self.is_up_to_date(language, version, fingerprint):
+            log.info("%s/%s is up to date, skipping generation", language, version)
+            return 0, None
+        return 0, fingerprint
+
+    def generate_language_version(self, language, version, input_spec):
+        """Generate client code for one language/version
+
+        :param language: Language to generate
+        :type language: ``str``
+        :param version: Version to generate
+        :type version: ``str``
+        :param input_spec: Path to the full spec file to generate from
+        :type input_spec: ``str``
+        :return: Return code (``0`` on success) and fingerprint of generation inputs
+            to record in .apigentools-info (``None`` if the language/version is up to
+            date and nothing was generated)
+        :rtype: ``tuple``
+        """
+        retval, fingerprint = self.prepare_language_version(
+            language, version, input_spec
+        )
+        if retval != 0 or fingerprint is None:
+            return retval, None
+        log.info("Generation in %s/%s", language, version)
+        language_config = self.config.get_language_config(language)
+        version_output_dir = language_config.generated_lang_version_dir_for(version)
+        os.makedirs(version_output_dir, exist_ok=True)
+        self.run_language_commands(
+            language,
+            version,
+            version_output_dir,
+            language_config.chevron_vars_for(version, input_spec),
+        )
+        return 0, fingerprint
+
+    def get_batch_generate_config(self, language, version, input_spec):
+        """Get openapi-generator batch config for generation of language/version
+
+        The language/version can be generated in batch if one of its commands
+        starts with the ``openapi_generator_generate`` function and all arguments
+        added after the function can be expressed in a batch config.
+
+        :param language: Language to get the config for
+        :type language: ``str``
+        :param version: Version to get the config for
+        :type version: ``str``
+        :param input_spec: Path to the full spec file to generate from
+        :type input_spec: ``str``
+        :return: Index of the generate command in commands of the language/version and
+            the batch config or ``None`` if the language/version can't be generated in batch
+        :rtype: ``tuple`` or ``NoneType``
+        """
+        lc = self.config.get_language_config(language)
+        for index, command in enumerate(lc.commands_for(version)):
+            first = command.commandline[0] if command.commandline else None
+            if (
+                isinstance(first, FunctionArgument)
+                and first.function == "openapi_generator_generate"
+            ):
+                break
+        else:
+            return None
+        if isinstance(command.container_opts.image, ContainerImageBuild):
+            return None
+
+        # paths are relative to spec repo, where openapi-generator batch runs
+        chevron_vars = lc.chevron_vars_for(
+            version, input_spec, paths_relative_to=PathRelativeTo.SPEC_REPO_DIR
+        )
+        chevron_vars["version_output_dir"] = lc.generated_lang_version_dir_for(version)
+        chevron_vars["cwd"] = "."
+        default_generate = self.get_default_generate_function(
+            not bool(lc.templates_config_for(version))
+        )()
+        args = self._render_command_args(
+            default_generate + copy.deepcopy(command.commandline[1:]), chevron_vars
+        )
+        if any(isinstance(arg, FunctionArgument) for arg in args):
+            return None
+
+        config = {}
+        # skip the entrypoint and "generate"
+        args = args[2:]
+        while args:
+            option, args = args[0], args[1:]
+            if option.startswith("--") and "=" in option:
+                option, value = option.split("=", 1)
+            elif args:
+                value, args = args[0], args[1:]
+            else:
+                value = None
+            if value is not None and option in BATCH_CONFIG_OPTIONS:
+                config[BATCH_CONFIG_OPTIONS[option]] = value
+            elif value is not None and option in BATCH_CONFIG_MAP_OPTIONS:
+                mapping = _parse_batch_map_option(value)
+                if mapping is None:
                     log.info(
-                        "Skipping templates processing for {}/{}".format(
-                            language, version
-                        )
+                        "Can't generate %s/%s in batch, ambiguous value of %s: %s",
+                        language,
+                        version,
+                        option,
+                        value,
                     )
-                else:
-                    tpl_cmd_args = copy.deepcopy(self.args)
-                    tpl_cmd_args["languages"] = [language]
-                    tpl_cmd_args["api_versions"] = [version]
-                    template_cmd = TemplatesCommand(self.config, tpl_cmd_args)
-                    retval = template_cmd.run()
-                    if retval != 0:
-                        return retval
+                    return None
+                config.setdefault(BATCH_CONFIG_MAP_OPTIONS[option], {}).update(mapping)
+            else:
+                log.info(
+                    "Can't generate %s/%s in batch, unsupported argument %s",
+                    language,
+                    version,
+                    option,
+                )
+                return None
+        return index, config
+
+    def generate_targets_batch(self, targets, jobs=1):
+        """Generate client code for multiple languages/versions with openapi-generator batch
+
+        Languages/versions whose generate command runs with the same container options
+        are generated by a single invocation of ``openapi-generator batch``. Commands
+        before and after the generate command still run for every language/version.
+        Languages/versions that can't be generated in batch are generated one by one.
+
+        :param targets: ``(language, version, input_spec)`` tuples to generate
+        :type targets: ``list`` of ``tuple``
+        :param jobs: Number of threads for openapi-generator to use
+        :type jobs: ``int``
+        :return: Return code (``0`` on success)
+        :rtype: ``int``
+        """
+        # container options of generate command -> batched languages/versions
+        batches = collections.OrderedDict()
+        for language, version, input_spec in targets:
+            retval, fingerprint = self.prepare_language_version(
+                language, version, input_spec
+            )
+            if retval != 0:
+                return retval
+            if fingerprint is None:
+                continue
+            lc = self.config.get_language_config(language)
+            version_output_dir = lc.generated_lang_version_dir_for(version)
+            os.makedirs(version_output_dir, exist_ok=True)
+            chevron_vars = lc.chevron_vars_for(version, input_spec)
+            batch_config = self.get_batch_generate_config(language, version, input_spec)
+            if batch_config is None:
                 log.info("Generation in %s/%s", language, version)
-                version_output_dir = language_config.generated_lang_version_dir_for(
-                    version
+                self.run_language_commands(
+                    language, version, version_output_dir, chevron_vars
+                )
+                self.write_dot_apigentools_info(lc, version, fingerprint)
+                continue
+
+            index, config = batch_config
+            commands = lc.commands_for(version)
+            log.info("Generation in %s/%s (batch)", language, version)
+            self.run_language_commands(
+                language, version, version_output_dir, chevron_vars, commands[:index]
+            )
+            container_opts = commands[index].container_opts.copy(
+                update={"workdir": "."}, deep=True
+            )
+            key = json.dumps(container_opts.dict(), sort_keys=True)
+            batches.setdefault(key, (container_opts, []))[1].append(
+                (language, version, input_spec, fingerprint, index, config)
+            )
+
+        for container_opts, batch in batches.values():
+            with tempfile.TemporaryDirectory(
+                prefix=".apigentools-batch-", dir="."
+            ) as td:
+                config_files = []
+                for language, version, _, _, _, config in batch:
+                    config_file = os.path.join(
+                        os.path.relpath(td), "{}_{}.json".format(language, version)
+                    )
+                    with open(config_file, "w") as f:
+                        json.dump(config, f, indent=4)
+                    config_files.append(config_file)
+                commandline = [
+                    "openapi-generator",
+                    "batch",
+                    "--fail-fast",
+                    "--includes-base-dir",
+                    ".",
+                ]
+                if jobs > 1:
+                    commandline.extend(["--threads", str(jobs)])
+                self.run_config_command(
+                    ConfigCommand(
+                        commandline=commandline + config_files,
+                        container_opts=container_opts,
+                        description="Generate {} in batch".format(
+                            ", ".join("{}/{}".format(b[0], b[1]) for b in batch)
+                        ),
+                    ),
+                    "batch",
                 )
-                os.makedirs(version_output_dir, exist_ok=True)
+
+            for language, version, input_spec, fingerprint, index, _ in batch:
+                lc = self.config.get_language_config(language)
                 self.run_language_commands(
                     language,
                     version,
-                    version_output_dir,
-                    language_config.chevron_vars_for(version, input_spec),
+                    lc.generated_lang_version_dir_for(version),
+                    lc.chevron_vars_for(version, input_spec),
+                    lc.commands_for(version)[index + 1 :],
                 )
-                self.write_dot_apigentools_info(language_config, version)
+                self.write_dot_apigentools_info(lc, version, fingerprint)
+        return 0
 
-            self.render_downstream_templates(
-                language_config, language_config.chevron_vars_for()
-            )
+    def generate_targets(self, targets, jobs=1):
+        """Generate client code for multiple languages/versions
+
+        With ``jobs > 1``, the languages/versions are generated in parallel worker
+        processes. The first failure cancels all generations that haven't started
+        yet and waits for the running ones to finish. The ``.apigentools-info``
+        records are always written by the main process, after generation of
+        the language/version succeeds (languages/versions that are up to date
+        keep their records).
+
+        :param targets: ``(language, version, input_spec)`` tuples to generate
+        :type targets: ``list`` of ``tuple``
+        :param jobs: Number of languages/versions to generate in parallel
+        :type jobs: ``int``
+        :return: Return code (``0`` on success)
+        :rtype: ``int``
+        """
+        if jobs <= 1 or len(targets) <= 1:
+            for language, version, input_spec in targets:
+                retval, fingerprint = self.generate_language_version(
+                    language, version, input_spec
+                )
+                if retval != 0:
+                    return retval
+                if fingerprint is not None:
+                    self.write_dot_apigentools_info(
+                        self.config.get_language_config(language), version, fingerprint
+                    )
+            return 0
 
-        return 0
+        log.info(
+            "Generating %d languages/versions with %d processes",
+            len(targets),
+            min(jobs, len(targets)),
+        )
+        retval = 0
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(jobs, len(targets)),
+            initializer=_init_generate_worker,
+            initargs=(
+                self,
+                logging.getLogger(__name__.split(".")[0]).getEffectiveLevel(),
+            ),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _generate_language_version_job, language, version, input_spec
+                ): (language, version)
+                for language, version, input_spec in targets
+            }
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    language, version = futures[future]
+                    retval, fingerprint = future.result()
+                    if retval != 0:
+                        log.error("Generation of %s/%s failed", language, version)
+                        break
+                    if fingerprint is not None:
+                        self.write_dot_apigentools_info(
+                            self.config.get_language_config(language),
+                            version,
+                            fingerprint,
+                        )
+            finally:
+                if any(not f.done() for f in futures):
+                    log.info("Cancelling remaining generations ...")
+                for future in futures:
+                    future.cancel()
+        return retval
 
     def pull_repository(self, language, branch=None):
         if not language.github_repo:
@@ -71,6 +71,7 @@ class InitCommand(Command):
         "tags": [],
     }
     GITIGNORE = [
+        ".apigentools-cache/\n",
         "!generated\n",
         "generated/*\n",
         "!generated/.gitkeep\n",
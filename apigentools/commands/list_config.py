@@ -8,6 +8,7 @@ import logging
 import click
 import jsonpath_ng
 
+from apigentools import constants
 from apigentools.commands.command import Command, run_command_with_config
 from apigentools.utils import env_or_val
 
@@ -23,6 +24,16 @@ log = logging.getLogger(__name__)
     + "Note that if some languages override config's spec_sections, additional "
     + "files will be generated with name pattern 'full_spec.<lang>.yaml'",
 )
+@click.option(
+    "--full-spec-format",
+    type=click.Choice(
+        [constants.FULL_SPEC_FORMAT_JSON, constants.FULL_SPEC_FORMAT_YAML]
+    ),
+    default=env_or_val("APIGENTOOLS_FULL_SPEC_FORMAT", None),
+    help="Format of the full spec files to write (default: based on extension of the "
+    + "full spec file). With 'json', '.yaml' extension of the full spec file is replaced "
+    + "by '.json'",
+)
 @click.option(
     "-L",
     "--list-languages",
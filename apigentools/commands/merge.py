@@ -4,13 +4,15 @@
 # Copyright 2019-Present Datadog, Inc.
 import os
 import logging
+import time
 
 import click
 
 from apigentools import config
 from apigentools import constants
 from apigentools.commands.command import Command, run_command_with_config
-from apigentools.utils import write_full_spec, env_or_val
+from apigentools.utils import flush_merge_states, write_full_specs, env_or_val
+from apigentools.watch import get_watcher
 
 log = logging.getLogger(__name__)
 
@@ -24,11 +26,48 @@ log = logging.getLogger(__name__)
     + "Note that if some languages override config's spec_sections, additional "
     + "files will be generated with name pattern 'full_spec.<lang>.yaml'",
 )
+@click.option(
+    "--full-spec-format",
+    type=click.Choice(
+        [constants.FULL_SPEC_FORMAT_JSON, constants.FULL_SPEC_FORMAT_YAML]
+    ),
+    default=env_or_val("APIGENTOOLS_FULL_SPEC_FORMAT", None),
+    help="Format of the full spec files to write (default: based on extension of the "
+    + "full spec file). With 'json', '.yaml' extension of the full spec file is replaced "
+    + "by '.json'",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_NO_CACHE", False, __type=bool),
+    help="Don't reuse results of previous runs stored in .apigentools-cache (merged full specs, parsed spec sections)",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=env_or_val("APIGENTOOLS_JOBS", 1, __type=int),
+    help="Number of parallel jobs to use (default: 1)",
+)
 @click.option(
     "--filter-sections",
     help="Specify spec sections to filter out from the output",
     multiple=True,
 )
+@click.option(
+    "--prune-components",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_PRUNE_COMPONENTS", False, __type=bool),
+    help="Remove components that aren't referenced from paths of the full spec files, "
+    + "neither directly nor through other components",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Keep running and merge the affected full spec files again whenever "
+    + "spec sections change",
+)
 @click.pass_context
 def merge(ctx, **kwargs):
     """Merge OpenAPI spec"""
@@ -39,21 +78,93 @@ class MergeCommand(Command):
     def _split_spec_file(self, spec_file):
         return spec_file.rsplit(constants.SPEC_REPO_SPEC_DIR, 1)[1].split(os.sep, 2)[1:]
 
-    def run(self):
-        cmd_result = 0
-        fs_files = set()
-        filter_sections = frozenset(self.args.get("filter_sections", ()))
-        for language, version, fs_file in self.yield_lang_version_specfile():
-            if fs_file in fs_files:
-                continue
-            fs_files.add(fs_file)
+    def merge_variants(self, variants):
+        """Write full spec files
 
-            write_full_spec(
+        :param variants: Full spec files to write, as returned by
+            ``get_full_spec_variants``
+        :type variants: ``dict``
+        """
+        filter_sections = frozenset(self.args.get("filter_sections", ()))
+        for version, version_variants in variants.items():
+            write_full_specs(
                 constants.SPEC_REPO_SPEC_DIR,
                 version,
-                self.config.get_language_config(language).spec_sections_for(version),
-                fs_file,
+                version_variants,
                 filter_sections,
+                jobs=self.args.get("jobs", 1),
+                cache_dir=self.get_cache_dir(),
+                full_spec_format=self.get_full_spec_format(),
+                operation_filters=self.get_operation_filters(),
+                prune_components=self.args.get("prune_components", False),
+                keep_in_memory=bool(self.args.get("watch")),
             )
 
+    def get_affected_variants(self, variants, changed):
+        """Get full spec files that are merged from any of the changed files
+
+        :param variants: Full spec files, as returned by ``get_full_spec_variants``
+        :type variants: ``dict``
+        :param changed: Paths of changed files
+        :type changed: ``set`` of ``str``
+        :return: Affected full spec files, in the same format as ``variants``
+        :rtype: ``dict``
+        """
+        affected = {}
+        for version, version_variants in variants.items():
+            spec_version_dir = os.path.join(constants.SPEC_REPO_SPEC_DIR, version)
+            changed_sections = {
+                os.path.relpath(path, spec_version_dir)
+                for path in changed
+                if path.startswith(spec_version_dir + os.sep)
+            }
+            for fs_file, spec_sections in version_variants.items():
+                if changed_sections & {os.path.normpath(s) for s in spec_sections}:
+                    affected.setdefault(version, {})[fs_file] = spec_sections
+        return affected
+
+    def watch(self, variants):
+        """Merge the affected full spec files whenever spec sections change,
+        until interrupted
+
+        :param variants: Full spec files, as returned by ``get_full_spec_variants``
+        :type variants: ``dict``
+        """
+        spec_version_dirs = [
+            os.path.join(constants.SPEC_REPO_SPEC_DIR, version) for version in variants
+        ]
+        with get_watcher(spec_version_dirs) as watcher:
+            log.info(
+                "Watching %s for changes, press Ctrl+C to stop",
+                ", ".join(spec_version_dirs),
+            )
+            try:
+                while True:
+                    affected = self.get_affected_variants(variants, watcher.wait())
+                    if not affected:
+                        continue
+                    start = time.monotonic()
+                    fs_files = ", ".join(f for v in affected.values() for f in v)
+                    try:
+                        self.merge_variants(affected)
+                    except Exception as e:
+                        log.error("Failed merging %s: %s", fs_files, e)
+                        continue
+                    log.info(
+                        "Merged %s in %d ms",
+                        fs_files,
+                        (time.monotonic() - start) * 1000,
+                    )
+            except KeyboardInterrupt:
+                pass
+            finally:
+                flush_merge_states()
+
+    def run(self):
+        cmd_result = 0
+        variants = self.get_full_spec_variants()
+        self.merge_variants(variants)
+        if self.args.get("watch"):
+            self.watch(variants)
+
         return cmd_result
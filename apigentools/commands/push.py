@@ -9,6 +9,7 @@ import time
 import click
 
 from apigentools.commands.command import Command, run_command_with_config
+from apigentools.git_metadata import GitMetadata
 from apigentools.utils import change_cwd, get_current_commit, run_command, env_or_val
 
 log = logging.getLogger(__name__)
@@ -79,13 +80,10 @@ class PushCommand(Command):
         :rtype: ``str``
         """
         push_branch = self.args.get("default_branch")
-        try:
-            run_command(["git", "rev-parse", "--verify", push_branch])
+        if GitMetadata.for_path(".").has_revision(push_branch):
             # if the default branch exists, we'll create and push a new feature branch
             push_branch = "{}/{}".format(lang_name, time.time())
-        except subprocess.CalledProcessError:
-            # if the default branch doesn't exist, we'll create and push it
-            pass
+        # if the default branch doesn't exist, we'll create and push it
         return push_branch
 
     def git_status_empty(self):
@@ -2,24 +2,313 @@
 # under the 3-clause BSD style license (see LICENSE).
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2019-Present Datadog, Inc.
-import copy
+import json
 import logging
+import math
 import os
 import re
 import sys
 
 import click
 import yaml
+from yaml import CSafeDumper, CSafeLoader
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.cyaml import CParser
+from yaml.resolver import Resolver
 
 from apigentools import constants
 from apigentools.commands.command import Command, run_command_with_config
 from apigentools.commands.validate import ValidateCommand
 from apigentools.constants import HEADER_FILE_NAME, SHARED_FILE_NAME
-from apigentools.utils import env_or_val
+from apigentools.utils import COMPONENT_FIELDS, component_ref, env_or_val
 
 log = logging.getLogger(__name__)
 
 
+class StreamingSpecLoader(CParser, Composer, SafeConstructor, Resolver):
+    """Loader that parses with libyaml, but lets us compose and construct
+    the document one node at a time.
+
+    :param stream: stream to read the spec from
+    :type stream: file-like object
+    """
+
+    def __init__(self, stream):
+        CParser.__init__(self, stream)
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
+
+    def load_node(self):
+        return self.construct_document(self.compose_node(None, None))
+
+    def skip_node(self):
+        depth = 0
+        while True:
+            event = self.get_event()
+            if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                depth += 1
+            elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                depth -= 1
+            if depth == 0:
+                return
+
+
+def iter_spec_entries(stream, only_paths=False):
+    """Read an OpenAPI spec entry by entry.
+
+    Entries of ``paths`` are read (and yielded) one at a time, so that the whole
+    ``paths`` object never has to be in memory.
+
+    :param stream: stream to read the spec from
+    :type stream: file-like object
+    :param only_paths: whether to skip everything except for ``paths``
+    :type only_paths: ``bool``
+    :return: generator of ``(keys, value)``, where ``keys`` is ``(key,)`` for top
+        level entries and ``("paths", endpoint)`` for entries of ``paths``
+    :rtype: ``generator``
+    """
+    loader = StreamingSpecLoader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        loader.get_event()  # DocumentStartEvent
+        if not isinstance(loader.get_event(), yaml.MappingStartEvent):
+            raise ValueError("OpenAPI spec must be a mapping")
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.load_node()
+            if key == "paths" and loader.check_event(yaml.MappingStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.MappingEndEvent):
+                    endpoint = loader.load_node()
+                    yield ("paths", endpoint), loader.load_node()
+                loader.get_event()
+            elif only_paths:
+                loader.skip_node()
+            else:
+                yield (key,), loader.load_node()
+    finally:
+        loader.dispose()
+
+
+def get_endpoint_size(endpoint_methods):
+    """Get approximate size of an endpoint definition, used to balance sections.
+
+    :param endpoint_methods: methods of the endpoint
+    :type endpoint_methods: ``dict``
+    :return: size of the endpoint serialized as JSON
+    :rtype: ``int``
+    """
+    return len(json.dumps(endpoint_methods, default=str))
+
+
+def write_yaml(path, data):
+    """Write data as YAML to file.
+
+    :param path: path of the file to write
+    :type path: ``str``
+    :param data: data to write
+    :type data: any
+    """
+    with open(path, "w") as f:
+        yaml.dump(data, f, Dumper=CSafeDumper, default_flow_style=False)
+
+
+class EndpointTrieNode:
+    """Node of a trie of endpoints split to path segments"""
+
+    __slots__ = ("children", "endpoints")
+
+    def __init__(self):
+        # path segment -> EndpointTrieNode
+        self.children = {}
+        # endpoints ending in this node (e.g. "/foo" and "/foo/")
+        self.endpoints = []
+
+    def iter_endpoints(self):
+        """Iterate over all endpoints in the subtree of this node.
+
+        :return: generator of endpoints, depth first
+        :rtype: ``generator``
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield from node.endpoints
+            stack.extend(reversed(list(node.children.values())))
+
+
+def iter_component_refs(struct, struct_path):
+    """Find all component references in arbitrary data structure.
+
+    Besides ``$ref``, components are referenced by discriminator mappings (schemas)
+    and security requirements (security schemes).
+
+    :param struct: structure to traverse
+    :type struct: any
+    :param struct_path: dotted path in parent structure of given structure to make debugging
+        easier and print useful error messages
+    :type struct_path: ``str``
+    :return: generator of ``((field, name), struct_path)`` for every reference
+    :rtype: ``generator``
+    """
+    stack = [(struct, struct_path)]
+    while stack:
+        struct, struct_path = stack.pop()
+        if isinstance(struct, list):
+            for i, item in enumerate(struct):
+                stack.append((item, "{}.{}".format(struct_path, i)))
+        elif isinstance(struct, dict):
+            for k, v in struct.items():
+                if k == "$ref" and isinstance(v, str):
+                    component = component_ref(v)
+                    if component is None:
+                        log.warning(
+                            "Reference %s in %s doesn't point to 'components'",
+                            v,
+                            struct_path,
+                        )
+                    else:
+                        yield component, struct_path
+                    continue
+                if k == "discriminator" and isinstance(v, dict):
+                    for target in (v.get("mapping") or {}).values():
+                        yield component_ref(target) or ("schemas", target), struct_path
+                elif k == "security" and isinstance(v, list):
+                    for requirement in v:
+                        if isinstance(requirement, dict):
+                            for scheme in requirement:
+                                yield ("securitySchemes", scheme), struct_path
+                stack.append((v, "{}.{}".format(struct_path, k)))
+
+
+class ComponentGraph:
+    """Graph of references between components of all ``COMPONENT_FIELDS``.
+
+    Components are identified by ``(field, name)`` tuples. Transitive closures of
+    references are computed once per strongly connected component of the graph
+    (so reference cycles are fine) and shared by all components that need them.
+
+    :param components: dict containing all existing components
+    :type components: ``dict``
+    """
+
+    def __init__(self, components):
+        self.components = components
+        # (field, name) -> (field, name) of components it references directly
+        self.references = {}
+        for field in COMPONENT_FIELDS:
+            for name, component in (components.get(field) or {}).items():
+                self.references[(field, name)] = []
+        for (field, name), refs in self.references.items():
+            for ref, struct_path in iter_component_refs(
+                components[field][name], "components.{}.{}".format(field, name)
+            ):
+                if ref in self.references:
+                    refs.append(ref)
+                else:
+                    log.warning(
+                        "Component %s referenced in %s doesn't have a definition in 'components'",
+                        "/".join(ref),
+                        struct_path,
+                    )
+        # (field, name) -> frozenset of all components it needs, including itself
+        self.closures = {}
+
+    def closure(self, component):
+        """Get all components needed by given component, including the component itself.
+
+        :param component: ``(field, name)`` of the component
+        :type component: ``tuple``
+        :return: ``(field, name)`` of all needed components
+        :rtype: ``frozenset``
+        """
+        if component not in self.closures:
+            self._compute_closures(component)
+        return self.closures[component]
+
+    def closure_of(self, struct, struct_path):
+        """Get all components needed by arbitrary data structure.
+
+        :param struct: structure to traverse
+        :type struct: any
+        :param struct_path: dotted path of the structure for error messages
+        :type struct_path: ``str``
+        :return: ``(field, name)`` of all needed components
+        :rtype: ``set``
+        """
+        return self.closure_of_refs(iter_component_refs(struct, struct_path))
+
+    def closure_of_refs(self, refs):
+        """Get all components needed by given references.
+
+        :param refs: ``((field, name), struct_path)`` of the references
+        :type refs: iterable of ``tuple``
+        :return: ``(field, name)`` of all needed components
+        :rtype: ``set``
+        """
+        needed = set()
+        for ref, ref_path in refs:
+            if ref in needed:
+                continue
+            if ref not in self.references:
+                log.warning(
+                    "Component %s referenced in %s doesn't have a definition in 'components'",
+                    "/".join(ref),
+                    ref_path,
+                )
+            else:
+                needed |= self.closure(ref)
+        return needed
+
+    def _compute_closures(self, start):
+        # iterative Tarjan's algorithm; strongly connected components are found
+        # in reverse topological order, so closures of all the components they
+        # reference are always known by the time they're found
+        index = {}
+        lowlink = {}
+        scc_stack = []
+        on_stack = set()
+        work = [(start, iter(self.references[start]))]
+        index[start] = lowlink[start] = 0
+        scc_stack.append(start)
+        on_stack.add(start)
+        while work:
+            node, refs = work[-1]
+            for ref in refs:
+                if ref in self.closures:
+                    continue
+                if ref not in index:
+                    index[ref] = lowlink[ref] = len(index)
+                    scc_stack.append(ref)
+                    on_stack.add(ref)
+                    work.append((ref, iter(self.references[ref])))
+                    break
+                if ref in on_stack:
+                    lowlink[node] = min(lowlink[node], index[ref])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    members = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    closure = set(members)
+                    for member in members:
+                        for ref in self.references[member]:
+                            if ref not in closure:
+                                closure |= self.closures[ref]
+                    closure = frozenset(closure)
+                    for member in members:
+                        self.closures[member] = closure
+
+
 @click.command()
 @click.argument("input-file")
 @click.option(
@@ -28,6 +317,27 @@ log = logging.getLogger(__name__)
     default=env_or_val("APIGENTOOLS_SPLIT_SPEC_VERSION", "v1"),
     help="Version of API that the input spec describes (default: 'v1')",
 )
+@click.option(
+    "--max-section-size",
+    type=click.IntRange(min=1),
+    default=env_or_val("APIGENTOOLS_SPLIT_MAX_SECTION_SIZE", None, __type=int),
+    help="Split groups of endpoints bigger than this (in bytes of their paths) "
+    + "into smaller sections at lower path levels",
+)
+@click.option(
+    "--target-sections",
+    type=click.IntRange(min=1),
+    default=env_or_val("APIGENTOOLS_SPLIT_TARGET_SECTIONS", None, __type=int),
+    help="Split big groups of endpoints at lower path levels to get roughly this "
+    + "many sections of similar size",
+)
+@click.option(
+    "--streaming",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_SPLIT_STREAMING", False, __type=bool),
+    help="Read the input spec in two streaming passes instead of loading it "
+    + "at once, keeping only components, tags and unfinished sections in memory",
+)
 @click.pass_context
 def split(ctx, **kwargs):
     """Split single specified input-file OpenAPI spec file into multiple files"""
@@ -38,7 +348,7 @@ class SplitCommand(Command):
     def get_shared_section_name(self):
         return os.path.splitext(SHARED_FILE_NAME)[0]
 
-    def deduplicate_tags(self, all_sections, all_tags):
+    def deduplicate_tags(self, all_sections, all_tags, tag_index=None):
         """Find all tags that appear in more than one section and move them
         to the ``shared`` section.
 
@@ -46,75 +356,191 @@ class SplitCommand(Command):
         :type all_sections: ``dict``
         :param all_tags: list of all existing tags
         :type all_tags: ``list``
+        :param tag_index: index of ``all_tags``, built if not given, see ``get_tag_index``
+        :type tag_index: ``dict`` or ``NoneType``
         """
+        if tag_index is None:
+            tag_index = self.get_tag_index(all_tags)
+        shared_section = all_sections[self.get_shared_section_name()]
         tag_sections = {}
         for section_name, section in all_sections.items():
             if section_name == self.get_shared_section_name():
                 continue
             for tag in section["tags"]:
-                tag_sections.setdefault(tag["name"], [])
-                tag_sections[tag["name"]].append(section_name)
-        for tag_name, section_names in tag_sections.items():
-            if len(section_names) > 1:
-                tag = self.get_tag_object(all_tags, tag_name)
-                for section_name in section_names:
-                    all_sections[section_name]["tags"].remove(tag)
-                all_sections[self.get_shared_section_name()]["tags"].append(tag)
+                tag_sections.setdefault(tag["name"], []).append(section_name)
+        # tag name -> None; a dict is used as an ordered set
+        shared_tags = {
+            tag_name: None
+            for tag_name, section_names in tag_sections.items()
+            if len(section_names) > 1
+        }
+        if not shared_tags:
+            return
+        affected_sections = {}
+        for tag_name in shared_tags:
+            shared_section["tags"].append(tag_index.get(tag_name))
+            affected_sections.update(dict.fromkeys(tag_sections[tag_name]))
+        for section_name in affected_sections:
+            all_sections[section_name]["tags"][:] = [
+                tag
+                for tag in all_sections[section_name]["tags"]
+                if tag["name"] not in shared_tags
+            ]
 
     def deduplicate_components(self, all_sections, all_components):
-        """Find all component schemas that appear in more than one section and move them
-        to the ``shared`` section.
+        """Find all components (of any of ``COMPONENT_FIELDS``) that appear in more than
+        one section and move them to the ``shared`` section. Components that are already
+        in the ``shared`` section are removed from all other sections.
 
         :param all_sections: dict of all existing sections
         :type all_sections: ``dict``
-        :param all_tags: dict of all existing components
-        :type all_tags: ``dict``
+        :param all_components: dict of all existing components
+        :type all_components: ``dict``
         """
         # NOTE: while this function is very similar to deduplicate_tags, it would actually
         # not be very easy (or readable) to unify them, so we keep them separate
+        shared_name = self.get_shared_section_name()
         component_sections = {}
         for section_name, section in all_sections.items():
-            if section_name == self.get_shared_section_name():
+            for field, section_components in section.get("components", {}).items():
+                if field not in COMPONENT_FIELDS:
+                    continue
+                for name in section_components:
+                    component_sections.setdefault((field, name), []).append(
+                        section_name
+                    )
+        shared_components = all_sections[shared_name]["components"]
+        for (field, name), section_names in component_sections.items():
+            if len(section_names) == 1 and section_names[0] != shared_name:
                 continue
-            for schema_name in section["components"]["schemas"]:
-                component_sections.setdefault(schema_name, [])
-                component_sections[schema_name].append(section_name)
-        for schema_name, section_names in component_sections.items():
-            if len(section_names) > 1:
-                schema = all_components["schemas"][schema_name]
-                for section_name in section_names:
-                    all_sections[section_name]["components"]["schemas"].pop(schema_name)
-                all_sections[self.get_shared_section_name()]["components"]["schemas"][
-                    schema_name
-                ] = schema
-
-    def get_endpoints_for_sections(self, all_endpoints):
+            for section_name in section_names:
+                if section_name != shared_name:
+                    section_components = all_sections[section_name]["components"]
+                    section_components[field].pop(name)
+                    if not section_components[field] and field != "schemas":
+                        section_components.pop(field)
+            shared_components.setdefault(field, {})[name] = all_components[field][name]
+
+    def get_endpoints_for_sections(
+        self, all_endpoints, endpoints_sizes=None, max_section_size=None
+    ):
         """Get mapping of "top-level" endpoints to all endpoints under them.
 
+        Endpoints are compared by whole path segments (so ``/api/v1/user`` isn't
+        a "top-level" endpoint of ``/api/v1/users``), empty segments are ignored.
+
         Example result:
         {"/api/v1/user": ["/api/v1/user", "/api/v1/user/{username}"],
         "/api/v1/org": ["/api/v1/org", "/api/v1/org/{id}", "/api/v1/org/id/idp_metadata"]}
 
+        If ``max_section_size`` is given, groups bigger than that are split into
+        smaller sections at lower path levels (see ``partition_endpoints``), these
+        are keyed by their first endpoint.
+
         :param all_endpoints: list of all endpoints
         :type all_endpoints: ``list`` of ``str``
+        :param endpoints_sizes: mapping of endpoints to their sizes
+        :type endpoints_sizes: ``dict`` or ``NoneType``
+        :param max_section_size: maximum size of a section
+        :type max_section_size: ``int`` or ``NoneType``
         :return: mapping of top-level endpoints to all endpoints under them
         :rtype: ``dict``
         """
-        endpoints_sections = {}
+        root = EndpointTrieNode()
         for endpoint in all_endpoints:
-            add_endpoint = True
-            for section in copy.deepcopy(list(endpoints_sections.keys())):
-                if section.startswith(endpoint) and section != endpoint:
-                    endpoints_sections[endpoint] = set([endpoint])
-                    endpoints_sections[endpoint].update(endpoints_sections.pop(section))
-                    add_endpoint = False
-                elif endpoint.startswith(section):
-                    endpoints_sections[section].add(endpoint)
-                    add_endpoint = False
-            if add_endpoint:
-                endpoints_sections[endpoint] = set([endpoint])
+            node = root
+            for segment in endpoint.split("/"):
+                if segment:
+                    node = node.children.setdefault(segment, EndpointTrieNode())
+            node.endpoints.append(endpoint)
+
+        endpoints_sections = {}
+        # the first node with endpoints on every path from root starts a new section,
+        # everything under it belongs to that section
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if not node.endpoints:
+                stack.extend(reversed(list(node.children.values())))
+            elif max_section_size is None:
+                endpoints_sections[node.endpoints[0]] = set(node.iter_endpoints())
+            else:
+                for endpoints in self.partition_endpoints(
+                    node, endpoints_sizes, max_section_size
+                ):
+                    endpoints_sections[endpoints[0]] = set(endpoints)
         return endpoints_sections
 
+    def partition_endpoints(self, node, endpoints_sizes, max_section_size):
+        """Partition endpoints in the subtree of given trie node into sections no
+        bigger than ``max_section_size`` (unless a single path can't be split any more).
+
+        Endpoints of the node itself start the first section. Subtrees of its children
+        are added to that section if they fit, otherwise to the last started section
+        if they fit there, otherwise they start a new section. Subtrees too big for
+        a section on their own are partitioned recursively.
+
+        :param node: node of the endpoints trie
+        :type node: ``EndpointTrieNode``
+        :param endpoints_sizes: mapping of endpoints to their sizes
+        :type endpoints_sizes: ``dict``
+        :param max_section_size: maximum size of a section
+        :type max_section_size: ``int``
+        :return: list of sections, each a list of endpoints
+        :rtype: ``list``
+        """
+        # [endpoints, size] of every section
+        sections = [
+            [list(node.endpoints), sum(endpoints_sizes[e] for e in node.endpoints)]
+        ]
+        for child in node.children.values():
+            endpoints = list(child.iter_endpoints())
+            size = sum(endpoints_sizes[e] for e in endpoints)
+            if size > max_section_size and child.children:
+                sections.extend(
+                    [part, None]
+                    for part in self.partition_endpoints(
+                        child, endpoints_sizes, max_section_size
+                    )
+                )
+                continue
+            for section in (sections[0], sections[-1]):
+                if section[1] is not None and section[1] + size <= max_section_size:
+                    section[0].extend(endpoints)
+                    section[1] += size
+                    break
+            else:
+                sections.append([endpoints, size])
+        return [endpoints for endpoints, _ in sections if endpoints]
+
+    def get_max_section_size(self, endpoints_sizes):
+        """Get maximum size of a section from ``--max-section-size`` or ``--target-sections``.
+
+        :param endpoints_sizes: mapping of endpoints to their sizes
+        :type endpoints_sizes: ``dict``
+        :return: maximum size of a section or ``None`` if sections shouldn't be balanced
+        :rtype: ``int`` or ``NoneType``
+        """
+        if self.args.get("max_section_size"):
+            return self.args.get("max_section_size")
+        if self.args.get("target_sections"):
+            return max(
+                1,
+                math.ceil(
+                    sum(endpoints_sizes.values()) / self.args.get("target_sections")
+                ),
+            )
+        return None
+
+    def balance_sections(self):
+        """Whether sections should be balanced by size.
+
+        :rtype: ``bool``
+        """
+        return bool(
+            self.args.get("max_section_size") or self.args.get("target_sections")
+        )
+
     def get_section_output_path(self, outdir, section):
         """Get name of output file for given section of and OpenAPI spec.
 
@@ -136,6 +562,43 @@ class SplitCommand(Command):
         section = re.sub(r"[^0-9a-zA-Z]+", "_", section)
         return os.path.join(outdir, section + ".yaml")
 
+    def get_section_output_paths(self, outdir, section_names):
+        """Get names of output files for all given sections.
+
+        Different section names can map to the same file name (e.g. ``/a/b-c/x``
+        and ``/a/b/c/x``, or ``/api/v1/shared`` and the shared section), so the file
+        names of all but the first of them get a numeric suffix (e.g. ``a_b_c_x_2.yaml``).
+        The header and shared sections always keep their file names. File names are
+        compared case insensitively, so that they're unique on any filesystem.
+
+        :param outdir: directory in which the output files should be put
+        :type outdir: ``str``
+        :param section_names: names of the sections
+        :type section_names: iterable of ``str``
+        :return: mapping of section names to full paths of their output files
+        :rtype: ``dict``
+        """
+        shared_name = self.get_shared_section_name()
+        taken = {HEADER_FILE_NAME.lower()}
+        paths = {}
+        # the shared section goes first to keep its file name
+        for section_name in sorted(section_names, key=lambda n: n != shared_name):
+            path = self.get_section_output_path(outdir, section_name)
+            base, ext = os.path.splitext(path)
+            suffix = 1
+            while os.path.basename(path).lower() in taken:
+                suffix += 1
+                path = "{}_{}{}".format(base, suffix, ext)
+            if suffix > 1:
+                log.warning(
+                    "Output file name of section %s is already used, writing it to %s",
+                    section_name,
+                    path,
+                )
+            taken.add(os.path.basename(path).lower())
+            paths[section_name] = path
+        return paths
+
     def get_tag_object(self, all_tags, tag_name):
         """Return tag object (a dict with ``name`` and ``description`` keys) for given tag name.
 
@@ -146,73 +609,72 @@ class SplitCommand(Command):
         :return: tag (if found) or ``None`` (if not found)
         :rtype: ``dict`` or ``NoneType``
         """
+        return self.get_tag_index(all_tags).get(tag_name)
+
+    def get_tag_index(self, all_tags):
+        """Get mapping of tag names to tag objects. Splitting builds it only once
+        and passes it to all the methods that look up tags.
+
+        :param all_tags: list of tags to index
+        :type all_tags: ``list``
+        :return: mapping of tag names to tag objects
+        :rtype: ``dict``
+        """
+        index = {}
         for tag_object in all_tags:
-            if tag_object["name"] == tag_name:
-                return tag_object
-        return None
+            # the first tag of given name wins
+            index.setdefault(tag_object["name"], tag_object)
+        return index
 
-    def update_section_components(self, section, components):
-        """Searches for all referenced schemas throughout the whole section and adds
-        them to ``section["components"]["schemas"]``.
+    def update_section_components(self, section, components, graph=None):
+        """Searches for all components referenced throughout the whole section and adds
+        them to ``section["components"]``.
 
         :param section: section to process
         :type section: ``dict``
         :param components: dict containing all existing components
         :type components: ``dict``
+        :param graph: reference graph of ``components``, built if not given
+        :type graph: ``ComponentGraph`` or ``NoneType``
         """
-        for endpoint, endpoint_methods in section["paths"].items():
-            for method, method_attrs in endpoint_methods.items():
-                self.update_components_recursive(
-                    section, components, method_attrs, "{}.{}".format(endpoint, method)
-                )
+        if graph is None:
+            graph = ComponentGraph(components)
+        needed = graph.closure_of_refs(
+            ref
+            for endpoint, endpoint_methods in section["paths"].items()
+            for ref in self.iter_endpoint_refs(endpoint, endpoint_methods)
+        )
+        self.add_components(section, components, needed)
 
-    def update_components_recursive(self, section, components, struct, struct_path):
-        """A recursive function to traverse arbitrary data structure, search for all
-        referenced schemas and add them to ``section["components"]["schemas"]``.
+    def iter_endpoint_refs(self, endpoint, endpoint_methods):
+        """Find all component references in methods of given endpoint.
 
-        :param section: section to process
+        :param endpoint: the endpoint
+        :type endpoint: ``str``
+        :param endpoint_methods: methods of the endpoint
+        :type endpoint_methods: ``dict``
+        :return: generator of ``((field, name), struct_path)`` for every reference
+        :rtype: ``generator``
+        """
+        for method, method_attrs in endpoint_methods.items():
+            yield from iter_component_refs(
+                method_attrs, "{}.{}".format(endpoint, method)
+            )
+
+    def add_components(self, section, components, needed):
+        """Add given components to ``section["components"]``.
+
+        :param section: section to add components to
         :type section: ``dict``
         :param components: dict containing all existing components
         :type components: ``dict``
-        :param struct: structure to traverse
-        :type struct: any
-        :param struct_path: dotted path in parent structure of given structure to make debugging
-            easier and print useful error messages
-        :type struct_path: ``str``
+        :param needed: ``(field, name)`` of components to add
+        :type needed: iterable of ``tuple``
         """
-        if isinstance(struct, list):
-            for i, item in enumerate(struct):
-                self.update_components_recursive(
-                    section, components, item, "{}.{}".format(struct_path, i)
-                )
-        elif isinstance(struct, dict):
-            for k, v in struct.items():
-                if k == "$ref":
-                    schema_name = v.split("/")[-1]
-                    schema = components["schemas"].get(schema_name, None)
-                    if not schema:
-                        log.warning(
-                            "Schema %s referenced in %s doesn't have a definition in 'components'",
-                            schema_name,
-                            struct_path,
-                        )
-                    else:
-                        section["components"]["schemas"][schema_name] = schema
-                        # schemas can reference other schemas
-                        self.update_components_recursive(
-                            section,
-                            components,
-                            schema,
-                            "{}.$ref({})".format(struct_path, v),
-                        )
-                else:
-                    self.update_components_recursive(
-                        section, components, v, "{}.{}".format(struct_path, k)
-                    )
-        else:
-            pass  # primitive type that we can't traverse any more => just pass
+        for field, name in sorted(needed):
+            section["components"].setdefault(field, {})[name] = components[field][name]
 
-    def update_section_tags(self, section, tags):
+    def update_section_tags(self, section, tags, tag_index=None):
         """Search for all tags referenced in all endpoints in given section and add them
         to ``section["tags"]``.
 
@@ -220,11 +682,18 @@ class SplitCommand(Command):
         :type section: ``dict``
         :param tags: list of all existing tags
         :type tags: ``list``
+        :param tag_index: index of ``tags``, built if not given, see ``get_tag_index``
+        :type tag_index: ``dict`` or ``NoneType``
         """
+        if tag_index is None:
+            tag_index = self.get_tag_index(tags)
+        section_tags = {tag["name"] for tag in section["tags"]}
         for endpoint, endpoint_methods in section["paths"].items():
             for method, method_attrs in endpoint_methods.items():
                 for tag_name in method_attrs.get("tags", []):
-                    tag_object = self.get_tag_object(tags, tag_name)
+                    if tag_name in section_tags:
+                        continue
+                    tag_object = tag_index.get(tag_name)
                     if not tag_object:
                         log.warning(
                             "Tag %s listed in %s.%s doesn't have a definition in 'tags' list",
@@ -232,48 +701,215 @@ class SplitCommand(Command):
                             endpoint,
                             method,
                         )
-                    elif tag_object not in section["tags"]:
+                    else:
+                        section_tags.add(tag_name)
                         section["tags"].append(tag_object)
 
-    def run(self):
-        vc = ValidateCommand(self.config, self.args)
-        if not vc.validate_spec(self.args.get("input_file"), None, None):
-            log.error("Input OpenAPI spec is not valid, can't proceed with splitting.")
-            sys.exit(1)
-        log.info("Input OpenAPI spec is valid, proceeding with splitting.")
-        outdir = os.path.join(
-            constants.SPEC_REPO_SPEC_DIR, self.args.get("api_version")
-        )
-        with open(self.args.get("input_file")) as f:
-            loaded_spec = yaml.safe_load(f)
-        paths = loaded_spec.pop("paths")
-        components = loaded_spec.pop("components")
-        tags = loaded_spec.pop("tags")
+    def get_sections(
+        self,
+        header,
+        paths,
+        components,
+        tags,
+        endpoints_refs=None,
+        endpoints_sizes=None,
+        tag_index=None,
+        graph=None,
+    ):
+        """Split the spec into sections per top-level API endpoint.
 
-        # first, write header
-        with open(os.path.join(outdir, HEADER_FILE_NAME), "w") as f:
-            f.write(yaml.dump(loaded_spec, default_flow_style=False))
-
-        # now split the spec into multiple sections per top-level API endpoint
-        all_sections = {
-            self.get_shared_section_name(): {"components": {"schemas": {}}, "tags": []}
-        }
+        :param header: the spec without ``paths``, ``components`` and ``tags``
+        :type header: ``dict``
+        :param paths: the ``paths`` of the spec
+        :type paths: ``dict``
+        :param components: the ``components`` of the spec
+        :type components: ``dict``
+        :param tags: the ``tags`` of the spec
+        :type tags: ``list``
+        :param endpoints_refs: component references made by methods of every endpoint,
+            found in ``paths`` if not given
+        :type endpoints_refs: ``dict`` or ``NoneType``
+        :param endpoints_sizes: sizes of all endpoints, computed from ``paths`` if not
+            given and needed to balance sections
+        :type endpoints_sizes: ``dict`` or ``NoneType``
+        :param tag_index: index of ``tags``, built if not given, see ``get_tag_index``
+        :type tag_index: ``dict`` or ``NoneType``
+        :param graph: reference graph of ``components``, built if not given
+        :type graph: ``ComponentGraph`` or ``NoneType``
+        :return: mapping of section names to sections, including the shared section
+        :rtype: ``dict``
+        """
+        if tag_index is None:
+            tag_index = self.get_tag_index(tags)
+        if graph is None:
+            graph = ComponentGraph(components)
+        max_section_size = None
+        if self.balance_sections():
+            if endpoints_sizes is None:
+                endpoints_sizes = {
+                    endpoint: get_endpoint_size(endpoint_methods)
+                    for endpoint, endpoint_methods in paths.items()
+                }
+            max_section_size = self.get_max_section_size(endpoints_sizes)
+        shared_section = {"components": {"schemas": {}}, "tags": []}
+        all_sections = {self.get_shared_section_name(): shared_section}
+        used = set()
         for section_name, endpoints in self.get_endpoints_for_sections(
-            paths.keys()
+            paths.keys(), endpoints_sizes, max_section_size
         ).items():
             section = {"paths": {}, "components": {"schemas": {}}, "tags": []}
             for endpoint in endpoints:
                 section["paths"][endpoint] = paths[endpoint]
-            self.update_section_tags(section, tags)
-            self.update_section_components(section, components)
+            self.update_section_tags(section, tags, tag_index)
+            if endpoints_refs is None:
+                self.update_section_components(section, components, graph)
+            else:
+                needed = graph.closure_of_refs(
+                    ref for endpoint in endpoints for ref in endpoints_refs[endpoint]
+                )
+                self.add_components(section, components, needed)
+            for field, section_components in section["components"].items():
+                used.update((field, name) for name in section_components)
             all_sections[section_name] = section
 
-        # some schemas/tags may appear in multiple sections - move them to "shared" section
-        self.deduplicate_tags(all_sections, tags)
+        # components needed by the header (e.g. by top level security requirements)
+        # and components not used by any endpoint go to "shared" section, so that
+        # nothing gets lost
+        needed = graph.closure_of(header, HEADER_FILE_NAME)
+        for component in graph.references.keys() - used:
+            needed |= graph.closure(component)
+        self.add_components(shared_section, components, needed)
+        for field, field_components in components.items():
+            if field not in COMPONENT_FIELDS:
+                shared_section["components"][field] = field_components
+
+        # some components/tags may appear in multiple sections - move them to "shared" section
+        self.deduplicate_tags(all_sections, tags, tag_index)
         self.deduplicate_components(all_sections, components)
+        return all_sections
+
+    def split_loaded(self, input_file, outdir):
+        """Split the input spec with all of it loaded in memory.
+
+        :param input_file: path of the spec to split
+        :type input_file: ``str``
+        :param outdir: directory to write the sections to
+        :type outdir: ``str``
+        """
+        with open(input_file) as f:
+            loaded_spec = yaml.load(f, Loader=CSafeLoader)
+        paths = loaded_spec.pop("paths")
+        components = loaded_spec.pop("components")
+        tags = loaded_spec.pop("tags")
+
+        # first, write header
+        write_yaml(os.path.join(outdir, HEADER_FILE_NAME), loaded_spec)
+
+        # now split the spec and write out all the sections
+        all_sections = self.get_sections(
+            loaded_spec,
+            paths,
+            components,
+            tags,
+            tag_index=self.get_tag_index(tags),
+            graph=ComponentGraph(components),
+        )
+        output_paths = self.get_section_output_paths(outdir, all_sections)
+        for section_name, section in all_sections.items():
+            write_yaml(output_paths[section_name], section)
+
+    def split_streaming(self, input_file, outdir):
+        """Split the input spec in two streaming passes. The first pass only keeps tags
+        and component references of endpoints to find out what goes to which section,
+        the second pass writes every section as soon as all its endpoints are read.
 
-        # write out all the sections
+        :param input_file: path of the spec to split
+        :type input_file: ``str``
+        :param outdir: directory to write the sections to
+        :type outdir: ``str``
+        """
+        header = {}
+        components = {}
+        tags = []
+        # endpoint -> methods with just the tags, to find tags of sections
+        endpoints_tags = {}
+        endpoints_refs = {}
+        endpoints_sizes = {} if self.balance_sections() else None
+        with open(input_file) as f:
+            for keys, value in iter_spec_entries(f):
+                if keys[0] == "paths":
+                    endpoint = keys[1]
+                    endpoints_tags[endpoint] = {
+                        method: {"tags": method_attrs.get("tags", [])}
+                        for method, method_attrs in value.items()
+                        if isinstance(method_attrs, dict)
+                    }
+                    endpoints_refs[endpoint] = list(
+                        self.iter_endpoint_refs(endpoint, value)
+                    )
+                    if endpoints_sizes is not None:
+                        endpoints_sizes[endpoint] = get_endpoint_size(value)
+                elif keys[0] == "components":
+                    components = value
+                elif keys[0] == "tags":
+                    tags = value
+                else:
+                    header[keys[0]] = value
+
+        write_yaml(os.path.join(outdir, HEADER_FILE_NAME), header)
+        all_sections = self.get_sections(
+            header,
+            endpoints_tags,
+            components,
+            tags,
+            endpoints_refs,
+            endpoints_sizes,
+            tag_index=self.get_tag_index(tags),
+            graph=ComponentGraph(components),
+        )
+        del endpoints_tags, endpoints_refs, endpoints_sizes
+        output_paths = self.get_section_output_paths(outdir, all_sections)
+        shared_name = self.get_shared_section_name()
+        write_yaml(output_paths[shared_name], all_sections.pop(shared_name))
+
+        endpoint_sections = {}
+        pending = {}
         for section_name, section in all_sections.items():
-            with open(self.get_section_output_path(outdir, section_name), "w") as f:
-                f.write(yaml.dump(section, default_flow_style=False))
+            pending[section_name] = set(section["paths"])
+            for endpoint in section["paths"]:
+                endpoint_sections[endpoint] = section_name
+        with open(input_file) as f:
+            for (_, endpoint), endpoint_methods in iter_spec_entries(
+                f, only_paths=True
+            ):
+                section_name = endpoint_sections[endpoint]
+                if section_name not in pending:
+                    log.warning("Endpoint %s is defined more than once", endpoint)
+                    continue
+                all_sections[section_name]["paths"][endpoint] = endpoint_methods
+                pending[section_name].discard(endpoint)
+                if not pending[section_name]:
+                    del pending[section_name]
+                    write_yaml(
+                        output_paths[section_name], all_sections.pop(section_name)
+                    )
+
+    def run(self):
+        if self.args.get("max_section_size") and self.args.get("target_sections"):
+            log.error(
+                "Only one of --max-section-size and --target-sections can be used"
+            )
+            return 1
+        vc = ValidateCommand(self.config, self.args)
+        if not vc.validate_spec(self.args.get("input_file"), None, None):
+            log.error("Input OpenAPI spec is not valid, can't proceed with splitting.")
+            sys.exit(1)
+        log.info("Input OpenAPI spec is valid, proceeding with splitting.")
+        outdir = os.path.join(
+            constants.SPEC_REPO_SPEC_DIR, self.args.get("api_version")
+        )
+        if self.args.get("streaming"):
+            self.split_streaming(self.args.get("input_file"), outdir)
+        else:
+            self.split_loaded(self.args.get("input_file"), outdir)
         return 0
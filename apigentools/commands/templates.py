@@ -4,8 +4,11 @@
 # Copyright 2019-Present Datadog, Inc.
 import contextlib
 import glob
+import hashlib
+import json
 import logging
 import os
+import re
 import shutil
 import subprocess
 import tempfile
@@ -13,6 +16,7 @@ import time
 
 import click
 
+from apigentools import __version__
 from apigentools.commands.command import Command, run_command_with_config
 from apigentools.config import (
     OpenapiGitTemplatesConfig,
@@ -23,13 +27,20 @@ from apigentools.constants import (
     COMMAND_SYSTEM_KEY,
     OPENAPI_GENERATOR_GIT,
     SPEC_REPO_TEMPLATES_DIR,
+    TEMPLATES_CACHE_MAX_SIZE,
 )
-from apigentools.utils import run_command
+from apigentools.utils import directory_digest, env_or_val, run_command
 
 log = logging.getLogger(__name__)
 
 
 @click.command()
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_NO_CACHE", False, __type=bool),
+    help="Don't reuse patched templates stored in .apigentools-cache by previous runs",
+)
 @click.pass_context
 def templates(ctx, **kwargs):
     """Get upstream templates and apply downstream patches"""
@@ -45,6 +56,182 @@ class TemplatesCommand(Command):
         yield cn
         run_command(["docker", "rm", cn])
 
+    def resolve_git_committish(self, committish):
+        """Resolve committish of the openapi-generator repository to a commit SHA
+
+        Full SHAs are returned as they are, branches and tags are resolved with
+        ``git ls-remote``, so that templates are only reused from the cache until
+        the branch moves.
+
+        :param committish: Branch, tag or commit SHA
+        :type committish: ``str``
+        :return: Commit SHA or ``None`` if it can't be resolved (e.g. an abbreviated
+            SHA or a relative revision)
+        :rtype: ``str`` or ``NoneType``
+        """
+        if re.match(r"^[0-9a-f]{40}$", committish):
+            return committish
+        try:
+            res = run_command(["git", "ls-remote", OPENAPI_GENERATOR_GIT, committish])
+        except subprocess.CalledProcessError:
+            return None
+        refs = dict(
+            reversed(line.split("\t", 1)) for line in res.stdout.splitlines() if line
+        )
+        # "git checkout" prefers branches to tags, annotated tags are peeled
+        for ref in (
+            "refs/heads/{}".format(committish),
+            "refs/tags/{}^{{}}".format(committish),
+            "refs/tags/{}".format(committish),
+            committish,
+        ):
+            if ref in refs:
+                return refs[ref]
+        return None
+
+    def get_templates_cache_key(self, lc, spec_version, templates_cfg):
+        """Get key of patched templates in the cache
+
+        The key is a hash of the templates source (digest of the jar file or content
+        of the templates directory, git commit or ID of the image to take them
+        from), the templates config and the ordered contents of all patches.
+
+        :param lc: Config of language to get the key for
+        :type lc: ``LanguageConfig``
+        :param spec_version: Version to get the key for
+        :type spec_version: ``str``
+        :param templates_cfg: Templates config of the language/version
+        :type templates_cfg: ``TemplatesConfig``
+        :return: Hex digest or ``None`` if the source can't be hashed
+        :rtype: ``str`` or ``NoneType``
+        """
+        source = templates_cfg.source
+        key = hashlib.sha256()
+        key.update(
+            json.dumps(
+                {"apigentools_version": __version__, "source": source.dict()},
+                sort_keys=True,
+            ).encode("utf-8")
+        )
+        if isinstance(source, OpenapiGitTemplatesConfig):
+            commit = self.resolve_git_committish(source.git_committish)
+            if commit is None:
+                log.debug(
+                    "Can't resolve %s to a commit, not caching templates",
+                    source.git_committish,
+                )
+                return None
+            key.update(commit.encode("utf-8"))
+        elif not source.system:
+            image = lc.container_opts_for(spec_version).image
+            try:
+                res = run_command(
+                    ["docker", "image", "inspect", "--format", "{{.Id}}", image]
+                )
+            except subprocess.CalledProcessError:
+                log.debug("Can't get ID of image %s, not caching templates", image)
+                return None
+            key.update(res.stdout.strip().encode("utf-8"))
+        elif isinstance(source, OpenapiJarTemplatesConfig):
+            try:
+                with open(source.jar_path, "rb") as f:
+                    key.update(hashlib.sha256(f.read()).digest())
+            except OSError:
+                return None
+        elif isinstance(source, DirectoryTemplatesConfig):
+            key.update(
+                directory_digest(
+                    os.path.join(source.directory_path, source.templates_dir)
+                ).encode("utf-8")
+            )
+        else:
+            return None
+
+        for p in templates_cfg.patches:
+            key.update(p.encode("utf-8") + b"\0")
+            try:
+                with open(p, "rb") as f:
+                    key.update(hashlib.sha256(f.read()).digest())
+            except OSError:
+                return None
+        return key.hexdigest()
+
+    def restore_cached_templates(self, cached, outdir):
+        """Restore patched templates from the cache
+
+        :param cached: Path to the templates in the cache
+        :type cached: ``str``
+        :param outdir: Templates directory to restore them to
+        :type outdir: ``str``
+        :return: Whether the templates were restored
+        :rtype: ``bool``
+        """
+        if not os.path.isdir(cached):
+            return False
+        if os.path.exists(outdir):
+            shutil.rmtree(outdir)
+        shutil.copytree(cached, outdir)
+        # refresh mtime to mark the entry as recently used, see ``evict_templates_cache``
+        os.utime(cached)
+        return True
+
+    def evict_templates_cache(self, templates_cache_dir, max_size):
+        """Remove least recently used entries from the cache of patched templates
+        until its total size is at most ``max_size``.
+
+        :param templates_cache_dir: Directory with the cached templates
+        :type templates_cache_dir: ``str``
+        :param max_size: Maximum total size of the cached templates in bytes
+        :type max_size: ``int``
+        :return: Number of removed entries
+        :rtype: ``int``
+        """
+        entries = []
+        try:
+            for entry in os.scandir(templates_cache_dir):
+                # skip entries that other runs are just writing
+                if not entry.is_dir() or entry.name.endswith(".tmp"):
+                    continue
+                size = sum(
+                    os.path.getsize(os.path.join(root, f))
+                    for root, _, files in os.walk(entry.path)
+                    for f in files
+                )
+                entries.append((entry.stat().st_mtime_ns, size, entry.path))
+        except FileNotFoundError:
+            return 0
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            log.debug("Evicted %d entries from patched templates cache", removed)
+        return removed
+
+    def cache_templates(self, outdir, cached):
+        """Store patched templates in the cache
+
+        :param outdir: Templates directory with the patched templates
+        :type outdir: ``str``
+        :param cached: Path to store the templates to in the cache
+        :type cached: ``str``
+        """
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # copy to a temporary directory first, so that concurrent runs never see partial entries
+        tmp_path = "{}.{}.tmp".format(cached, os.getpid())
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        shutil.copytree(outdir, tmp_path)
+        try:
+            os.rename(tmp_path, cached)
+        except OSError:
+            # another run has cached the same templates in the meantime
+            shutil.rmtree(tmp_path)
+
     def templates_for_language_spec_version(self, lc, spec_version):
         # TODO: select directory specified by "templates_dir" in "templates.source"
         # *before* applying patches
@@ -59,6 +246,21 @@ class TemplatesCommand(Command):
             )
             return 0
 
+        outdir = os.path.join(SPEC_REPO_TEMPLATES_DIR, lc.language, spec_version)
+        cached = None
+        cache_dir = self.get_cache_dir()
+        if cache_dir is not None:
+            key = self.get_templates_cache_key(lc, spec_version, templates_cfg)
+            if key is not None:
+                cached = os.path.join(cache_dir, "templates", key)
+                if self.restore_cached_templates(cached, outdir):
+                    log.info(
+                        "Restored patched templates for %s/%s from cache",
+                        lc.language,
+                        spec_version,
+                    )
+                    return 0
+
         from_container = not templates_cfg.source.system
         source_type = templates_cfg.source.type
         with tempfile.TemporaryDirectory() as td:
@@ -163,13 +365,22 @@ class TemplatesCommand(Command):
                         return 1
 
             # copy the processed templates from the temporary dir to templates dir
-            outdir = os.path.join(SPEC_REPO_TEMPLATES_DIR, lc.language, spec_version)
             if os.path.exists(outdir):
                 shutil.rmtree(outdir)
             shutil.copytree(
                 os.path.join(copy_from, templates_cfg.source.templates_dir),
                 outdir,
             )
+        if cached is not None:
+            self.cache_templates(outdir, cached)
+            self.evict_templates_cache(
+                os.path.dirname(cached),
+                env_or_val(
+                    "APIGENTOOLS_TEMPLATES_CACHE_MAX_SIZE",
+                    TEMPLATES_CACHE_MAX_SIZE,
+                    __type=int,
+                ),
+            )
         return 0
 
     def run(self):
@@ -10,7 +10,7 @@ import click
 from apigentools import config
 from apigentools import constants
 from apigentools.commands.command import Command, run_command_with_config
-from apigentools.utils import write_full_spec, env_or_val
+from apigentools.utils import write_full_specs, env_or_val
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +24,36 @@ log = logging.getLogger(__name__)
     + "Note that if some languages override config's spec_sections, additional "
     + "files will be generated with name pattern 'full_spec.<lang>.yaml'",
 )
+@click.option(
+    "--full-spec-format",
+    type=click.Choice(
+        [constants.FULL_SPEC_FORMAT_JSON, constants.FULL_SPEC_FORMAT_YAML]
+    ),
+    default=env_or_val("APIGENTOOLS_FULL_SPEC_FORMAT", None),
+    help="Format of the full spec files to write (default: based on extension of the "
+    + "full spec file). With 'json', '.yaml' extension of the full spec file is replaced "
+    + "by '.json'",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_NO_CACHE", False, __type=bool),
+    help="Don't reuse results of previous runs stored in .apigentools-cache (merged full specs, parsed spec sections)",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=env_or_val("APIGENTOOLS_JOBS", 1, __type=int),
+    help="Number of parallel jobs to use (default: 1)",
+)
+@click.option(
+    "--prune-components",
+    is_flag=True,
+    default=env_or_val("APIGENTOOLS_PRUNE_COMPONENTS", False, __type=bool),
+    help="Remove components that aren't referenced from paths of the full spec files, "
+    + "neither directly nor through other components",
+)
 @click.argument("files", nargs=-1)
 @click.pass_context
 def validate(ctx, **kwargs):
@@ -78,6 +108,19 @@ class ValidateCommand(Command):
         # Keep track of the spec files validated
         validated_files = set()
         cmd_result = 0
+        # Generate full spec files as needed
+        for version, variants in self.get_full_spec_variants().items():
+            write_full_specs(
+                constants.SPEC_REPO_SPEC_DIR,
+                version,
+                variants,
+                jobs=self.args.get("jobs", 1),
+                cache_dir=self.get_cache_dir(),
+                full_spec_format=self.get_full_spec_format(),
+                prune_components=self.args.get("prune_components", False),
+                operation_filters=self.get_operation_filters(),
+            )
+
         fs_files = set()
         for language, version, fs_file in self.yield_lang_version_specfile():
             if fs_file in fs_files:
@@ -97,19 +140,10 @@ class ValidateCommand(Command):
                 }
                 validated_files.update(matching_files)
 
-            # Generate full spec file is needed
-            fs_path = write_full_spec(
-                constants.SPEC_REPO_SPEC_DIR,
-                version,
-                self.config.get_language_config(language).spec_sections_for(version),
-                fs_file,
-            )
-
             if files and not matching_files:
-                # Skip late so that the full spec is still written
                 continue
 
             # Validate a spec file only once
-            self.validate_spec(fs_path, language, version)
+            self.validate_spec(fs_file, language, version)
 
         return cmd_result
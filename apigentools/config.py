@@ -173,6 +173,22 @@ class VersionGeneration(BaseModel):
             v.postprocess(self)
 
 
+class OperationFilter(BaseModel):
+    """Rules selecting operations to keep in full spec of a language.
+
+    An operation is kept if it matches any of the ``include_*`` rules (or there are
+    none) and doesn't match any of the ``exclude_*`` rules.
+    """
+
+    include_tags: List[str] = []
+    exclude_tags: List[str] = []
+    include_operation_ids: List[str] = []
+    exclude_operation_ids: List[str] = []
+
+    def is_empty(self):
+        return not any(self.dict().values())
+
+
 class LanguageConfig(BaseModel):
     __slots__ = ("language", "user_agent_client_name")
 
@@ -185,6 +201,7 @@ class LanguageConfig(BaseModel):
     github_repo: Optional[str] = None
     github_org: Optional[str] = None
     library_version: Optional[str] = None
+    operations: Dict[str, OperationFilter] = {}
     spec_sections: Optional[Dict]
     spec_versions: Optional[List]
     validation_commands: Optional[List[ConfigCommand]]
@@ -249,6 +266,20 @@ class LanguageConfig(BaseModel):
     def spec_sections_for(self, version):
         return self.spec_sections[version]
 
+    def operation_filter_for(self, version):
+        """Get rules selecting operations to keep in full spec of given version
+
+        :param version: Spec version to get the rules for
+        :type version: ``str``
+        :return: Rules for the version (or the ``default`` ones) or ``None`` if all
+            operations are kept
+        :rtype: ``OperationFilter`` or ``NoneType``
+        """
+        operation_filter = self.operations.get(version, self.operations.get("default"))
+        if operation_filter is None or operation_filter.is_empty():
+            return None
+        return operation_filter
+
     def templates_config_for(self, version):
         return self.generation[version].templates
 
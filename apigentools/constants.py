@@ -15,6 +15,8 @@ COMMAND_WORKDIR_KEY = "workdir"
 CONFIG_CONTAINER_IMAGE_KEY = "container_apigentools_image"
 DEFAULT_CONFIG_FILE = "config.yaml"
 DEFAULT_CONTAINER_IMAGE = "datadog/apigentools:latest"
+FULL_SPEC_FORMAT_JSON = "json"
+FULL_SPEC_FORMAT_YAML = "yaml"
 LANGUAGE_OAPI_CONFIGS = "languages"
 MIN_CONFIG_VERSION = Version("1.0")
 OPENAPI_GENERATOR_GIT = "https://github.com/OpenAPITools/openapi-generator"
@@ -25,11 +27,14 @@ SHARED_FILE_NAME = "shared.yaml"
 REDACTED_OUT_SECRET = "<apigentools:secret-value-redacted-out>"
 OPENAPI_JAR = "openapi-generator.jar"
 OPENAPI_JAR_IN_CONTAINER = "/usr/bin/openapi-generator-cli.jar"
+PARSE_CACHE_MAX_SIZE = 256 * 1024 * 1024
+SPEC_REPO_CACHE_DIR = ".apigentools-cache"
 SPEC_REPO_CONFIG_DIR = "config"
 SPEC_REPO_GENERATED_DIR = "generated"
 SPEC_REPO_LANGUAGES_CONFIG_DIR = "languages"
 SPEC_REPO_SPEC_DIR = "spec"
 SPEC_REPO_TEMPLATES_DIR = "templates"
+TEMPLATES_CACHE_MAX_SIZE = 128 * 1024 * 1024
 TEMPLATES_SOURCE_LOCAL_DIR = "local-dir"
 TEMPLATES_SOURCE_OPENAPI_GIT = "openapi-git"
 TEMPLATES_SOURCE_OPENAPI_JAR = "openapi-jar"
@@ -0,0 +1,404 @@
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the 3-clause BSD style license (see LICENSE).
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+import glob
+import logging
+import mmap
+import os
+import re
+import struct
+import subprocess
+
+log = logging.getLogger(__name__)
+
+SHA_RE = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+ABBREV_SHA_RE = re.compile(r"^[0-9a-f]{4,64}$")
+# refs that can be resolved from files, anything else (e.g. "HEAD~1") is left to git
+REF_NAME_RE = re.compile(r"^[A-Za-z0-9._/-]+$")
+# order in which git looks up short ref names, see gitrevisions(7)
+REF_LOOKUP_TEMPLATES = [
+    "{}",
+    "refs/{}",
+    "refs/tags/{}",
+    "refs/heads/{}",
+    "refs/remotes/{}",
+    "refs/remotes/{}/HEAD",
+]
+# maximum depth of symbolic refs to follow, same as git
+MAX_SYMREF_DEPTH = 5
+# minimal length of abbreviated commit SHAs with core.abbrev=auto, same as git
+FALLBACK_DEFAULT_ABBREV = 7
+# minimal value of core.abbrev accepted by git
+MINIMUM_ABBREV = 4
+PACK_IDX_SIGNATURE = b"\377tOc"
+# environment variables changing where git reads config or objects from
+CONFIG_ENVIRONMENT_VARIABLES = [
+    "GIT_CONFIG",
+    "GIT_CONFIG_COUNT",
+    "GIT_CONFIG_GLOBAL",
+    "GIT_CONFIG_NOSYSTEM",
+    "GIT_CONFIG_PARAMETERS",
+    "GIT_CONFIG_SYSTEM",
+    "GIT_OBJECT_DIRECTORY",
+    "GIT_ALTERNATE_OBJECT_DIRECTORIES",
+]
+
+# GitMetadata objects, keyed by absolute path of the repository
+_repositories = {}
+
+
+class UnsupportedLayoutError(Exception):
+    """Raised when a repository can't be read without running git"""
+
+
+def _run_git(args, cwd):
+    # imported here, as apigentools.utils uses this module
+    from apigentools.utils import run_command
+
+    return run_command(["git"] + args, cwd=cwd, log_level=logging.DEBUG)
+
+
+class GitMetadata:
+    """Reads metadata of a git repository (HEAD and refs) directly from its
+    ``.git`` directory, falling back to running ``git`` for unusual layouts
+    (e.g. ``GIT_DIR`` set in environment or reftable ref storage).
+    """
+
+    def __init__(self, repo_path="."):
+        self.repo_path = os.path.abspath(repo_path)
+        self._git_dir = None
+        self._common_dir = None
+        self._packed_refs = None
+        self._head_commit = None
+        self._short_head_commit = None
+
+    @classmethod
+    def for_path(cls, repo_path="."):
+        """Get memoized metadata reader for a repository
+
+        :param repo_path: Path of the repository
+        :type repo_path: ``str``
+        :return: Metadata reader of the repository
+        :rtype: ``GitMetadata``
+        """
+        key = os.path.abspath(repo_path)
+        if key not in _repositories:
+            _repositories[key] = cls(key)
+        return _repositories[key]
+
+    def _find_git_dir(self):
+        """Find git directory and common directory (which differs for worktrees)
+
+        :return: Git directory and common directory, ``(None, None)`` if this
+            isn't a git repository
+        :rtype: ``tuple``
+        """
+        if os.environ.get("GIT_DIR") or os.environ.get("GIT_COMMON_DIR"):
+            raise UnsupportedLayoutError("git directory set in environment")
+        path = self.repo_path
+        while True:
+            dot_git = os.path.join(path, ".git")
+            if os.path.isdir(dot_git):
+                git_dir = dot_git
+                break
+            if os.path.isfile(dot_git):
+                # worktrees and submodules have a file pointing to the git directory
+                with open(dot_git) as f:
+                    content = f.read().strip()
+                if not content.startswith("gitdir: "):
+                    raise UnsupportedLayoutError("unknown .git file content")
+                git_dir = os.path.join(path, content[len("gitdir: ") :])
+                break
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None, None
+            path = parent
+
+        common_dir = git_dir
+        commondir_file = os.path.join(git_dir, "commondir")
+        if os.path.isfile(commondir_file):
+            with open(commondir_file) as f:
+                common_dir = os.path.join(git_dir, f.read().strip())
+        if os.path.isdir(os.path.join(common_dir, "reftable")):
+            raise UnsupportedLayoutError("reftable ref storage")
+        return git_dir, common_dir
+
+    def _ensure_git_dir(self):
+        if self._git_dir is None:
+            self._git_dir, self._common_dir = self._find_git_dir()
+            if self._git_dir is None:
+                self._git_dir = self._common_dir = ""
+        return bool(self._git_dir)
+
+    def _read_packed_refs(self):
+        if self._packed_refs is None:
+            self._packed_refs = {}
+            try:
+                with open(os.path.join(self._common_dir, "packed-refs")) as f:
+                    for line in f:
+                        if line.startswith(("#", "^")):
+                            # header or peeled value of the previous (tag) ref
+                            continue
+                        parts = line.split()
+                        if len(parts) == 2:
+                            self._packed_refs[parts[1]] = parts[0]
+            except FileNotFoundError:
+                pass
+        return self._packed_refs
+
+    def _read_ref_file(self, ref):
+        # HEAD and other pseudorefs are per-worktree, shared refs live in common dir
+        base = self._common_dir if ref.startswith("refs/") else self._git_dir
+        try:
+            with open(os.path.join(base, ref)) as f:
+                return f.read().strip()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+
+    def _resolve_ref(self, ref, depth=0):
+        """Resolve full ref name (e.g. ``refs/heads/master`` or ``HEAD``) to commit SHA
+
+        :return: Commit SHA or ``None`` if the ref doesn't exist
+        :rtype: ``str`` or ``NoneType``
+        """
+        if depth > MAX_SYMREF_DEPTH:
+            raise UnsupportedLayoutError("too deeply nested symbolic refs")
+        value = self._read_ref_file(ref)
+        if value is None:
+            return self._read_packed_refs().get(ref)
+        if value.startswith("ref: "):
+            return self._resolve_ref(value[len("ref: ") :], depth + 1)
+        if not SHA_RE.match(value):
+            raise UnsupportedLayoutError("unknown content of ref {}".format(ref))
+        return value
+
+    def head_commit(self):
+        """Get SHA of the commit checked out in the repository (memoized)
+
+        :return: Commit SHA or ``None`` if this isn't a git repository or HEAD
+            doesn't point to a commit yet
+        :rtype: ``str`` or ``NoneType``
+        """
+        if self._head_commit is None:
+            try:
+                if self._ensure_git_dir():
+                    self._head_commit = self._resolve_ref("HEAD") or ""
+                else:
+                    self._head_commit = ""
+            except UnsupportedLayoutError as e:
+                log.debug("Running git to read HEAD of %s: %s", self.repo_path, e)
+                try:
+                    res = _run_git(["rev-parse", "HEAD"], self.repo_path)
+                    self._head_commit = res.stdout.strip()
+                except subprocess.CalledProcessError:
+                    self._head_commit = ""
+        return self._head_commit or None
+
+    def short_head_commit(self):
+        """Get unique abbreviation of SHA of the commit checked out in the repository,
+        like ``git rev-parse --short HEAD`` (memoized)
+
+        The abbreviation honours ``core.abbrev`` and is extended until it doesn't
+        match any other object of the repository; git is run when that can't be
+        determined reliably (e.g. alternate object directories or config includes).
+
+        :return: Abbreviated commit SHA or ``None`` if this isn't a git repository
+            or HEAD doesn't point to a commit yet
+        :rtype: ``str`` or ``NoneType``
+        """
+        if self._short_head_commit is None:
+            head = self.head_commit()
+            if head is None:
+                return None
+            try:
+                if not self._git_dir:
+                    raise UnsupportedLayoutError("git directory wasn't found")
+                self._short_head_commit = self._abbreviate(head)
+            except UnsupportedLayoutError as e:
+                log.debug("Running git to abbreviate HEAD of %s: %s", self.repo_path, e)
+                res = _run_git(["rev-parse", "--short", head], self.repo_path)
+                self._short_head_commit = res.stdout.strip()
+        return self._short_head_commit
+
+    def _read_core_abbrev(self):
+        """Read ``core.abbrev`` from system, global and repository config
+
+        :return: Value of ``core.abbrev`` or ``None`` if it's not set
+        :rtype: ``str`` or ``NoneType``
+        """
+        if any(os.environ.get(var) for var in CONFIG_ENVIRONMENT_VARIABLES):
+            raise UnsupportedLayoutError("git config or objects set in environment")
+        home = os.path.expanduser("~")
+        xdg_config = os.environ.get("XDG_CONFIG_HOME") or os.path.join(home, ".config")
+        config_files = [
+            "/etc/gitconfig",
+            os.path.join(xdg_config, "git", "config"),
+            os.path.join(home, ".gitconfig"),
+            os.path.join(self._common_dir, "config"),
+            os.path.join(self._git_dir, "config.worktree"),
+        ]
+        value = None
+        for config_file in config_files:
+            try:
+                with open(config_file) as f:
+                    lines = f.read().splitlines()
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            section = None
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith(("#", ";")):
+                    continue
+                if line.endswith("\\") or "include" in line.lower():
+                    raise UnsupportedLayoutError("unsupported config in " + config_file)
+                if line.startswith("["):
+                    section = line[1 : line.find("]")].strip().lower()
+                    line = line[line.find("]") + 1 :].strip()
+                    if not line:
+                        continue
+                key, _, val = line.partition("=")
+                if section == "core" and key.strip().lower() == "abbrev":
+                    value = re.split(r"[#;]", val)[0].strip().strip('"').lower()
+        return value
+
+    def _abbrev_length(self, pack_object_count):
+        """Get minimal abbreviation length according to ``core.abbrev``
+
+        :param pack_object_count: Number of objects in packs of the repository
+        :type pack_object_count: ``int``
+        :return: Minimal abbreviation length
+        :rtype: ``int``
+        """
+        value = self._read_core_abbrev()
+        if value is None or value == "auto":
+            # git scales the length with the (approximate) number of objects
+            return max(
+                FALLBACK_DEFAULT_ABBREV, (pack_object_count.bit_length() + 1) // 2
+            )
+        if value in ("no", "false", "off"):
+            return 40
+        if value.isdigit() and int(value) >= MINIMUM_ABBREV:
+            return min(int(value), 40)
+        raise UnsupportedLayoutError("unknown core.abbrev value " + value)
+
+    def _abbreviate(self, sha):
+        """Get the shortest abbreviation of ``sha`` that honours ``core.abbrev`` and
+        doesn't match any other object of the repository
+
+        :return: Abbreviated SHA
+        :rtype: ``str``
+        """
+        if len(sha) != 40:
+            raise UnsupportedLayoutError("object format other than SHA-1")
+        objects_dir = os.path.join(self._common_dir, "objects")
+        if os.path.exists(os.path.join(objects_dir, "info", "alternates")):
+            raise UnsupportedLayoutError("alternate object directories")
+
+        # length of the longest prefix shared with another object
+        shared = 0
+        try:
+            loose = os.listdir(os.path.join(objects_dir, sha[:2]))
+        except FileNotFoundError:
+            loose = []
+        for name in loose:
+            if len(name) == 38 and name != sha[2:]:
+                shared = max(shared, 2 + _common_prefix_length(name, sha[2:]))
+
+        pack_object_count = 0
+        binsha = bytes.fromhex(sha)
+        for idx_path in glob.glob(os.path.join(objects_dir, "pack", "*.idx")):
+            count, neighbours = _pack_idx_neighbours(idx_path, binsha)
+            pack_object_count += count
+            for neighbour in neighbours:
+                shared = max(shared, _common_prefix_length(neighbour.hex(), sha))
+
+        return sha[: max(self._abbrev_length(pack_object_count), shared + 1)]
+
+    def has_revision(self, revision):
+        """Check whether a revision (e.g. branch name) exists, like ``git rev-parse --verify``
+
+        Not memoized, as refs are created while apigentools runs.
+
+        :param revision: The revision
+        :type revision: ``str``
+        :return: Whether the revision exists
+        :rtype: ``bool``
+        """
+        try:
+            if (
+                not REF_NAME_RE.match(revision)
+                or ".." in revision
+                or ABBREV_SHA_RE.match(revision)
+            ):
+                raise UnsupportedLayoutError("revision {} isn't a ref".format(revision))
+            if not self._ensure_git_dir():
+                return False
+            # packed refs may have changed since the last check
+            self._packed_refs = None
+            return any(
+                self._resolve_ref(tpl.format(revision)) is not None
+                for tpl in REF_LOOKUP_TEMPLATES
+            )
+        except UnsupportedLayoutError as e:
+            log.debug("Running git to verify %s: %s", revision, e)
+            try:
+                _run_git(["rev-parse", "--verify", revision], self.repo_path)
+            except subprocess.CalledProcessError:
+                return False
+            return True
+
+
+def _common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def _pack_idx_neighbours(idx_path, binsha):
+    """Find objects of a pack sorted right before and after given object,
+    i.e. the ones sharing the longest prefix with it
+
+    :param idx_path: Path to the (version 2) index of the pack
+    :type idx_path: ``str``
+    :param binsha: Binary SHA of the object
+    :type binsha: ``bytes``
+    :return: Number of objects in the pack and binary SHAs of the neighbours
+    :rtype: ``tuple``
+    """
+    with open(idx_path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as idx:
+        if idx[:4] != PACK_IDX_SIGNATURE or struct.unpack(">I", idx[4:8])[0] != 2:
+            raise UnsupportedLayoutError("unknown pack index format " + idx_path)
+        fanout = struct.unpack(">256I", idx[8:1032])
+
+        def sha_at(i):
+            return idx[1032 + 20 * i : 1052 + 20 * i]
+
+        # objects sharing the first byte are between these positions
+        lo = fanout[binsha[0] - 1] if binsha[0] else 0
+        hi = end = fanout[binsha[0]]
+        start = lo
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if sha_at(mid) < binsha:
+                lo = mid + 1
+            else:
+                hi = mid
+        neighbours = []
+        if lo > start:
+            neighbours.append(sha_at(lo - 1))
+        if lo < end and sha_at(lo) == binsha:
+            lo += 1
+        if lo < end:
+            neighbours.append(sha_at(lo))
+        return fanout[255], neighbours
+
+
+def clear_git_metadata_cache():
+    """Forget all git metadata read so far in this process"""
+    _repositories.clear()
@@ -2,14 +2,20 @@
 # under the 3-clause BSD style license (see LICENSE).
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2019-Present Datadog, Inc.
+import concurrent.futures
 import contextlib
 import copy
+import datetime
 import glob
+import hashlib
+import json
 import logging
 import os
+import pickle
 import re
 import subprocess
 import sys
+import urllib.parse
 
 from packaging import version
 import yaml
@@ -18,9 +24,14 @@ from yaml import CSafeLoader
 
 from apigentools import constants, __version__
 from apigentools import errors
+from apigentools.git_metadata import GitMetadata
 
 log = logging.getLogger(__name__)
 
+OPERATION_METHODS = frozenset(
+    ["delete", "get", "head", "options", "patch", "post", "put", "trace"]
+)
+
 COMPONENT_FIELDS = [
     "schemas",
     "parameters",
@@ -98,7 +109,10 @@ def env_or_val(env, val, *args, __type=str, **kwargs):
 
 
 def get_current_commit(repo_path="."):
-    """Get short name of the current commit
+    """Get short name of the current commit, same as ``git rev-parse --short HEAD``
+
+    HEAD is read directly from the ``.git`` directory and memoized for the
+    rest of the run, see ``apigentools.git_metadata.GitMetadata``.
 
     :param repo_path: Path of the repository to get current commit for
     :type repo_path: ``str``
@@ -106,19 +120,15 @@ def get_current_commit(repo_path="."):
     :rtype: ``str``
     """
     log.debug("Getting current commit for stamping ...")
-    with change_cwd(repo_path):
-        try:
-            res = run_command(
-                ["git", "rev-parse", "--short", "HEAD"], log_level=logging.DEBUG
-            )
-        except subprocess.CalledProcessError:
-            # not a git repository
-            log.debug(
-                "Failed getting current git commit for %s, not a git repository",
-                repo_path,
-            )
-            return None
-        return res.stdout.strip()
+    commit = GitMetadata.for_path(repo_path).short_head_commit()
+    if commit is None:
+        # not a git repository
+        log.debug(
+            "Failed getting current git commit for %s, not a git repository",
+            repo_path,
+        )
+        return None
+    return commit
 
 
 @contextlib.contextmanager
@@ -259,6 +269,38 @@ def fmt_cmd_out_for_log(result_or_error, combine_out_err):
         )
 
 
+def get_full_spec_format(fs_path):
+    """Get format of full spec file based on its extension
+
+    :param fs_path: Path (or name) of the full spec file
+    :type fs_path: ``str``
+    :return: ``"json"`` for files with ``.json`` extension, ``"yaml"`` otherwise
+    :rtype: ``str``
+    """
+    if os.path.splitext(fs_path)[1].lower() == ".json":
+        return constants.FULL_SPEC_FORMAT_JSON
+    return constants.FULL_SPEC_FORMAT_YAML
+
+
+def get_full_spec_file_name_for_format(default_fsf, full_spec_format):
+    """Get full-spec filename with extension matching given format
+
+    For example, ``full_spec.yaml`` becomes ``full_spec.json`` for ``json`` format.
+    Names with extension other than ``.json``, ``.yaml`` and ``.yml`` are kept as they are.
+
+    :param default_fsf: a filename for the general spec
+    :type default_fsf: ``str``
+    :param full_spec_format: ``"json"`` or ``"yaml"``
+    :type full_spec_format: ``str``
+    """
+    root, ext = os.path.splitext(default_fsf)
+    if ext.lower() not in (".json", ".yaml", ".yml"):
+        return default_fsf
+    if get_full_spec_format(default_fsf) == full_spec_format:
+        return default_fsf
+    return root + "." + full_spec_format
+
+
 def get_full_spec_file_name(default_fsf, l):
     """Get full-spec filename for given language
 
@@ -286,8 +328,1108 @@ def get_full_spec_file_name(default_fsf, l):
     return "{}.{}".format(default_fsf, l)
 
 
+# Parsed spec sections shared by all merges within this process, keyed by absolute
+# path of the section file, values are ``((path, mtime, size), parsed)`` so that
+# only the latest version of every file is kept. Parsed sections are pickled, so that
+# every consumer gets its own copy that it can modify without affecting the others.
+_parsed_spec_sections = {}
+# SHA256 digests of spec section files, stored the same way as ``_parsed_spec_sections``
+_spec_section_digests = {}
+# Merge states written by this process, keyed by path of their file, so that
+# repeated merges (e.g. ``merge --watch``) don't need to read them back; mergers
+# are only kept here (with ``keep_in_memory``), they're never saved to the cache
+_merge_states = {}
+
+
+def _spec_section_key(fpath):
+    stat = os.stat(fpath)
+    return os.path.abspath(fpath), stat.st_mtime_ns, stat.st_size
+
+
+def _get_cached(cache, key):
+    entry = cache.get(key[0])
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    return None
+
+
+def _set_cached(cache, key, value):
+    # replaces value stored for the previous version of the file, so that the
+    # caches don't grow when files are modified over and over (``merge --watch``)
+    cache[key[0]] = (key, value)
+
+
+def spec_section_digest(fpath):
+    """Get SHA256 digest of content of given spec section file
+
+    :param fpath: Path to the spec section file
+    :type fpath: ``str``
+    :return: Hex digest of the file content
+    :rtype: ``str``
+    """
+    key = _spec_section_key(fpath)
+    digest = _get_cached(_spec_section_digests, key)
+    if digest is None:
+        with open(fpath, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        _set_cached(_spec_section_digests, key, digest)
+    return digest
+
+
+def _parse_spec_section(fpath):
+    with open(fpath) as infile:
+        loaded = yaml.load(infile, Loader=CSafeLoader)
+    return pickle.dumps(loaded, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def clear_spec_sections_cache():
+    """Forget all spec sections parsed so far in this process"""
+    _parsed_spec_sections.clear()
+    _spec_section_digests.clear()
+    _merge_states.clear()
+
+
+def _parsed_cache_path(cache_dir, fpath):
+    # parsed content depends on the loader too, so include versions in the key
+    key = hashlib.sha256(
+        "{}:{}:{}".format(
+            __version__, yaml.__version__, spec_section_digest(fpath)
+        ).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(cache_dir, "parsed", key + ".pickle")
+
+
+def _read_parsed_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    try:
+        # refresh mtime to mark the entry as recently used for LRU eviction
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return data
+
+
+def _write_parsed_cache(cache_path, data):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # write to a temporary file first, so that concurrent runs never see partial entries
+    tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, cache_path)
+
+
+def evict_parsed_cache(cache_dir, max_size):
+    """Remove least recently used entries from the on-disk cache of parsed spec sections
+    until its total size is at most ``max_size``.
+
+    :param cache_dir: Cache directory containing the ``parsed`` subdirectory
+    :type cache_dir: ``str``
+    :param max_size: Maximum total size of the cached entries in bytes
+    :type max_size: ``int``
+    :return: Number of removed entries
+    :rtype: ``int``
+    """
+    parsed_dir = os.path.join(cache_dir, "parsed")
+    try:
+        entries = [
+            (e.stat().st_mtime_ns, e.stat().st_size, e.path)
+            for e in os.scandir(parsed_dir)
+            if e.name.endswith(".pickle")
+        ]
+    except FileNotFoundError:
+        return 0
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        log.debug("Evicted %d entries from parsed spec sections cache", removed)
+    return removed
+
+
+def load_spec_section(fpath, filter_sections=None, cache_dir=None):
+    """Load a single spec section file
+
+    :param fpath: Path to the spec section file
+    :type fpath: ``str``
+    :param filter_sections: If specified, list of spec keys to remove
+    :type filter_sections: ``list`` of ``str`` or ``NoneType``
+    :param cache_dir: If specified, parsed spec section is cached in this directory
+    :type cache_dir: ``str`` or ``NoneType``
+    :return: Parsed spec section
+    :rtype: ``dict``
+    """
+    return load_spec_sections([fpath], filter_sections, cache_dir=cache_dir)[0]
+
+
+def load_spec_sections(fpaths, filter_sections=None, jobs=1, cache_dir=None):
+    """Load multiple spec section files, optionally in parallel
+
+    Every file is only parsed once per process (unless it's modified); the returned
+    sections are always fresh copies, so callers are free to modify them.
+
+    :param fpaths: Paths to the spec section files
+    :type fpaths: ``list`` of ``str``
+    :param filter_sections: If specified, list of spec keys to remove
+    :type filter_sections: ``list`` of ``str`` or ``NoneType``
+    :param jobs: Number of processes to parse the files with (``1`` parses
+        the files sequentially in the current process)
+    :type jobs: ``int``
+    :param cache_dir: If specified, parsed spec sections are cached in this directory
+        and reused by subsequent runs if the content of the section file didn't change
+    :type cache_dir: ``str`` or ``NoneType``
+    :return: Parsed spec sections in the same order as ``fpaths``
+    :rtype: ``list`` of ``dict``
+    """
+    keys = [_spec_section_key(fpath) for fpath in fpaths]
+    missing = {}
+    for fpath, key in zip(fpaths, keys):
+        if key in missing or _get_cached(_parsed_spec_sections, key) is not None:
+            continue
+        if cache_dir is not None:
+            data = _read_parsed_cache(_parsed_cache_path(cache_dir, fpath))
+            if data is not None:
+                log.debug("Parsed spec sections cache hit for %s", fpath)
+                _set_cached(_parsed_spec_sections, key, data)
+                continue
+            log.debug("Parsed spec sections cache miss for %s", fpath)
+        missing[key] = fpath
+
+    if jobs > 1 and len(missing) > 1:
+        log.debug("Parsing %d spec sections with %d processes", len(missing), jobs)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(jobs, len(missing))
+        ) as executor:
+            parsed = list(executor.map(_parse_spec_section, missing.values()))
+    else:
+        parsed = [_parse_spec_section(fpath) for fpath in missing.values()]
+    for key, data in zip(missing, parsed):
+        _set_cached(_parsed_spec_sections, key, data)
+
+    if cache_dir is not None and missing:
+        for fpath, data in zip(missing.values(), parsed):
+            _write_parsed_cache(_parsed_cache_path(cache_dir, fpath), data)
+        evict_parsed_cache(
+            cache_dir,
+            env_or_val(
+                "APIGENTOOLS_PARSE_CACHE_MAX_SIZE",
+                constants.PARSE_CACHE_MAX_SIZE,
+                __type=int,
+            ),
+        )
+
+    result = []
+    for fpath, key in zip(fpaths, keys):
+        loaded = pickle.loads(_get_cached(_parsed_spec_sections, key))
+        if filter_sections:
+            removed = prune_keys(loaded, filter_sections)
+            log.debug("Filtered out %d nodes from %s", removed, fpath)
+        result.append(loaded)
+    return result
+
+
+def full_spec_fingerprint(fpaths, options):
+    """Compute fingerprint of all inputs that determine content of a full spec file
+
+    :param fpaths: Paths to the spec section files
+    :type fpaths: ``list`` of ``str``
+    :param options: JSON-serializable options that influence the output
+        (e.g. list of spec sections or keys to filter out)
+    :type options: ``dict``
+    :return: Hex digest of the fingerprint
+    :rtype: ``str``
+    """
+    fingerprint = hashlib.sha256()
+    fingerprint.update(
+        json.dumps(
+            {"apigentools_version": __version__, "options": options}, sort_keys=True
+        ).encode("utf-8")
+    )
+    for fpath in fpaths:
+        fingerprint.update(spec_section_digest(fpath).encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def directory_digest(path):
+    """Compute digest of content of a directory tree
+
+    Relative paths and contents of all files are included, so renaming a file
+    changes the digest too.
+
+    :param path: Path to the directory
+    :type path: ``str``
+    :return: Hex digest of the directory tree
+    :rtype: ``str``
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            fpath = os.path.join(root, filename)
+            digest.update(os.path.relpath(fpath, path).encode("utf-8") + b"\0")
+            with open(fpath, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _full_spec_fingerprint_path(cache_dir, fs_path):
+    key = hashlib.sha256(os.path.abspath(fs_path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "fingerprints", key + ".json")
+
+
+def _read_full_spec_fingerprint(cache_dir, fs_path):
+    """Return fingerprint recorded for ``fs_path`` or ``None`` if there is no valid record.
+
+    The record is only valid if ``fs_path`` wasn't modified since it was written.
+    """
+    fp_path = _full_spec_fingerprint_path(cache_dir, fs_path)
+    try:
+        with open(fp_path) as f:
+            record = json.load(f)
+        stat = os.stat(fs_path)
+    except (OSError, ValueError):
+        return None
+    if record.get("size") != stat.st_size or record.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return record.get("fingerprint")
+
+
+def _write_full_spec_fingerprint(cache_dir, fs_path, fingerprint):
+    fp_path = _full_spec_fingerprint_path(cache_dir, fs_path)
+    os.makedirs(os.path.dirname(fp_path), exist_ok=True)
+    stat = os.stat(fs_path)
+    with open(fp_path, "w") as f:
+        json.dump(
+            {
+                "fingerprint": fingerprint,
+                "fs_path": fs_path,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+            },
+            f,
+        )
+
+
+def _has_shared_objects(data):
+    """Check whether any non-scalar object appears more than once in ``data``
+    (which would make the YAML emitter use anchors and aliases for it).
+    """
+    seen = set()
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if item is None or isinstance(item, (str, bytes, bool, int, float)):
+            continue
+        if id(item) in seen:
+            return True
+        seen.add(id(item))
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+def _emit_node(dumper, node):
+    """Emit events for given representation node, the same way ``yaml.serialize`` would
+    (except for anchors/aliases, see ``_has_shared_objects``).
+    """
+    if isinstance(node, yaml.ScalarNode):
+        detected_tag = dumper.resolve(yaml.ScalarNode, node.value, (True, False))
+        default_tag = dumper.resolve(yaml.ScalarNode, node.value, (False, True))
+        implicit = (node.tag == detected_tag), (node.tag == default_tag)
+        dumper.emit(
+            yaml.ScalarEvent(None, node.tag, implicit, node.value, style=node.style)
+        )
+    elif isinstance(node, yaml.SequenceNode):
+        implicit = node.tag == dumper.resolve(yaml.SequenceNode, node.value, True)
+        dumper.emit(
+            yaml.SequenceStartEvent(
+                None, node.tag, implicit, flow_style=node.flow_style
+            )
+        )
+        for item in node.value:
+            _emit_node(dumper, item)
+        dumper.emit(yaml.SequenceEndEvent())
+    elif isinstance(node, yaml.MappingNode):
+        implicit = node.tag == dumper.resolve(yaml.MappingNode, node.value, True)
+        dumper.emit(
+            yaml.MappingStartEvent(None, node.tag, implicit, flow_style=node.flow_style)
+        )
+        for key, value in node.value:
+            _emit_node(dumper, key)
+            _emit_node(dumper, value)
+        dumper.emit(yaml.MappingEndEvent())
+
+
+def _emit_data(dumper, data):
+    _emit_node(dumper, dumper.represent_data(data))
+    # drop the representation of this part before representing the next one
+    dumper.represented_objects = {}
+    dumper.object_keeper = []
+    dumper.alias_key = None
+
+
+def _render_entries(parent_keys, mapping, rendered, new_rendered):
+    """Render every entry of ``mapping`` nested under ``parent_keys`` in the full
+    spec, reusing texts from ``rendered`` for values that didn't change
+    """
+    parts = []
+    for key in sorted(mapping):
+        value = mapping[key]
+        # merged path items are recreated on every merge, so compare their operations
+        values = list(value.values()) if parent_keys == ("paths",) else [value]
+        cache_key = parent_keys + (key,)
+        cached = rendered.get(cache_key)
+        if (
+            cached is None
+            or len(cached[0]) != len(values)
+            or any(a is not b for a, b in zip(cached[0], values))
+        ):
+            document = {key: value}
+            for parent_key in reversed(parent_keys):
+                document = {parent_key: document}
+            text = yaml.dump(document, Dumper=CSafeDumper)
+            # strip lines with the parent keys
+            cached = values, text.split("\n", len(parent_keys))[-1]
+        new_rendered[cache_key] = cached
+        parts.append(cached[1])
+    return parts
+
+
+def _render_full_spec(full_spec, rendered):
+    """Render full spec as YAML, entry by entry for paths and components
+
+    :return: Rendered YAML document and texts of the entries to reuse next time
+    :rtype: ``tuple``
+    """
+    new_rendered = {}
+    parts = []
+    for key in sorted(full_spec):
+        value = full_spec[key]
+        if key == "paths" and isinstance(value, dict) and value:
+            parts.append("paths:\n")
+            parts.extend(_render_entries(("paths",), value, rendered, new_rendered))
+        elif key == "components" and isinstance(value, dict) and value:
+            parts.append("components:\n")
+            for field in sorted(value):
+                if isinstance(value[field], dict) and value[field]:
+                    parts.append("  {}:\n".format(field))
+                    parts.extend(
+                        _render_entries(
+                            ("components", field), value[field], rendered, new_rendered
+                        )
+                    )
+                else:
+                    parts.append(
+                        yaml.dump(
+                            {"components": {field: value[field]}}, Dumper=CSafeDumper
+                        ).split("\n", 1)[1]
+                    )
+        else:
+            parts.append(yaml.dump({key: value}, Dumper=CSafeDumper))
+    return "".join(parts), new_rendered
+
+
+def dump_full_spec(full_spec, stream, shared_objects=None, rendered=None):
+    """Dump full spec as YAML to given stream.
+
+    The output is the same as with ``yaml.dump(full_spec, stream, Dumper=CSafeDumper)``,
+    but the spec is emitted part by part (every top-level key and every field of
+    ``components`` separately), so that representation of the whole document is never
+    held in memory at once.
+
+    :param full_spec: Full spec to dump
+    :type full_spec: ``dict``
+    :param stream: Stream to write the spec to
+    :type stream: file-like object
+    :param shared_objects: Whether any object appears in the spec more than once,
+        checked if not specified
+    :type shared_objects: ``bool`` or ``NoneType``
+    :param rendered: If specified, the spec is rendered entry by entry (every path
+        and every component), reusing texts of entries that didn't change since the
+        previous dump with the same ``rendered`` dict; this is faster for repeated
+        dumps of mostly the same spec, but keeps the whole output in memory
+    :type rendered: ``dict`` or ``NoneType``
+    """
+    if shared_objects is None:
+        shared_objects = _has_shared_objects(full_spec)
+    if shared_objects:
+        # anchors and aliases can only be emitted when the whole document is known
+        yaml.dump(full_spec, stream, Dumper=CSafeDumper)
+        return
+
+    if rendered is not None and full_spec:
+        text, new_rendered = _render_full_spec(full_spec, rendered)
+        rendered.clear()
+        rendered.update(new_rendered)
+        stream.write(text)
+        return
+
+    dumper = CSafeDumper(stream)
+    map_tag = "tag:yaml.org,2002:map"
+    try:
+        dumper.open()
+        dumper.emit(yaml.DocumentStartEvent(explicit=False))
+        dumper.emit(yaml.MappingStartEvent(None, map_tag, True, flow_style=False))
+        for key in sorted(full_spec):
+            value = full_spec[key]
+            _emit_data(dumper, key)
+            if key == "components" and isinstance(value, dict) and value:
+                dumper.emit(
+                    yaml.MappingStartEvent(None, map_tag, True, flow_style=False)
+                )
+                for field in sorted(value):
+                    _emit_data(dumper, field)
+                    _emit_data(dumper, value[field])
+                dumper.emit(yaml.MappingEndEvent())
+            else:
+                _emit_data(dumper, value)
+        dumper.emit(yaml.MappingEndEvent())
+        dumper.emit(yaml.DocumentEndEvent(explicit=False))
+        dumper.close()
+    finally:
+        dumper.dispose()
+
+
+class SpecMerger:
+    """Merges spec sections into a full spec.
+
+    All definitions are kept in hash indexes (paths and components by name, tags by
+    name and security requirements by their canonical form), so that detecting
+    duplicate definitions takes constant time and merging time grows linearly
+    with size of the spec.
+
+    The merger also records what every section contributed to the full spec, so
+    that a section can later be removed or replaced without merging all the other
+    sections again.
+    """
+
+    TOP_LEVEL_MERGED_KEYS = frozenset(["components", "paths", "security", "tags"])
+
+    def __init__(self):
+        # section name -> what the section contributed, in order of sections
+        self.sections = {}
+        self.paths = {}
+        self.tags = {}
+        self.security = {}
+        self.components = {field: {} for field in COMPONENT_FIELDS}
+        self.other = {}
+        # number of sections contributing to every path
+        self._path_sections = {}
+        # whether removing sections made order of the indexes differ from order of sections
+        self._reordered = False
+        # texts of entries of the full spec rendered by the last dump, see ``dump_full_spec``
+        self.rendered = {}
+
+    @staticmethod
+    def security_requirement_key(requirement):
+        """Get canonical (hashable) form of a security requirement
+
+        :param requirement: Security requirement, e.g. ``{"apiKeyAuth": []}``
+        :type requirement: ``dict``
+        :return: Canonical form of the security requirement
+        :rtype: ``str``
+        """
+        return json.dumps(requirement, sort_keys=True, default=str)
+
+    @staticmethod
+    def contribution_definitions(contributed):
+        """Get keys of everything a merged section contributed, in the same form as
+        ``section_definitions`` returns them
+
+        :param contributed: What the section contributed, as recorded in ``sections``
+        :type contributed: ``dict``
+        :return: Keys identifying the definitions
+        :rtype: generator of ``tuple``
+        """
+        for path, operations in contributed["paths"].items():
+            for operation in operations:
+                yield "paths", path, operation
+        for tag_name in contributed["tags"]:
+            yield "tags", tag_name
+        for key in contributed["security"]:
+            yield "security", key
+        for field, names in contributed["components"].items():
+            for component_name in names:
+                yield "components", field, component_name
+        for k in contributed["other"]:
+            yield "other", k
+
+    @classmethod
+    def section_definitions(cls, loaded):
+        """Get everything a spec section defines, in the order it'd be merged
+
+        :param loaded: Parsed spec section
+        :type loaded: ``dict``
+        :return: Mapping of hashable keys identifying the definitions to values to
+            report if they're duplicated
+        :rtype: ``dict``
+        :raise: ``ValueError`` if the section itself defines something twice
+        """
+        definitions = {}
+
+        def define(key, reported):
+            if key in definitions:
+                raise duplicate_field_error(reported)
+            definitions[key] = reported
+
+        for path, operations in loaded.get("paths", {}).items():
+            for operation in operations:
+                define(("paths", path, operation), operation)
+        for tag in loaded.get("tags", []):
+            define(("tags", tag["name"]), tag["name"])
+        for requirement in loaded.get("security", []):
+            define(("security", cls.security_requirement_key(requirement)), requirement)
+        for field, components in loaded.get("components", {}).items():
+            if field in COMPONENT_FIELDS:
+                for component_name in components:
+                    define(("components", field, component_name), component_name)
+        for k in loaded:
+            if k not in cls.TOP_LEVEL_MERGED_KEYS:
+                define(("other", k), k)
+        return definitions
+
+    def add_section(self, loaded, name=None, validate=True):
+        """Add a spec section to the merged spec
+
+        :param loaded: Parsed spec section
+        :type loaded: ``dict``
+        :param name: Name of the section (e.g. its file name), defaults to position
+            of the section
+        :type name: ``str`` or ``NoneType``
+        :param validate: Whether to check for duplicate definitions; pass ``False``
+            only if the sections were already checked for them
+        :type validate: ``bool``
+        :raise: ``ValueError`` if the section redefines something that's already defined
+        """
+        name = len(self.sections) if name is None else name
+        if name in self.sections:
+            raise ValueError("Spec section {} was already merged".format(name))
+        contributed = {
+            "paths": {},
+            "tags": [],
+            "security": [],
+            "components": {},
+            "other": [],
+            "shared_objects": _has_shared_objects(loaded),
+        }
+        self.sections[name] = contributed
+
+        for path, operations in loaded.get("paths", {}).items():
+            merged_operations = self.paths.setdefault(path, {})
+            if validate:
+                validate_duplicates(operations, merged_operations)
+            merged_operations.update(operations)
+            contributed["paths"][path] = list(operations)
+            self._path_sections[path] = self._path_sections.get(path, 0) + 1
+
+        for tag in loaded.get("tags", []):
+            if validate:
+                validate_duplicates([tag["name"]], self.tags)
+            self.tags[tag["name"]] = tag
+            contributed["tags"].append(tag["name"])
+
+        for requirement in loaded.get("security", []):
+            key = self.security_requirement_key(requirement)
+            if validate and key in self.security:
+                raise duplicate_field_error(requirement)
+            self.security[key] = requirement
+            contributed["security"].append(key)
+
+        for field, components in loaded.get("components", {}).items():
+            if field not in self.components:
+                continue
+            # Validate there aren't duplicate fields across files
+            # Note: This won't raise an error if there is a duplicate component in a single file
+            # That would alredy be deduped by the safe_load above.
+            if validate:
+                validate_duplicates(components, self.components[field])
+            self.components[field].update(components)
+            contributed["components"][field] = list(components)
+
+        # handle the rest of top level attributes
+        for k, v in loaded.items():
+            if k in self.TOP_LEVEL_MERGED_KEYS:
+                continue
+            if validate:
+                validate_duplicates([k], self.other)
+            self.other[k] = v
+            contributed["other"].append(k)
+
+    def remove_section(self, name):
+        """Remove everything given section contributed from the merged spec
+
+        :param name: Name of the section to remove
+        :type name: ``str``
+        """
+        contributed = self.sections.pop(name)
+        for path, operations in contributed["paths"].items():
+            for operation in operations:
+                del self.paths[path][operation]
+            self._path_sections[path] -= 1
+            if self._path_sections[path] == 0:
+                del self._path_sections[path]
+                del self.paths[path]
+        for tag_name in contributed["tags"]:
+            del self.tags[tag_name]
+        for key in contributed["security"]:
+            del self.security[key]
+        for field, names in contributed["components"].items():
+            for component_name in names:
+                del self.components[field][component_name]
+        for k in contributed["other"]:
+            del self.other[k]
+        self._reordered = True
+
+    def replace_sections(self, sections):
+        """Replace content of given sections, keeping their positions among other sections
+
+        All of the sections are removed before adding their new content, so that
+        definitions moved between the replaced sections aren't reported as duplicates.
+
+        :param sections: Mapping of section names to their new parsed content
+        :type sections: ``dict``
+        """
+        order = list(self.sections)
+        for name in sections:
+            self.remove_section(name)
+        for name, loaded in sections.items():
+            self.add_section(loaded, name)
+        self.sections = {n: self.sections[n] for n in order}
+
+    def has_shared_objects(self):
+        """Check whether any object appears in the merged spec more than once,
+        assuming that the sections don't share any objects with each other
+
+        :return: Whether any of the sections contains the same object more than once
+        :rtype: ``bool``
+        """
+        return any(c["shared_objects"] for c in self.sections.values())
+
+    def _ordered(self, index, contributed_names):
+        """Get copy of given index ordered the same way as if all sections were
+        merged from scratch
+        """
+        return {n: index[n] for names in contributed_names for n in names}
+
+    def full_spec(self):
+        """Get the merged spec
+
+        :return: Full spec merged from all added sections
+        :rtype: ``dict``
+        """
+        paths, components, other = self.paths, self.components, self.other
+        if self._reordered:
+            contributed = list(self.sections.values())
+            paths = {}
+            for c in contributed:
+                for path, operations in c["paths"].items():
+                    merged_operations = paths.setdefault(path, {})
+                    for operation in operations:
+                        merged_operations[operation] = self.paths[path][operation]
+            components = {
+                field: self._ordered(
+                    self.components[field],
+                    (c["components"].get(field, []) for c in contributed),
+                )
+                for field in COMPONENT_FIELDS
+            }
+            other = self._ordered(self.other, (c["other"] for c in contributed))
+        full_spec = {
+            "paths": paths,
+            # https://speccy.io/rules/1-rulesets#openapi-tags-alphabetical
+            "tags": [self.tags[name] for name in sorted(self.tags)],
+            "components": components,
+            "security": [
+                self.security[key]
+                for c in self.sections.values()
+                for key in c["security"]
+            ],
+        }
+        full_spec.update(other)
+        return full_spec
+
+
+def _json_default(o):
+    # YAML timestamps are loaded as date/datetime objects
+    if isinstance(o, (datetime.date, datetime.datetime)):
+        return o.isoformat()
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(type(o).__name__)
+    )
+
+
+def dump_full_spec_json(full_spec, stream):
+    """Dump full spec as JSON to given stream.
+
+    :param full_spec: Full spec to dump
+    :type full_spec: ``dict``
+    :param stream: Stream to write the spec to
+    :type stream: file-like object
+    """
+    # NOTE: unlike json.dump, json.dumps uses the C encoder; keys are not sorted
+    # because YAML allows mixing e.g. integer and string keys (response codes)
+    stream.write(json.dumps(full_spec, ensure_ascii=False, default=_json_default))
+
+
+def _merge_state_path(cache_dir, fs_path):
+    key = hashlib.sha256(os.path.abspath(fs_path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "merged", key + ".pickle")
+
+
+def _save_merge_state(state_path, state):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(state_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, state_path)
+    return os.stat(state_path).st_mtime_ns
+
+
+def _write_merge_state(
+    cache_dir, fs_path, digests, merge_options, merger, keep_in_memory
+):
+    state_path = _merge_state_path(cache_dir, fs_path)
+    # only the contribution index is saved, content of the sections is loaded
+    # from the parse cache by the next merge
+    state = {
+        "apigentools_version": __version__,
+        "digests": digests,
+        "merge_options": merge_options,
+        "sections": merger.sections,
+    }
+    if keep_in_memory:
+        # states that weren't saved yet have no mtime
+        _merge_states[state_path] = (None, state, merger)
+    else:
+        _save_merge_state(state_path, state)
+        _merge_states.pop(state_path, None)
+
+
+def flush_merge_states():
+    """Save merge states postponed by ``write_full_specs`` with ``keep_in_memory``
+    to the cache directory
+    """
+    for state_path, (mtime_ns, state, merger) in list(_merge_states.items()):
+        if mtime_ns is None:
+            mtime_ns = _save_merge_state(state_path, state)
+            _merge_states[state_path] = (mtime_ns, state, merger)
+
+
+def _load_merge_state(cache_dir, fs_path, fpaths, merge_options):
+    """Load state stored by the previous merge of ``fs_path`` and find spec sections
+    that changed since.
+
+    :return: Merger kept in memory by the previous merge (``None`` if it was saved
+        to the cache directory), contribution index of the spec sections and
+        names of changed spec sections, or ``None`` if a full merge is needed
+    :rtype: ``tuple`` or ``NoneType``
+    """
+    state_path = _merge_state_path(cache_dir, fs_path)
+    # the merger is modified by the caller, so it can't be reused if the merge fails
+    memo = _merge_states.pop(state_path, None)
+    merger = None
+    try:
+        if memo is not None and (
+            memo[0] is None or memo[0] == os.stat(state_path).st_mtime_ns
+        ):
+            _, state, merger = memo
+        else:
+            with open(state_path, "rb") as f:
+                state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.debug("Failed reading merge state of %s, doing full merge: %s", fs_path, e)
+        return None
+    if (
+        state.get("apigentools_version") != __version__
+        or state.get("merge_options") != merge_options
+        or list(state.get("sections", {})) != merge_options["spec_sections"]
+    ):
+        log.debug("Merge options of %s changed, doing full merge", fs_path)
+        return None
+
+    changed = [
+        name
+        for name, fpath, digest in zip(
+            merge_options["spec_sections"], fpaths, state["digests"]
+        )
+        if spec_section_digest(fpath) != digest
+    ]
+    log.info(
+        "Incrementally merging %s, %d of %d spec sections changed",
+        fs_path,
+        len(changed),
+        len(fpaths),
+    )
+    return merger, state["sections"], changed
+
+
+def _merge_with_index(index, changed, spec_sections, loaded_sections):
+    """Merge spec sections, checking for duplicate definitions only the changed ones;
+    definitions of the unchanged sections are taken from the contribution index
+    stored by the previous merge
+
+    :param index: What every section contributed to the previous merge, see
+        ``SpecMerger.sections``
+    :type index: ``dict``
+    :param changed: Names of sections that changed since the previous merge
+    :type changed: ``list`` of ``str``
+    :param spec_sections: Names of all sections to merge, in order
+    :type spec_sections: ``list`` of ``str``
+    :param loaded_sections: Mapping of section names to their parsed content
+    :type loaded_sections: ``dict``
+    :return: The merger or ``None`` if the changed sections redefine something,
+        in which case a full merge is needed to report it
+    :rtype: ``SpecMerger`` or ``NoneType``
+    """
+    defined = set()
+    for name in spec_sections:
+        if name not in changed:
+            defined.update(SpecMerger.contribution_definitions(index[name]))
+    for name in changed:
+        for key in SpecMerger.section_definitions(loaded_sections[name]):
+            if key in defined:
+                return None
+            defined.add(key)
+
+    merger = SpecMerger()
+    for name in spec_sections:
+        merger.add_section(loaded_sections[name], name, validate=False)
+    return merger
+
+
+def _check_section_conflicts(conflicts, definitions, spec_sections):
+    """Raise error about the first definition that is duplicated among given spec
+    sections (in the order a ``SpecMerger`` would find it)
+
+    :param conflicts: Mapping of definitions to names of all sections defining them,
+        only for definitions defined by more than one section
+    :type conflicts: ``dict``
+    :param definitions: Mapping of section names to their definitions, as returned
+        by ``SpecMerger.section_definitions``
+    :type definitions: ``dict``
+    :param spec_sections: Names of spec sections to merge
+    :type spec_sections: ``list`` of ``str``
+    :raise: ``ValueError`` if there's a duplicate definition
+    """
+    positions = {name: i for i, name in enumerate(spec_sections)}
+    found = []
+    for key, names in conflicts.items():
+        defined_at = sorted(positions[n] for n in names if n in positions)
+        if len(defined_at) > 1:
+            found.append((defined_at[1], key))
+    if found:
+        position, key = min(
+            found,
+            key=lambda f: (f[0], list(definitions[spec_sections[f[0]]]).index(f[1])),
+        )
+        raise duplicate_field_error(definitions[spec_sections[position]][key])
+
+
+def write_full_specs(
+    spec_dir,
+    spec_version,
+    variants,
+    filter_sections=None,
+    jobs=1,
+    cache_dir=None,
+    full_spec_format=None,
+    keep_in_memory=False,
+    prune_components=False,
+    operation_filters=None,
+):
+    """Write all full OpenAPI spec files of one spec version
+
+    Every spec section is loaded only once, even if it's used by multiple full spec
+    files, and the check for duplicate definitions is done only once for every pair
+    of spec sections.
+
+    :param spec_dir: Directory containing per-major-version subdirectories
+        with parts of OpenAPI spec to combine
+    :type spec_dir: ``str``
+    :param spec_version: Version of spec to construct full spec files for
+    :type spec_version: ``str``
+    :param variants: Mapping of full paths of the output files to lists of spec
+        sections to combine into them
+    :type variants: ``dict``
+    :param filter_sections: If specified. list of spec keys to remove.
+    :param jobs: Number of processes to parse spec sections with
+    :type jobs: ``int``
+    :param cache_dir: If specified, the fingerprint of all inputs is recorded in this
+        directory and merging is skipped if a full spec file was already written from
+        the same inputs
+    :type cache_dir: ``str`` or ``NoneType``
+    :param full_spec_format: Format of the output files, ``"json"`` or ``"yaml"``
+        (if not specified, it's guessed from extension of every output file)
+    :type full_spec_format: ``str`` or ``NoneType``
+    :param keep_in_memory: Keep rendered full specs in memory and postpone saving
+        merge states to ``cache_dir`` until ``flush_merge_states`` is called; this
+        makes repeated merges within the same process faster
+    :type keep_in_memory: ``bool``
+    :param prune_components: Whether to remove components that aren't used by
+        the spec, see ``prune_unused_components``
+    :type prune_components: ``bool``
+    :param operation_filters: Mapping of full paths of the output files to filters
+        of operations to apply to them, see ``filter_operations``
+    :type operation_filters: ``dict`` or ``NoneType``
+    :return: Paths to the written combined OpenAPI spec files
+    :rtype: ``list`` of ``str``
+    """
+    spec_version_dir = os.path.join(spec_dir, spec_version)
+    fpaths = {}
+    for filename in (name for sections in variants.values() for name in sections):
+        fpath = os.path.join(spec_version_dir, filename)
+        if filename not in fpaths and not os.path.exists(fpath):
+            raise errors.SpecSectionNotFoundError(spec_version, filename, fpath)
+        fpaths[filename] = fpath
+
+    # find out what needs to be merged and which spec sections need to be loaded for it
+    plans = {}
+    to_load = {}
+    for fs_path, spec_sections in variants.items():
+        variant_fpaths = [fpaths[name] for name in spec_sections]
+        merge_options = {
+            "filter_sections": sorted(filter_sections or []),
+            "spec_sections": list(spec_sections),
+        }
+        fs_format = full_spec_format or get_full_spec_format(fs_path)
+        # take digests before loading the sections, so that changes made meanwhile
+        # are picked up by the next merge
+        digests = [spec_section_digest(fpath) for fpath in variant_fpaths]
+        fingerprint = state = None
+        if cache_dir is not None:
+            fingerprint = full_spec_fingerprint(
+                variant_fpaths,
+                dict(
+                    merge_options,
+                    full_spec_format=fs_format,
+                    prune_components=prune_components,
+                    operation_filter=(operation_filters or {}).get(fs_path),
+                ),
+            )
+            if _read_full_spec_fingerprint(cache_dir, fs_path) == fingerprint:
+                log.info("%s is up to date, skipping merge", fs_path)
+                continue
+            state = _load_merge_state(cache_dir, fs_path, variant_fpaths, merge_options)
+        # only a merger kept in memory already holds content of unchanged sections
+        for name in state[2] if state and state[0] else spec_sections:
+            to_load[name] = fpaths[name]
+        plans[fs_path] = (merge_options, fs_format, digests, fingerprint, state)
+
+    if not plans:
+        return list(variants)
+    loaded_sections = dict(
+        zip(
+            to_load,
+            load_spec_sections(
+                list(to_load.values()), filter_sections, jobs, cache_dir
+            ),
+        )
+    )
+
+    # index definitions of spec sections needed for full merges, so that conflicts
+    # between every pair of them are found only once
+    definitions = {}
+    defined_by = {}
+    conflicts = {}
+
+    def index_definitions(names):
+        for name in names:
+            if name in definitions:
+                continue
+            definitions[name] = SpecMerger.section_definitions(loaded_sections[name])
+            for key in definitions[name]:
+                defined_by.setdefault(key, []).append(name)
+                if len(defined_by[key]) == 2:
+                    conflicts[key] = defined_by[key]
+
+    for fs_path, plan in plans.items():
+        merge_options, fs_format, digests, fingerprint, state = plan
+        spec_sections = merge_options["spec_sections"]
+        merger = None
+        if state:
+            merger, index, changed = state
+            if merger is not None:
+                merger.replace_sections(
+                    {name: loaded_sections[name] for name in changed}
+                )
+            else:
+                merger = _merge_with_index(
+                    index, changed, spec_sections, loaded_sections
+                )
+                if merger is None:
+                    log.debug("Changed sections of %s conflict, full merge", fs_path)
+        if merger is None:
+            index_definitions(spec_sections)
+            _check_section_conflicts(conflicts, definitions, spec_sections)
+            merger = SpecMerger()
+            for name in spec_sections:
+                merger.add_section(loaded_sections[name], name, validate=False)
+        full_spec = merger.full_spec()
+        operation_filter = (operation_filters or {}).get(fs_path)
+        if operation_filter:
+            full_spec, removed = filter_operations(full_spec, operation_filter)
+            log.info(
+                "Filtered out %d operations from %s",
+                len(removed.pop("operations", [])),
+                fs_path,
+            )
+            for field, names in sorted(removed.items()):
+                log.info("Unused %s: %s", field, ", ".join(map(str, names)))
+        if prune_components:
+            full_spec, removed = prune_unused_components(full_spec)
+            log.info(
+                "Removed %d unused components from %s",
+                sum(len(names) for names in removed.values()),
+                fs_path,
+            )
+            for field, names in sorted(removed.items()):
+                log.info("Unused %s: %s", field, ", ".join(map(str, names)))
+
+        with open(fs_path, "w", encoding="utf-8") as f:
+            if fs_format == constants.FULL_SPEC_FORMAT_JSON:
+                dump_full_spec_json(full_spec, f)
+            else:
+                dump_full_spec(
+                    full_spec,
+                    f,
+                    shared_objects=merger.has_shared_objects(),
+                    rendered=merger.rendered if keep_in_memory else None,
+                )
+        if cache_dir is not None:
+            _write_merge_state(
+                cache_dir, fs_path, digests, merge_options, merger, keep_in_memory
+            )
+            _write_full_spec_fingerprint(cache_dir, fs_path, fingerprint)
+    return list(variants)
+
+
 def write_full_spec(
-    spec_dir, spec_version, spec_sections, fs_path, filter_sections=None
+    spec_dir,
+    spec_version,
+    spec_sections,
+    fs_path,
+    filter_sections=None,
+    jobs=1,
+    cache_dir=None,
+    full_spec_format=None,
+    prune_components=False,
+    operation_filter=None,
 ):
     """Write a full OpenAPI spec file
 
@@ -301,90 +1443,292 @@ def write_full_spec(
     :param fs_path: Full path of the output file for the combined OpenAPI spec
     :type fs_path: ``str``
     :param filter_sections: If specified. list of spec keys to remove.
+    :param jobs: Number of processes to parse spec sections with
+    :type jobs: ``int``
+    :param cache_dir: If specified, the fingerprint of all inputs is recorded in this
+        directory and merging is skipped if ``fs_path`` was already written from the
+        same inputs
+    :type cache_dir: ``str`` or ``NoneType``
+    :param full_spec_format: Format of the output file, ``"json"`` or ``"yaml"``
+        (if not specified, it's guessed from extension of ``fs_path``)
+    :type full_spec_format: ``str`` or ``NoneType``
+    :param prune_components: Whether to remove components that aren't used by
+        the spec, see ``prune_unused_components``
+    :type prune_components: ``bool``
+    :param operation_filter: Filter of operations to apply, see ``filter_operations``
+    :type operation_filter: ``dict`` or ``NoneType``
     :return: Path to the written combined OpenAPI spec file
     :rtype: ``str``
     """
-    spec_version_dir = os.path.join(spec_dir, spec_version)
-    full_spec = {
-        "paths": {},
-        "tags": [],
-        "components": {
-            "schemas": {},
-            "parameters": {},
-            "securitySchemes": {},
-            "requestBodies": {},
-            "responses": {},
-            "headers": {},
-            "examples": {},
-            "links": {},
-            "callbacks": {},
-        },
-        "security": [],
-    }
-    for filename in spec_sections:
-        fpath = os.path.join(spec_version_dir, filename)
-        if not os.path.exists(fpath):
-            raise errors.SpecSectionNotFoundError(spec_version, filename, fpath)
-        with open(fpath) as infile:
-            loaded = yaml.load(infile, Loader=CSafeLoader)
-            if filter_sections:
-                loaded = filter_keys(loaded, filter_sections)
-            for k, v in loaded.get("paths", {}).items():
-                full_spec["paths"].setdefault(k, {})
-                validate_duplicates(v, full_spec["paths"][k])
-                full_spec["paths"][k].update(v)
-
-            validate_duplicates(loaded.get("tags", []), full_spec.get("tags", []))
-            full_spec["tags"].extend(loaded.get("tags", []))
-
-            validate_duplicates(
-                loaded.get("security", []), full_spec.get("security", [])
-            )
-            full_spec["security"].extend(loaded.get("security", []))
-
-            for field in COMPONENT_FIELDS:
-                # Validate there aren't duplicate fields across files
-                # Note: This won't raise an error if there is a duplicate component in a single file
-                # That would alredy be deduped by the safe_load above.
-                validate_duplicates(
-                    loaded.get("components", {}).get(field, {}).keys(),
-                    full_spec.get("components", {}).get(field).keys(),
-                )
-                full_spec["components"][field].update(
-                    loaded.get("components", {}).get(field, {})
-                )
+    return write_full_specs(
+        spec_dir,
+        spec_version,
+        {fs_path: spec_sections},
+        filter_sections=filter_sections,
+        jobs=jobs,
+        cache_dir=cache_dir,
+        full_spec_format=full_spec_format,
+        prune_components=prune_components,
+        operation_filters={fs_path: operation_filter} if operation_filter else None,
+    )[0]
 
-            # https://speccy.io/rules/1-rulesets#openapi-tags-alphabetical
-            full_spec["tags"].sort(key=lambda x: x["name"])
 
-            # handle the rest of top level attributes
-            loaded_keys = set(loaded.keys()) - set(
-                ["components", "paths", "security", "tags"]
-            )
-            validate_duplicates(loaded_keys, full_spec.keys())
-            for k in loaded_keys:
-                full_spec[k] = loaded[k]
-
-    with open(fs_path, "w", encoding="utf-8") as f:
-        yaml.dump(full_spec, f, Dumper=CSafeDumper)
-    return fs_path
+def duplicate_field_error(key):
+    return ValueError("Duplicate field {} found in spec. Exiting".format(key))
 
 
 def validate_duplicates(loaded_keys, full_spec_keys):
     for key in loaded_keys:
         if key in full_spec_keys:
-            raise ValueError("Duplicate field {} found in spec. Exiting".format(key))
+            raise duplicate_field_error(key)
 
 
-def filter_keys(spec, sections):
-    result = {}
-    for key, value in spec.items():
-        if key in sections:
+def prune_keys(spec, keys):
+    """Remove given keys from all dicts nested in ``spec`` (including dicts nested
+    in lists). The structure is modified in place.
+
+    :param spec: Structure to remove the keys from
+    :type spec: ``dict`` or ``list``
+    :param keys: Keys to remove
+    :type keys: iterable of ``str``
+    :return: Number of removed nodes
+    :rtype: ``int``
+    """
+    keys = frozenset(keys)
+    removed = 0
+    seen = set()
+    stack = [spec]
+    while stack:
+        item = stack.pop()
+        # objects can be shared (YAML anchors), so visit every one of them only once
+        if id(item) in seen:
             continue
-        if isinstance(value, dict):
-            value = filter_keys(value, sections)
-        result[key] = value
-    return result
+        seen.add(id(item))
+        if isinstance(item, dict):
+            for key in [k for k in item if k in keys]:
+                del item[key]
+                removed += 1
+            values = item.values()
+        else:
+            values = item
+        stack.extend(v for v in values if isinstance(v, (dict, list)))
+    return removed
+
+
+def component_ref(ref):
+    """Get ``(field, name)`` of the component referenced by a local JSON reference,
+    e.g. ``("schemas", "Foo")`` for ``#/components/schemas/Foo/properties/bar``
+
+    :param ref: The JSON reference
+    :type ref: ``str``
+    :return: ``(field, name)`` of the referenced component or ``None`` if the
+        reference doesn't point to a component
+    :rtype: ``tuple`` or ``NoneType``
+    """
+    if not isinstance(ref, str) or not ref.startswith("#/components/"):
+        return None
+    parts = ref[len("#/components/") :].split("/")
+    if len(parts) < 2:
+        return None
+    return tuple(
+        urllib.parse.unquote(p).replace("~1", "/").replace("~0", "~") for p in parts[:2]
+    )
+
+
+def _used_components(full_spec):
+    """Find components that are referenced from anywhere outside of ``components``
+    of the spec, either directly or through other components
+
+    Besides ``$ref``, components are referenced by discriminator mappings (schemas)
+    and security requirements (security schemes).
+
+    :return: ``(field, name)`` of all used components
+    :rtype: ``set``
+    """
+    components = full_spec.get("components")
+    if not isinstance(components, dict):
+        return set()
+
+    used = set()
+    seen = set()
+    stack = [{k: v for k, v in full_spec.items() if k != "components"}]
+
+    def use(component):
+        field, name = component
+        if component in used or name not in (components.get(field) or {}):
+            return
+        used.add(component)
+        stack.append(components[field][name])
+
+    while stack:
+        item = stack.pop()
+        # objects can be shared (YAML anchors), so visit every one of them only once
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, dict):
+            component = component_ref(item.get("$ref"))
+            if component:
+                use(component)
+            discriminator = item.get("discriminator")
+            if isinstance(discriminator, dict):
+                for target in (discriminator.get("mapping") or {}).values():
+                    use(component_ref(target) or ("schemas", target))
+            requirements = item.get("security")
+            if isinstance(requirements, list):
+                for requirement in requirements:
+                    if isinstance(requirement, dict):
+                        for scheme in requirement:
+                            use(("securitySchemes", scheme))
+            values = item.values()
+        elif isinstance(item, list):
+            values = item
+        else:
+            continue
+        stack.extend(v for v in values if isinstance(v, (dict, list)))
+    return used
+
+
+def _remove_components(full_spec, to_remove):
+    """Get copy of the spec without given components; the spec isn't modified
+
+    :return: Spec without the components and names of the removed components by
+        component field
+    :rtype: ``tuple`` of ``dict`` and ``dict``
+    """
+    components = full_spec.get("components")
+    if not isinstance(components, dict) or not to_remove:
+        return full_spec, {}
+    pruned_components = {}
+    removed = {}
+    for field, field_components in components.items():
+        if not isinstance(field_components, dict):
+            pruned_components[field] = field_components
+            continue
+        pruned_components[field] = {
+            name: value
+            for name, value in field_components.items()
+            if (field, name) not in to_remove
+        }
+        names = [name for name in field_components if (field, name) in to_remove]
+        if names:
+            removed[field] = names
+    pruned = dict(full_spec)
+    pruned["components"] = pruned_components
+    return pruned, removed
+
+
+def prune_unused_components(full_spec):
+    """Remove components that aren't referenced from anywhere outside of
+    ``components`` of the spec, neither directly nor through other components
+
+    Besides ``$ref``, components are referenced by discriminator mappings (schemas)
+    and security requirements (security schemes). The spec itself isn't modified.
+
+    :param full_spec: Full spec to remove unused components from
+    :type full_spec: ``dict``
+    :return: Full spec without unused components and names of the removed components
+        by component field
+    :rtype: ``tuple`` of ``dict`` and ``dict``
+    """
+    components = full_spec.get("components")
+    if not isinstance(components, dict):
+        return full_spec, {}
+    used = _used_components(full_spec)
+    unused = {
+        (field, name)
+        for field, field_components in components.items()
+        if isinstance(field_components, dict)
+        for name in field_components
+        if (field, name) not in used
+    }
+    return _remove_components(full_spec, unused)
+
+
+def _operation_matches(operation, tags, operation_ids):
+    if not isinstance(operation, dict):
+        return False
+    return operation.get("operationId") in operation_ids or any(
+        tag in tags for tag in operation.get("tags") or []
+    )
+
+
+def filter_operations(full_spec, operation_filter):
+    """Remove operations that don't pass given filter, together with components and
+    tags that were only used by these operations. The spec itself isn't modified.
+
+    An operation passes the filter if it matches any of the ``include_*`` rules
+    (or there are none) and doesn't match any of the ``exclude_*`` rules.
+
+    :param full_spec: Full spec to filter operations of
+    :type full_spec: ``dict``
+    :param operation_filter: Mapping with lists of ``include_tags``,
+        ``exclude_tags``, ``include_operation_ids`` and ``exclude_operation_ids``
+    :type operation_filter: ``dict``
+    :return: Filtered full spec and what was removed from it (``"operations"`` as
+        ``"METHOD path"`` strings, ``"tags"`` and names of components by component
+        field)
+    :rtype: ``tuple`` of ``dict`` and ``dict``
+    """
+    include_tags = frozenset(operation_filter.get("include_tags") or [])
+    include_ids = frozenset(operation_filter.get("include_operation_ids") or [])
+    exclude_tags = frozenset(operation_filter.get("exclude_tags") or [])
+    exclude_ids = frozenset(operation_filter.get("exclude_operation_ids") or [])
+
+    def passes(operation):
+        if (include_tags or include_ids) and not _operation_matches(
+            operation, include_tags, include_ids
+        ):
+            return False
+        return not _operation_matches(operation, exclude_tags, exclude_ids)
+
+    removed_operations = []
+    removed_tags = set()
+    kept_tags = set()
+    paths = {}
+    for path, item in (full_spec.get("paths") or {}).items():
+        filtered_item = {}
+        for key, value in item.items():
+            if key not in OPERATION_METHODS:
+                filtered_item[key] = value
+                continue
+            tags = value.get("tags") or [] if isinstance(value, dict) else []
+            if passes(value):
+                filtered_item[key] = value
+                kept_tags.update(tags)
+            else:
+                removed_operations.append("{} {}".format(key.upper(), path))
+                removed_tags.update(tags)
+        # drop paths that had operations, but none of them passed the filter
+        if (
+            filtered_item.keys() & OPERATION_METHODS
+            or not item.keys() & OPERATION_METHODS
+        ):
+            paths[path] = filtered_item
+
+    removed = {}
+    if not removed_operations:
+        return full_spec, removed
+    removed["operations"] = removed_operations
+
+    filtered = dict(full_spec)
+    filtered["paths"] = paths
+    removed_tags -= kept_tags
+    if removed_tags and isinstance(full_spec.get("tags"), list):
+        filtered["tags"] = [
+            tag
+            for tag in full_spec["tags"]
+            if not (isinstance(tag, dict) and tag.get("name") in removed_tags)
+        ]
+        removed["tags"] = sorted(removed_tags)
+
+    # only remove components that were used before, so that filtering operations
+    # doesn't remove anything the filtered out operations didn't use
+    filtered, removed_components = _remove_components(
+        filtered, _used_components(full_spec) - _used_components(filtered)
+    )
+    removed.update(removed_components)
+    return filtered, removed
 
 
 def glob_re(glob_pattern, re_filter):
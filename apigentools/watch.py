@@ -0,0 +1,215 @@
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the 3-clause BSD style license (see LICENSE).
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+import abc
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+log = logging.getLogger(__name__)
+
+# how long to wait for more changes after the first one, in seconds; this
+# makes a single rebuild out of e.g. "git checkout" changing multiple files
+DEBOUNCE_INTERVAL = 0.02
+
+
+class Watcher(abc.ABC):
+    """Watches files in given directories (including their subdirectories) for changes"""
+
+    def __init__(self, directories):
+        self.directories = list(directories)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def poll(self, timeout):
+        """Wait for changes of watched files
+
+        :param timeout: Maximum time to wait in seconds
+        :type timeout: ``float``
+        :return: Paths of files that were changed, created or removed
+        :rtype: ``set`` of ``str``
+        """
+
+    def wait(self):
+        """Block until some watched files change
+
+        :return: Paths of files that were changed, created or removed
+        :rtype: ``set`` of ``str``
+        """
+        changed = set()
+        while not changed:
+            changed = self.poll(None)
+        while True:
+            more = self.poll(DEBOUNCE_INTERVAL)
+            if not more:
+                return changed
+            changed |= more
+
+
+class PollingWatcher(Watcher):
+    """Finds changes by periodically comparing modification times of all files"""
+
+    INTERVAL = 0.1
+
+    def __init__(self, directories):
+        super().__init__(directories)
+        self.state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for directory in self.directories:
+            for dirpath, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def poll(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self._scan()
+            changed = {
+                path
+                for path in state.keys() | self.state.keys()
+                if state.get(path) != self.state.get(path)
+            }
+            self.state = state
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+            time.sleep(self.INTERVAL)
+
+
+class InotifyWatcher(Watcher):
+    """Gets notified about changes by the Linux kernel using inotify(7)"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, directories):
+        super().__init__(directories)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        try:
+            for directory in self.directories:
+                for dirpath, _, _ in os.walk(directory):
+                    self._add_watch(dirpath)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), ctypes.c_uint32(self.MASK)
+        )
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), directory)
+        self.watches[wd] = directory
+
+    def _watch_new_directory(self, directory):
+        """Watch a directory created after the watcher started, with all its
+        subdirectories
+
+        :param directory: Path of the directory
+        :type directory: ``str``
+        :return: Paths of files already in the directory, as they could've been
+            created before the watch was added
+        :rtype: ``set`` of ``str``
+        """
+        watched = set(self.watches.values())
+        found = set()
+        for dirpath, _, filenames in os.walk(directory):
+            if dirpath not in watched:
+                try:
+                    self._add_watch(dirpath)
+                except OSError as e:
+                    # the directory was removed or replaced before we got to it
+                    if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                        raise
+                    log.debug("Not watching %s: %s", dirpath, e)
+                    continue
+            found.update(os.path.join(dirpath, f) for f in filenames)
+        return found
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def poll(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                # events were lost, consider all files changed
+                log.debug("inotify event queue overflowed, rescanning all files")
+                for directory in self.directories:
+                    changed |= self._watch_new_directory(directory)
+                continue
+            if mask & self.IN_IGNORED:
+                # the watched directory was removed
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    changed |= self._watch_new_directory(path)
+                continue
+            changed.add(path)
+        return changed
+
+
+def get_watcher(directories):
+    """Get the most efficient watcher available on this system
+
+    :param directories: Directories to watch
+    :type directories: ``list`` of ``str``
+    :return: Watcher for given directories
+    :rtype: ``Watcher``
+    """
+    try:
+        return InotifyWatcher(directories)
+    except (AttributeError, OSError) as e:
+        log.debug("Can't use inotify, falling back to polling: %s", e)
+        return PollingWatcher(directories)
@@ -1,5 +1,6 @@
 import os
 import shlex
+import subprocess
 
 from flexmock import flexmock
 import pytest
@@ -121,3 +122,126 @@ class TestCommand:
             self.EXPECTED_DOCKER_INVOCATION + ["echo", "apigentools-test-java-v1", "1"]
         )
         MyCommand(None, None).run_config_command(cmd, "java-v1", ".", {}, {}, {})
+
+    def test_run_config_command_with_container_sessions(self):
+        cmd = ConfigCommand(
+            commandline=["echo", "1"], container_opts={"environment": {"A": "b"}}
+        )
+        cmd.container_opts = utils.inherit_container_opts(
+            cmd.container_opts, ContainerOpts()
+        )
+        calls = []
+        flexmock(command).should_receive("run_command").replace_with(
+            lambda c, **kwargs: calls.append(c) or flexmock(stdout="sha256:1\n")
+        )
+        my_command = MyCommand(None, None)
+        with command.ContainerSessions() as sessions:
+            my_command.container_sessions = sessions
+            my_command.run_config_command(cmd, "testing", ".", {})
+            my_command.run_config_command(cmd, "testing", "generated", {})
+            (container,) = sessions.containers.values()
+
+        inspect = [
+            "docker",
+            "image",
+            "inspect",
+            "--format",
+            "{{.Id}}",
+            DEFAULT_CONTAINER_IMAGE,
+        ]
+        assert calls == [
+            inspect,
+            [
+                "docker",
+                "run",
+                "--detach",
+                "--rm",
+                "--name",
+                container,
+                "-v",
+                os.getcwd() + ":/tmp/spec-repo",
+                "--entrypoint",
+                "tail",
+                "-e",
+                "A=b",
+                "sha256:1",
+                "-f",
+                "/dev/null",
+            ],
+            [
+                "docker",
+                "exec",
+                "--workdir",
+                "/tmp/spec-repo/./.",
+                container,
+                "echo",
+                "1",
+            ],
+            inspect,
+            [
+                "docker",
+                "exec",
+                "--workdir",
+                "/tmp/spec-repo/generated/.",
+                container,
+                "echo",
+                "1",
+            ],
+            ["docker", "rm", "--force", container],
+        ]
+        assert sessions.containers == {}
+
+    def test_container_sessions_rebuilt_image(self):
+        image_ids = iter(["sha256:1", "sha256:1", "sha256:2"])
+        calls = []
+
+        def run_command(c, **kwargs):
+            calls.append(c)
+            if c[:3] == ["docker", "image", "inspect"]:
+                return flexmock(stdout=next(image_ids))
+
+        flexmock(command).should_receive("run_command").replace_with(run_command)
+        with command.ContainerSessions() as sessions:
+            first = sessions.get_container("image", {})
+            assert sessions.get_container("image", {}) == first
+            second = sessions.get_container("image", {})
+            assert second != first
+            assert ["docker", "rm", "--force", first] in calls
+            assert list(sessions.containers.values()) == [second]
+        assert calls[-1] == ["docker", "rm", "--force", second]
+
+    def test_container_sessions_fallback(self):
+        cmd = ConfigCommand(commandline=["echo", "1"])
+        cmd.container_opts = utils.inherit_container_opts(
+            cmd.container_opts, ContainerOpts()
+        )
+        calls = []
+
+        def run_command(c, **kwargs):
+            calls.append(c)
+            if c[:2] == ["docker", "image"]:
+                if len(calls) == 1:
+                    # image isn't available locally yet
+                    raise subprocess.CalledProcessError(1, c)
+                return flexmock(stdout="sha256:1")
+            if "--detach" in c:
+                # image doesn't provide tail
+                raise subprocess.CalledProcessError(127, c)
+
+        flexmock(command).should_receive("run_command").replace_with(run_command)
+        my_command = MyCommand(None, None)
+        with command.ContainerSessions() as sessions:
+            my_command.container_sessions = sessions
+            my_command.run_config_command(cmd, "testing", ".", {})
+            my_command.run_config_command(cmd, "testing", ".", {})
+            my_command.run_config_command(cmd, "testing", ".", {})
+
+        docker_run = self.EXPECTED_DOCKER_INVOCATION + [
+            "echo",
+            DEFAULT_CONTAINER_IMAGE,
+            "1",
+        ]
+        # the keep-alive container is only tried once
+        assert [c for c in calls if "--detach" in c] == [calls[3]]
+        assert [c for c in calls if c == docker_run] == [docker_run] * 3
+        assert not any("exec" in c or "rm" in c for c in calls)
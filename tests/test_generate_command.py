@@ -3,15 +3,20 @@
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2019-Present Datadog, Inc.
 
+import concurrent.futures
+import functools
 import logging
+import multiprocessing
+import os
 import sys
 
 from flexmock import flexmock
 import pytest
 
 from apigentools import __version__
-from apigentools.commands.generate import GenerateCommand, run_command
-from apigentools.config import ConfigCommand
+from apigentools.commands.generate import GenerateCommand, log, run_command
+from apigentools.config import Config, ConfigCommand
+from apigentools.utils import change_cwd
 
 
 class TestGenerateCommand:
@@ -286,3 +291,260 @@ class TestGenerateCommand:
             ).with_args(cmd[0], **cmd[1])
         gc = GenerateCommand(None, args)
         gc.pull_repository(lc, branch)
+
+
+class NamesConfig:
+    def get_language_config(self, language):
+        return language
+
+
+class RecordingGenerateCommand(GenerateCommand):
+    """Generate command recording generated languages/versions into files,
+    so that it can be used in worker processes"""
+
+    def __init__(self, outdir, failing=()):
+        super().__init__(NamesConfig(), {})
+        self.outdir = outdir
+        self.failing = failing
+        self.info_written = []
+
+    def generate_language_version(self, language, version, input_spec):
+        log.info("Recording %s%s", language, version)
+        if (language, version) in self.failing:
+            return 1, None
+        with open(os.path.join(self.outdir, language + version), "w") as f:
+            f.write(input_spec)
+        return 0, input_spec
+
+    def write_dot_apigentools_info(self, language_config, version, fingerprint=None):
+        self.info_written.append((version, fingerprint))
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_generate_targets(tmpdir, jobs):
+    targets = [
+        ("go", "v1", "full_spec.yaml"),
+        ("go", "v2", "full_spec.yaml"),
+        ("java", "v1", "full_spec.java.yaml"),
+    ]
+    cmd = RecordingGenerateCommand(str(tmpdir))
+    assert cmd.generate_targets(targets, jobs) == 0
+    assert sorted(cmd.info_written) == [
+        ("v1", "full_spec.java.yaml"),
+        ("v1", "full_spec.yaml"),
+        ("v2", "full_spec.yaml"),
+    ]
+    assert {f.basename: f.read() for f in tmpdir.listdir()} == {
+        "gov1": "full_spec.yaml",
+        "gov2": "full_spec.yaml",
+        "javav1": "full_spec.java.yaml",
+    }
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_generate_targets_failure(tmpdir, jobs):
+    targets = [("go", "v1", "full_spec.yaml"), ("go", "v2", "full_spec.yaml")]
+    cmd = RecordingGenerateCommand(str(tmpdir), failing={("go", "v1")})
+    assert cmd.generate_targets(targets, jobs) == 1
+
+
+def test_generate_targets_spawn(tmpdir, capfd, caplog, monkeypatch):
+    caplog.set_level(logging.INFO, logger="apigentools")
+    monkeypatch.setattr(
+        concurrent.futures,
+        "ProcessPoolExecutor",
+        functools.partial(
+            concurrent.futures.ProcessPoolExecutor,
+            mp_context=multiprocessing.get_context("spawn"),
+        ),
+    )
+    targets = [("go", "v1", "full_spec.yaml"), ("go", "v2", "full_spec.yaml")]
+    cmd = RecordingGenerateCommand(str(tmpdir))
+    assert cmd.generate_targets(targets, 2) == 0
+    assert sorted(f.basename for f in tmpdir.listdir()) == ["gov1", "gov2"]
+    # workers log with the same handlers and level as the main process
+    err = capfd.readouterr().err
+    assert "INFO: [go/v1] Recording gov1" in err
+    assert "INFO: [go/v2] Recording gov2" in err
+
+
+def test_input_fingerprint(tmpdir):
+    config = Config.from_dict(
+        {
+            "spec_versions": ["v1"],
+            "languages": {
+                "java": {
+                    "github_repo_name": "datadog-api-client-java",
+                    "generation": {
+                        "default": {
+                            "commands": [
+                                {
+                                    "commandline": [
+                                        "generate",
+                                        "{{full_spec_path}}",
+                                        "{{library_version}}",
+                                    ]
+                                }
+                            ]
+                        }
+                    },
+                    "library_version": "1.0.0",
+                },
+            },
+        }
+    )
+    lc = config.get_language_config("java")
+    with change_cwd(str(tmpdir)):
+        os.makedirs(lc.generated_lang_version_dir_for("v1"))
+        with open("full_spec.yaml", "w") as f:
+            f.write("openapi: 3.0.0\n")
+        cmd = GenerateCommand(config, {})
+        fingerprint = cmd.get_input_fingerprint("java", "v1", "full_spec.yaml")
+        assert not cmd.is_up_to_date("java", "v1", fingerprint)
+
+        cmd.write_dot_apigentools_info(lc, "v1", fingerprint)
+        assert cmd.is_up_to_date("java", "v1", fingerprint)
+        assert fingerprint == cmd.get_input_fingerprint("java", "v1", "full_spec.yaml")
+        assert not GenerateCommand(config, {"no_cache": True}).is_up_to_date(
+            "java", "v1", fingerprint
+        )
+
+        # command lines are rendered before computing the fingerprint
+        lc.library_version = "1.0.1"
+        assert fingerprint != cmd.get_input_fingerprint("java", "v1", "full_spec.yaml")
+        lc.library_version = "1.0.0"
+
+        with open("full_spec.yaml", "w") as f:
+            f.write("openapi: 3.0.1\n")
+        assert fingerprint != cmd.get_input_fingerprint("java", "v1", "full_spec.yaml")
+
+
+BATCH_SPEC_CONFIG = {
+    "spec_versions": ["v1", "v2"],
+    "languages": {
+        "go": {
+            "github_repo_name": "client-go",
+            "generation": {
+                "default": {
+                    "commands": [
+                        {"commandline": ["rm", "-rf", "api"]},
+                        {
+                            "commandline": [
+                                {"function": "openapi_generator_generate"},
+                                "--type-mappings",
+                                "object=interface{}",
+                            ]
+                        },
+                        {"commandline": ["go", "fmt"]},
+                    ]
+                },
+                "v2": {
+                    "commands": [
+                        {
+                            "commandline": [
+                                {"function": "openapi_generator_generate"},
+                                "--skip-validate-spec",
+                            ]
+                        },
+                    ]
+                },
+            },
+            "library_version": "1.0.0",
+            "version_path_template": "api_{{spec_version}}",
+        },
+    },
+}
+
+
+def test_get_batch_generate_config():
+    config = Config.from_dict(BATCH_SPEC_CONFIG)
+    cmd = GenerateCommand(config, {})
+    assert cmd.get_batch_generate_config("go", "v1", "spec/v1/full_spec.yaml") == (
+        1,
+        {
+            "!include": "./config/languages/go_v1.json",
+            "additionalProperties": {"apigentoolsStamp": "''"},
+            "generatorName": "go",
+            "httpUserAgent": "OpenAPI/1.0.0/go",
+            "inputSpec": "./spec/v1/full_spec.yaml",
+            "outputDir": "generated/client-go/api_v1",
+            "typeMappings": {"object": "interface{}"},
+        },
+    )
+    # flags can't be expressed in batch config
+    assert cmd.get_batch_generate_config("go", "v2", "spec/v2/full_spec.yaml") is None
+
+
+def test_get_batch_generate_config_map_options():
+    config = Config.from_dict(BATCH_SPEC_CONFIG)
+    command = config.get_language_config("go").commands_for("v1")[1]
+    command.commandline[1:] = [
+        "--type-mappings",
+        "object=interface{},any=interface{}",
+        "-p",
+        "apigentoolsStamp='Generated with: apigentools; build 1, 2'",
+    ]
+    cmd = GenerateCommand(config, {})
+    # values containing commas can't be split unambiguously
+    assert cmd.get_batch_generate_config("go", "v1", "spec/v1/full_spec.yaml") is None
+
+    command.commandline[3:] = ["-p", "packageName=client,stamp='a b'"]
+    _, batch_config = cmd.get_batch_generate_config(
+        "go", "v1", "spec/v1/full_spec.yaml"
+    )
+    assert batch_config["typeMappings"] == {
+        "object": "interface{}",
+        "any": "interface{}",
+    }
+    assert batch_config["additionalProperties"] == {
+        "apigentoolsStamp": "''",
+        "packageName": "client",
+        "stamp": "'a b'",
+    }
+
+    for value in ["stamp=a, b", "stamp='a,b'", "=a"]:
+        command.commandline[3:] = ["-p", value]
+        assert (
+            cmd.get_batch_generate_config("go", "v1", "spec/v1/full_spec.yaml") is None
+        )
+
+
+def test_generate_targets_batch(tmpdir):
+    config = Config.from_dict(BATCH_SPEC_CONFIG)
+    cmd = GenerateCommand(config, {"skip_templates": True})
+    lc = config.get_language_config("go")
+    commands = lc.commands_for("v1")
+    targets = [
+        ("go", "v1", "spec/v1/full_spec.yaml"),
+        ("go", "v2", "spec/v2/full_spec.yaml"),
+    ]
+    flexmock(cmd).should_receive("get_input_fingerprint").and_return("fingerprint")
+    flexmock(cmd).should_receive("write_dot_apigentools_info").times(2)
+    calls = []
+    flexmock(cmd).should_receive("run_config_command").replace_with(
+        lambda command, what_command, *args, **kwargs: calls.append(
+            (command, what_command)
+        )
+    )
+
+    with change_cwd(str(tmpdir)):
+        assert cmd.generate_targets_batch(targets) == 0
+
+    batch_command = calls[2][0]
+    assert calls == [
+        (commands[0], "go/v1"),
+        (lc.commands_for("v2")[0], "go/v2"),
+        (batch_command, "batch"),
+        (commands[2], "go/v1"),
+    ]
+    assert batch_command.commandline[:5] == [
+        "openapi-generator",
+        "batch",
+        "--fail-fast",
+        "--includes-base-dir",
+        ".",
+    ]
+    assert batch_command.commandline[5:] == [
+        os.path.join(os.path.dirname(batch_command.commandline[5]), "go_v1.json")
+    ]
+    assert batch_command.container_opts.workdir == "."
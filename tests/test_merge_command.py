@@ -47,7 +47,7 @@ def test_merge():
         {"full_spec_file": "full_spec.yaml"},
     )
     flexmock(sys.modules["apigentools.commands.merge"]).should_receive(
-        "write_full_spec"
+        "write_full_specs"
     )
 
     assert merge_command.run() == 0
@@ -59,8 +59,151 @@ def test_filter_merge():
         {"full_spec_file": "full_spec.yaml", "filter_sections": ["x-bar"]},
     )
 
+    mock = flexmock(sys.modules["apigentools.commands.merge"])
+    mock.should_receive("write_full_specs").with_args(
+        "spec",
+        "v1",
+        {
+            "spec/v1/full_spec.yaml": ["x.yaml"],
+            "spec/v1/full_spec.test-lang2.yaml": ["x.yaml", "x2.yaml"],
+            "spec/v1/full_spec.test-lang3.yaml": ["z.yaml"],
+        },
+        frozenset(["x-bar"]),
+        jobs=1,
+        cache_dir=".apigentools-cache",
+        full_spec_format="yaml",
+        keep_in_memory=False,
+        prune_components=False,
+        operation_filters={},
+    ).once()
+    mock.should_receive("write_full_specs").with_args(
+        "spec",
+        "v2",
+        {"spec/v2/full_spec.yaml": ["y.yaml"]},
+        frozenset(["x-bar"]),
+        jobs=1,
+        cache_dir=".apigentools-cache",
+        full_spec_format="yaml",
+        keep_in_memory=False,
+        prune_components=False,
+        operation_filters={},
+    ).once()
+
+    assert merge_command.run() == 0
+
+
+def test_merge_json():
+    merge_command = MergeCommand(
+        SIMPLE_SPEC_CONFIG_OBJ,
+        {"full_spec_file": "full_spec.yaml", "full_spec_format": "json"},
+    )
+
+    flexmock(sys.modules["apigentools.commands.merge"]).should_receive(
+        "write_full_specs"
+    ).with_args(
+        "spec",
+        "v1",
+        {"spec/v1/full_spec.json": ["x.yaml"]},
+        frozenset(),
+        jobs=1,
+        cache_dir=".apigentools-cache",
+        full_spec_format="json",
+        keep_in_memory=False,
+        prune_components=False,
+        operation_filters={},
+    ).once()
+
+    assert merge_command.run() == 0
+
+
+def test_merge_watch():
+    merge_command = MergeCommand(
+        SPEC_CONFIG_OBJ,
+        {"full_spec_file": "full_spec.yaml", "watch": True, "no_cache": True},
+    )
+
+    class FakeWatcher:
+        changes = [{"spec/v1/x2.yaml", "spec/v1/full_spec.yaml"}, {"spec/v2/y.yaml"}]
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def wait(self):
+            if not self.changes:
+                raise KeyboardInterrupt()
+            return self.changes.pop(0)
+
+    mock = flexmock(sys.modules["apigentools.commands.merge"])
+    mock.should_receive("get_watcher").with_args(["spec/v1", "spec/v2"]).and_return(
+        FakeWatcher()
+    )
+    calls = []
+    mock.should_receive("write_full_specs").replace_with(
+        lambda spec_dir, version, variants, *args, **kwargs: calls.append(
+            (version, list(variants), kwargs["keep_in_memory"])
+        )
+    )
+    mock.should_receive("flush_merge_states").once()
+
+    assert merge_command.run() == 0
+    assert calls == [
+        (
+            "v1",
+            [
+                "spec/v1/full_spec.yaml",
+                "spec/v1/full_spec.test-lang2.yaml",
+                "spec/v1/full_spec.test-lang3.yaml",
+            ],
+            True,
+        ),
+        ("v2", ["spec/v2/full_spec.yaml"], True),
+        ("v1", ["spec/v1/full_spec.test-lang2.yaml"], True),
+        ("v2", ["spec/v2/full_spec.yaml"], True),
+    ]
+
+
+def test_merge_operation_filter():
+    config = Config.from_dict(
+        {
+            "spec_versions": ["v1"],
+            "languages": {
+                "test-lang1": {"library_version": "1.0.0"},
+                "test-lang2": {
+                    "library_version": "1.0.0",
+                    "operations": {"default": {"exclude_tags": ["Internal"]}},
+                },
+            },
+            "spec_sections": {"v1": ["x.yaml"]},
+        }
+    )
+    merge_command = MergeCommand(config, {"full_spec_file": "full_spec.yaml"})
+
     flexmock(sys.modules["apigentools.commands.merge"]).should_receive(
-        "write_full_spec"
-    ).with_args(str, str, list, str, frozenset(["x-bar"]))
+        "write_full_specs"
+    ).with_args(
+        "spec",
+        "v1",
+        {
+            "spec/v1/full_spec.yaml": ["x.yaml"],
+            "spec/v1/full_spec.test-lang2.yaml": ["x.yaml"],
+        },
+        frozenset(),
+        jobs=1,
+        cache_dir=".apigentools-cache",
+        full_spec_format="yaml",
+        keep_in_memory=False,
+        prune_components=False,
+        operation_filters={
+            "spec/v1/full_spec.test-lang2.yaml": {
+                "include_tags": [],
+                "exclude_tags": ["Internal"],
+                "include_operation_ids": [],
+                "exclude_operation_ids": [],
+            }
+        },
+    ).once()
 
     assert merge_command.run() == 0
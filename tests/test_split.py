@@ -6,8 +6,9 @@ import json
 import os
 
 import flexmock
+import yaml
 
-from apigentools.commands.split import SplitCommand
+from apigentools.commands.split import ComponentGraph, SplitCommand
 
 FIXTURES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures")
 
@@ -47,6 +48,72 @@ def test_get_endpoints_for_sections():
     }
 
 
+def test_get_endpoints_for_sections_segments():
+    args = flexmock.flexmock()
+    cmd = SplitCommand({}, args)
+    all_endpoints = [
+        "/api/v1/users",
+        "/api/v1/user/{id}",
+        "/api/v1/user",
+        "/api/v1/users/{id}/roles",
+        "/api/v1/org/{id}",
+    ]
+
+    assert cmd.get_endpoints_for_sections(all_endpoints) == {
+        "/api/v1/users": {"/api/v1/users", "/api/v1/users/{id}/roles"},
+        "/api/v1/user": {"/api/v1/user", "/api/v1/user/{id}"},
+        "/api/v1/org/{id}": {"/api/v1/org/{id}"},
+    }
+    assert list(cmd.get_endpoints_for_sections(all_endpoints)) == [
+        "/api/v1/users",
+        "/api/v1/user",
+        "/api/v1/org/{id}",
+    ]
+
+
+def test_get_endpoints_for_sections_balanced():
+    args = flexmock.flexmock()
+    cmd = SplitCommand({}, args)
+    endpoints_sizes = {
+        "/api/v1/monitor": 10,
+        "/api/v1/monitor/{id}": 40,
+        "/api/v1/monitor/{id}/mute": 20,
+        "/api/v1/monitor/search": 50,
+        "/api/v1/monitor/groups/a": 60,
+        "/api/v1/monitor/groups/b": 60,
+        "/api/v1/monitor/validate": 30,
+        "/api/v1/users": 20,
+    }
+
+    assert cmd.get_endpoints_for_sections(
+        list(endpoints_sizes), endpoints_sizes, 100
+    ) == {
+        "/api/v1/monitor": {
+            "/api/v1/monitor",
+            "/api/v1/monitor/{id}",
+            "/api/v1/monitor/{id}/mute",
+            "/api/v1/monitor/validate",
+        },
+        "/api/v1/monitor/search": {"/api/v1/monitor/search"},
+        "/api/v1/monitor/groups/a": {"/api/v1/monitor/groups/a"},
+        "/api/v1/monitor/groups/b": {"/api/v1/monitor/groups/b"},
+        "/api/v1/users": {"/api/v1/users"},
+    }
+    # big enough sections aren't split
+    assert cmd.get_endpoints_for_sections(
+        list(endpoints_sizes), endpoints_sizes, 300
+    ) == cmd.get_endpoints_for_sections(list(endpoints_sizes))
+
+
+def test_get_max_section_size():
+    endpoints_sizes = {"/a": 100, "/b": 150}
+    assert SplitCommand({}, {}).get_max_section_size(endpoints_sizes) is None
+    cmd = SplitCommand({}, {"max_section_size": 42})
+    assert cmd.get_max_section_size(endpoints_sizes) == 42
+    cmd = SplitCommand({}, {"target_sections": 4})
+    assert cmd.get_max_section_size(endpoints_sizes) == 63
+
+
 def test_get_section_output_path():
     args = flexmock.flexmock()
     cmd = SplitCommand({}, args)
@@ -56,6 +123,26 @@ def test_get_section_output_path():
     assert expected_path == "spec/v1/soups.yaml"
 
 
+def test_get_section_output_paths():
+    cmd = SplitCommand({}, {})
+    sections = [
+        "/api/v1/a/b-c/x",
+        "/api/v1/shared",
+        "/api/v1/Header",
+        "shared",
+        "/api/v1/a/b/c/x",
+        "/api/v1/a/b/c/x_2",
+    ]
+    assert cmd.get_section_output_paths("spec/v1", sections) == {
+        "shared": "spec/v1/shared.yaml",
+        "/api/v1/a/b-c/x": "spec/v1/a_b_c_x.yaml",
+        "/api/v1/shared": "spec/v1/shared_2.yaml",
+        "/api/v1/Header": "spec/v1/Header_2.yaml",
+        "/api/v1/a/b/c/x": "spec/v1/a_b_c_x_2.yaml",
+        "/api/v1/a/b/c/x_2": "spec/v1/a_b_c_x_2_2.yaml",
+    }
+
+
 def test_get_tag_object():
     args = flexmock.flexmock()
     cmd = SplitCommand({}, args)
@@ -83,6 +170,27 @@ def test_deduplicate_tags():
     )  # the current sample yaml does not have shared tags
 
 
+def test_deduplicate_tags_shared():
+    book = {"name": "book", "description": "book information"}
+    store = {"name": "store", "description": "store information"}
+    user = {"name": "user", "description": "user information"}
+    admin = {"name": "admin", "description": "admin information"}
+    all_sections = {
+        "shared": {"components": {"schemas": {}}, "tags": []},
+        "books": {"tags": [book, store]},
+        "stores": {"tags": [user, store, book]},
+        "users": {"tags": [admin, user]},
+    }
+
+    args = flexmock.flexmock()
+    cmd = SplitCommand({}, args)
+    cmd.deduplicate_tags(all_sections, [admin, user, book, store])
+    assert all_sections["shared"]["tags"] == [book, store, user]
+    assert all_sections["books"]["tags"] == []
+    assert all_sections["stores"]["tags"] == []
+    assert all_sections["users"]["tags"] == [admin]
+
+
 def test_update_section_tags():
     args = flexmock.flexmock()
     cmd = SplitCommand({}, args)
@@ -111,6 +219,13 @@ def test_update_section_tags():
         {"name": "book", "description": "book information"}
     ]
 
+    # prebuilt index of tags is used instead of searching the list
+    update_section_tags_section["tags"] = []
+    cmd.update_section_tags(update_section_tags_section, [], cmd.get_tag_index(tags))
+    assert update_section_tags_section["tags"] == [
+        {"name": "book", "description": "book information"}
+    ]
+
 
 def test_update_section_components():
     section = {
@@ -184,3 +299,249 @@ def test_deduplicate_components():
         "components": {"schemas": {}},
         "tags": [],
     }  # current sample yaml has no shared components
+
+
+def test_update_section_components_cycles():
+    def ref(name):
+        return {"$ref": "#/components/schemas/{}".format(name)}
+
+    components = {
+        "schemas": {
+            "Node": {"properties": {"children": {"items": ref("Node")}}},
+            "A": {"properties": {"b": ref("B"), "node": ref("Node")}},
+            "B": {"properties": {"a": ref("A"), "c": ref("C")}},
+            "C": {"type": "string"},
+            "Unused": {"properties": {"a": ref("A")}},
+        }
+    }
+    section = {
+        "paths": {
+            "/a": {"get": {"responses": {"200": {"content": {"schema": ref("B")}}}}},
+            "/missing": {"get": {"requestBody": ref("Missing")}},
+        },
+        "components": {"schemas": {}},
+        "tags": [],
+    }
+
+    args = flexmock.flexmock()
+    cmd = SplitCommand({}, args)
+    graph = ComponentGraph(components)
+    cmd.update_section_components(section, components, graph)
+
+    assert section["components"]["schemas"] == {
+        name: components["schemas"][name] for name in ["A", "B", "C", "Node"]
+    }
+    assert graph.closure(("schemas", "A")) is graph.closure(("schemas", "B"))
+    assert graph.closure(("schemas", "Unused")) == {
+        ("schemas", name) for name in ["Unused", "A", "B", "C", "Node"]
+    }
+
+
+def test_update_section_components_all_fields():
+    components = {
+        "schemas": {
+            "Pet": {"type": "object"},
+            "Cat": {"type": "object"},
+            "Animal": {"discriminator": {"mapping": {"cat": "Cat"}}},
+        },
+        "parameters": {
+            "PetId": {"name": "id", "schema": {"$ref": "#/components/schemas/Pet"}}
+        },
+        "responses": {
+            "Animal": {
+                "content": {"schema": {"$ref": "#/components/schemas/Animal"}},
+                "headers": {"Rate": {"$ref": "#/components/headers/Rate"}},
+            }
+        },
+        "headers": {"Rate": {"schema": {"type": "integer"}}},
+        "securitySchemes": {"key": {"type": "apiKey"}, "other": {"type": "apiKey"}},
+    }
+    section = {
+        "paths": {
+            "/pet/{id}": {
+                "get": {
+                    "parameters": [{"$ref": "#/components/parameters/PetId"}],
+                    "responses": {"200": {"$ref": "#/components/responses/Animal"}},
+                    "security": [{"key": []}],
+                }
+            }
+        },
+        "components": {"schemas": {}},
+        "tags": [],
+    }
+
+    args = flexmock.flexmock()
+    cmd = SplitCommand({}, args)
+    cmd.update_section_components(section, components)
+
+    assert section["components"] == {
+        "schemas": {
+            name: components["schemas"][name] for name in ["Animal", "Cat", "Pet"]
+        },
+        "parameters": components["parameters"],
+        "responses": components["responses"],
+        "headers": components["headers"],
+        "securitySchemes": {"key": components["securitySchemes"]["key"]},
+    }
+
+
+def test_deduplicate_components_all_fields():
+    components = {
+        "schemas": {"Pet": {"type": "object"}, "Error": {"type": "string"}},
+        "responses": {"Error": {"description": "error"}},
+    }
+    all_sections = {
+        "shared": {"components": {"schemas": {"Error": {"type": "string"}}}},
+        "pets": {
+            "components": {
+                "schemas": {"Pet": {"type": "object"}, "Error": {"type": "string"}},
+                "responses": {"Error": {"description": "error"}},
+            }
+        },
+        "stores": {
+            "components": {
+                "schemas": {"Pet": {"type": "object"}},
+                "responses": {"Error": {"description": "error"}},
+            }
+        },
+        "users": {"components": {"schemas": {}}},
+    }
+
+    args = flexmock.flexmock()
+    cmd = SplitCommand({}, args)
+    cmd.deduplicate_components(all_sections, components)
+
+    assert all_sections["shared"]["components"] == components
+    assert all_sections["pets"]["components"] == {"schemas": {}}
+    assert all_sections["stores"]["components"] == {"schemas": {}}
+    assert all_sections["users"]["components"] == {"schemas": {}}
+
+
+SPLIT_INPUT_SPEC = """
+openapi: 3.0.0
+info: {title: Pets, version: "1.0"}
+security: [{key: []}]
+paths:
+  /api/v1/pets:
+    get:
+      tags: [pet]
+      responses: {"200": &ok {$ref: "#/components/responses/Pets"}}
+  /api/v1/users:
+    get:
+      tags: [pet, user]
+      parameters: [{$ref: "#/components/parameters/Id"}]
+      responses: {"200": *ok}
+  /api/v1/pets/{id}:
+    delete:
+      tags: [pet]
+      parameters: [{$ref: "#/components/parameters/Id"}]
+      responses: {"204": {description: deleted}}
+components:
+  schemas:
+    Pet: {type: object, properties: {owner: {$ref: "#/components/schemas/User"}}}
+    User: {type: object, properties: {pets: {items: {$ref: "#/components/schemas/Pet"}}}}
+    Unused: {type: string}
+  responses:
+    Pets: {description: pets, content: {a/b: {schema: {$ref: "#/components/schemas/Pet"}}}}
+  parameters:
+    Id: {name: id, in: path, required: true, schema: {type: string}}
+  securitySchemes:
+    key: {type: apiKey, in: header, name: key}
+tags: [{name: pet}, {name: user}]
+"""
+
+
+def test_split_streaming(tmpdir):
+    input_file = tmpdir.join("input.yaml")
+    input_file.write(SPLIT_INPUT_SPEC)
+    outputs = {}
+    for streaming in [False, True]:
+        outdir = tmpdir.mkdir("streaming" if streaming else "loaded")
+        args = {"input_file": str(input_file), "streaming": streaming}
+        cmd = SplitCommand({}, args)
+        if streaming:
+            cmd.split_streaming(str(input_file), str(outdir))
+        else:
+            cmd.split_loaded(str(input_file), str(outdir))
+        outputs[streaming] = {f.basename: f.read() for f in outdir.listdir()}
+
+    assert outputs[True] == outputs[False]
+    assert sorted(outputs[True]) == [
+        "header.yaml",
+        "pets.yaml",
+        "shared.yaml",
+        "users.yaml",
+    ]
+    shared = yaml.safe_load(outputs[True]["shared.yaml"])
+    assert sorted(shared["components"]["schemas"]) == ["Pet", "Unused", "User"]
+    assert sorted(shared["components"]) == [
+        "parameters",
+        "responses",
+        "schemas",
+        "securitySchemes",
+    ]
+    assert shared["tags"] == [{"name": "pet"}]
+    pets = yaml.safe_load(outputs[True]["pets.yaml"])
+    assert sorted(pets["paths"]) == ["/api/v1/pets", "/api/v1/pets/{id}"]
+    assert pets["components"] == {"schemas": {}}
+
+
+def test_split_colliding_sections(tmpdir):
+    input_file = tmpdir.join("input.yaml")
+    input_file.write(
+        yaml.dump(
+            {
+                "openapi": "3.0.0",
+                "paths": {
+                    "/api/v1/a-b": {"get": {}},
+                    "/api/v1/a/b": {"get": {}},
+                    "/api/v1/shared": {"get": {}},
+                },
+                "components": {},
+                "tags": [],
+            }
+        )
+    )
+    for streaming in [False, True]:
+        outdir = tmpdir.mkdir("streaming" if streaming else "loaded")
+        cmd = SplitCommand({}, {})
+        if streaming:
+            cmd.split_streaming(str(input_file), str(outdir))
+        else:
+            cmd.split_loaded(str(input_file), str(outdir))
+        outputs = {f.basename: yaml.safe_load(f.read()) for f in outdir.listdir()}
+        assert sorted(outputs) == [
+            "a_b.yaml",
+            "a_b_2.yaml",
+            "header.yaml",
+            "shared.yaml",
+            "shared_2.yaml",
+        ]
+        assert list(outputs["a_b.yaml"]["paths"]) == ["/api/v1/a-b"]
+        assert list(outputs["a_b_2.yaml"]["paths"]) == ["/api/v1/a/b"]
+        assert list(outputs["shared_2.yaml"]["paths"]) == ["/api/v1/shared"]
+        assert "paths" not in outputs["shared.yaml"]
+
+
+def test_split_streaming_balanced(tmpdir):
+    input_file = tmpdir.join("input.yaml")
+    input_file.write(SPLIT_INPUT_SPEC)
+    outputs = {}
+    for streaming in [False, True]:
+        outdir = tmpdir.mkdir("streaming" if streaming else "loaded")
+        args = {"input_file": str(input_file), "target_sections": 3}
+        cmd = SplitCommand({}, args)
+        if streaming:
+            cmd.split_streaming(str(input_file), str(outdir))
+        else:
+            cmd.split_loaded(str(input_file), str(outdir))
+        outputs[streaming] = {f.basename: f.read() for f in outdir.listdir()}
+
+    assert outputs[True] == outputs[False]
+    assert sorted(outputs[True]) == [
+        "header.yaml",
+        "pets.yaml",
+        "pets_id_.yaml",
+        "shared.yaml",
+        "users.yaml",
+    ]
@@ -0,0 +1,137 @@
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the 3-clause BSD style license (see LICENSE).
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+import os
+import sys
+
+from flexmock import flexmock
+
+from apigentools.commands.templates import TemplatesCommand
+from apigentools.config import TemplatesConfig
+from apigentools.utils import change_cwd
+
+PATCH = """\
+--- a/java/api.mustache
++++ b/java/api.mustache
+@@ -1 +1 @@
+-upstream
++patched
+"""
+
+
+def test_templates_cache(tmpdir):
+    upstream = tmpdir.mkdir("upstream").mkdir("java")
+    upstream.join("api.mustache").write("upstream\n")
+    tmpdir.join("api.patch").write(PATCH)
+    templates_cfg = TemplatesConfig(
+        patches=["api.patch"],
+        source={
+            "type": "directory",
+            "system": True,
+            "directory_path": "upstream",
+            "templates_dir": "java",
+        },
+    )
+    lc = flexmock(
+        language="java",
+        templates_config_for=lambda v: templates_cfg,
+        container_opts_for=lambda v: flexmock(image="apigentools:latest"),
+    )
+    outfile = os.path.join("templates", "java", "v1", "api.mustache")
+
+    with change_cwd(str(tmpdir)):
+        cmd = TemplatesCommand({}, {})
+        assert cmd.templates_for_language_spec_version(lc, "v1") == 0
+        with open(outfile) as f:
+            assert f.read() == "patched\n"
+        (cached,) = tmpdir.join(".apigentools-cache", "templates").listdir()
+        assert cached.join("api.mustache").read() == "patched\n"
+
+        # unchanged templates setup is restored from the cache
+        cached.join("api.mustache").write("from cache\n")
+        assert cmd.templates_for_language_spec_version(lc, "v1") == 0
+        with open(outfile) as f:
+            assert f.read() == "from cache\n"
+
+        # changed source is patched again
+        upstream.join("api.mustache").write("upstream\n\n")
+        assert cmd.templates_for_language_spec_version(lc, "v1") == 0
+        with open(outfile) as f:
+            assert f.read() == "patched\n\n"
+        assert len(tmpdir.join(".apigentools-cache", "templates").listdir()) == 2
+
+        # cache isn't used with --no-cache
+        cmd = TemplatesCommand({}, {"no_cache": True})
+        cached.join("api.mustache").write("from cache\n")
+        upstream.join("api.mustache").write("upstream\n")
+        assert cmd.templates_for_language_spec_version(lc, "v1") == 0
+        with open(outfile) as f:
+            assert f.read() == "patched\n"
+
+
+def test_evict_templates_cache(tmpdir):
+    templates_dir = tmpdir.mkdir("templates")
+    for i in range(4):
+        entry = templates_dir.mkdir(str(i))
+        entry.mkdir("java").join("api.mustache").write("x" * 10)
+        os.utime(str(entry), ns=(i, i))
+    templates_dir.mkdir("4.123.tmp").join("api.mustache").write("x" * 100)
+    os.utime(str(templates_dir.join("0")), ns=(10, 10))
+
+    cmd = TemplatesCommand({}, {})
+    assert cmd.evict_templates_cache(str(templates_dir), 25) == 2
+    assert sorted(e.basename for e in templates_dir.listdir()) == [
+        "0",
+        "3",
+        "4.123.tmp",
+    ]
+    assert cmd.evict_templates_cache(str(tmpdir.join("missing")), 0) == 0
+
+
+def test_resolve_git_committish():
+    sha = "a" * 40
+    cmd = TemplatesCommand({}, {})
+    flexmock(sys.modules[TemplatesCommand.__module__]).should_receive(
+        "run_command"
+    ).never()
+    assert cmd.resolve_git_committish(sha) == sha
+
+    ls_remote = "\n".join(
+        [
+            "b" * 40 + "\trefs/heads/master",
+            "c" * 40 + "\trefs/tags/v5.0.0",
+            "d" * 40 + "\trefs/tags/v5.0.0^{}",
+            "",
+        ]
+    )
+    flexmock(sys.modules[TemplatesCommand.__module__]).should_receive(
+        "run_command"
+    ).and_return(flexmock(stdout=ls_remote))
+    assert cmd.resolve_git_committish("master") == "b" * 40
+    assert cmd.resolve_git_committish("v5.0.0") == "d" * 40
+    # abbreviated SHAs and relative revisions can't be resolved remotely
+    assert cmd.resolve_git_committish("abc123") is None
+
+
+def test_templates_cache_key_git_branch():
+    templates_cfg = TemplatesConfig(
+        patches=[],
+        source={
+            "type": "openapi-git",
+            "git_committish": "master",
+            "templates_dir": "java",
+        },
+    )
+    cmd = TemplatesCommand({}, {})
+    commits = iter(["b" * 40, "b" * 40, "e" * 40])
+    flexmock(cmd).should_receive("resolve_git_committish").replace_with(
+        lambda committish: next(commits)
+    )
+    first = cmd.get_templates_cache_key(None, "v1", templates_cfg)
+    assert cmd.get_templates_cache_key(None, "v1", templates_cfg) == first
+    # the branch moved, templates are patched again
+    assert cmd.get_templates_cache_key(None, "v1", templates_cfg) != first
+
+    flexmock(cmd).should_receive("resolve_git_committish").and_return(None)
+    assert cmd.get_templates_cache_key(None, "v1", templates_cfg) is None
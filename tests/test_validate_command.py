@@ -46,12 +46,12 @@ def test_spec_filtering():
     val_command.validate_spec = validate_spec
 
     flexmock(sys.modules["apigentools.commands.validate"]).should_receive(
-        "write_full_spec"
+        "write_full_specs"
     )
 
     val_command.run()
 
-    assert calls == [(None, "test-lang1", "v1")]
+    assert calls == [("spec/v1/full_spec.yaml", "test-lang1", "v1")]
 
 
 def test_validate_with_config():
@@ -67,16 +67,16 @@ def test_validate_with_config():
     val_command.validate_spec = validate_spec
 
     flexmock(sys.modules["apigentools.commands.validate"]).should_receive(
-        "write_full_spec"
+        "write_full_specs"
     )
 
     val_command.run()
 
     assert calls == [
-        (None, "test-lang1", "v1"),
-        (None, "test-lang1", "v2"),
-        (None, "test-lang2", "v1"),
-        (None, "test-lang3", "v1"),
+        ("spec/v1/full_spec.yaml", "test-lang1", "v1"),
+        ("spec/v2/full_spec.yaml", "test-lang1", "v2"),
+        ("spec/v1/full_spec.test-lang2.yaml", "test-lang2", "v1"),
+        ("spec/v1/full_spec.test-lang3.yaml", "test-lang3", "v1"),
     ]
 
 
@@ -94,14 +94,14 @@ def test_spec_filtering_regression(file):
     val_command.validate_spec = validate_spec
 
     flexmock(sys.modules["apigentools.commands.validate"]).should_receive(
-        "write_full_spec"
+        "write_full_specs"
     )
 
     val_command.run()
 
     assert calls == [
-        (None, "test-lang1", "v1"),
-        (None, "test-lang1", "v2"),
-        (None, "test-lang2", "v1"),
-        (None, "test-lang3", "v1"),
+        ("spec/v1/full_spec.yaml", "test-lang1", "v1"),
+        ("spec/v2/full_spec.yaml", "test-lang1", "v2"),
+        ("spec/v1/full_spec.test-lang2.yaml", "test-lang2", "v1"),
+        ("spec/v1/full_spec.test-lang3.yaml", "test-lang3", "v1"),
     ]
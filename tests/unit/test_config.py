@@ -247,3 +247,31 @@ def test_config_from_dict():
 def test_config_from_file():
     c = Config.from_file(os.path.join(FIXTURE_DIR, "good_config_yaml.yaml"))
     check_config(c)
+
+
+def test_operation_filter_for():
+    c = Config.from_dict(
+        {
+            "languages": {
+                "go": {
+                    "operations": {
+                        "default": {"exclude_tags": ["Internal"]},
+                        "v2": {"include_operation_ids": ["listUsers"]},
+                    },
+                },
+                "java": {"operations": {"v1": {}}},
+            },
+            "spec_versions": ["v1", "v2"],
+        }
+    )
+    go = c.get_language_config("go")
+    assert go.operation_filter_for("v1").exclude_tags == ["Internal"]
+    assert go.operation_filter_for("v2").dict() == {
+        "include_tags": [],
+        "exclude_tags": [],
+        "include_operation_ids": ["listUsers"],
+        "exclude_operation_ids": [],
+    }
+    java = c.get_language_config("java")
+    assert java.operation_filter_for("v1") is None
+    assert java.operation_filter_for("v2") is None
@@ -0,0 +1,135 @@
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the 3-clause BSD style license (see LICENSE).
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+import os
+import subprocess
+
+import flexmock
+import pytest
+
+from apigentools import git_metadata
+from apigentools.git_metadata import GitMetadata, clear_git_metadata_cache
+
+
+def git(repo, *args):
+    return subprocess.run(
+        ["git", "-C", str(repo)] + list(args),
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+        env=dict(
+            os.environ,
+            GIT_AUTHOR_NAME="a",
+            GIT_AUTHOR_EMAIL="a@b.c",
+            GIT_COMMITTER_NAME="a",
+            GIT_COMMITTER_EMAIL="a@b.c",
+        ),
+    ).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmpdir):
+    repo = tmpdir.mkdir("repo")
+    git(repo, "init", "-q", "-b", "master")
+    git(repo, "commit", "-q", "--allow-empty", "-m", "first")
+    git(repo, "tag", "v1")
+    clear_git_metadata_cache()
+    yield repo
+    clear_git_metadata_cache()
+
+
+def test_head_commit(repo):
+    flexmock.flexmock(git_metadata).should_receive("_run_git").never()
+    head = git(repo, "rev-parse", "HEAD")
+    assert GitMetadata(str(repo)).head_commit() == head
+    assert GitMetadata(str(repo.mkdir("subdir"))).head_commit() == head
+
+    # packed refs
+    git(repo, "pack-refs", "--all")
+    assert GitMetadata(str(repo)).head_commit() == head
+
+    # detached HEAD
+    git(repo, "commit", "-q", "--allow-empty", "-m", "second")
+    git(repo, "checkout", "-q", "--detach", "HEAD~1")
+    assert GitMetadata(str(repo)).head_commit() == head
+
+
+def test_head_commit_memoized(repo):
+    metadata = GitMetadata.for_path(str(repo))
+    head = metadata.head_commit()
+    git(repo, "commit", "-q", "--allow-empty", "-m", "second")
+    assert GitMetadata.for_path(str(repo)) is metadata
+    assert metadata.head_commit() == head
+    clear_git_metadata_cache()
+    assert GitMetadata.for_path(str(repo)).head_commit() != head
+
+
+def test_head_commit_worktree(repo, tmpdir):
+    git(repo, "worktree", "add", "-q", "-b", "feature", str(tmpdir.join("worktree")))
+    git(tmpdir.join("worktree"), "commit", "-q", "--allow-empty", "-m", "second")
+    assert GitMetadata(str(tmpdir.join("worktree"))).head_commit() == git(
+        tmpdir.join("worktree"), "rev-parse", "HEAD"
+    )
+    assert GitMetadata(str(repo)).head_commit() == git(repo, "rev-parse", "HEAD")
+
+
+def test_head_commit_not_repository(tmpdir):
+    flexmock.flexmock(git_metadata).should_receive("_run_git").never()
+    assert GitMetadata(str(tmpdir.mkdir("empty"))).head_commit() is None
+
+
+def test_head_commit_fallback(repo, monkeypatch):
+    monkeypatch.setenv("GIT_DIR", str(repo.join(".git")))
+    assert GitMetadata(str(repo)).head_commit() == git(repo, "rev-parse", "HEAD")
+
+
+def test_short_head_commit(repo, monkeypatch):
+    monkeypatch.setenv("HOME", str(repo))
+    monkeypatch.delenv("XDG_CONFIG_HOME", raising=False)
+    flexmock.flexmock(git_metadata).should_receive("_run_git").never()
+    short = git(repo, "rev-parse", "--short", "HEAD")
+    assert len(short) == 7
+    assert GitMetadata(str(repo)).short_head_commit() == short
+
+    # loose object sharing a longer prefix
+    head = git(repo, "rev-parse", "HEAD")
+    repo.join(".git", "objects", head[:2], head[2:9] + "0" * 29 + "ab").ensure()
+    assert GitMetadata(str(repo)).short_head_commit() == head[:10]
+    assert git(repo, "rev-parse", "--short", "HEAD") == head[:10]
+
+    # packed objects and core.abbrev
+    git(repo, "repack", "-a", "-d", "-q")
+    git(repo, "config", "core.abbrev", "12")
+    assert GitMetadata(str(repo)).short_head_commit() == head[:12]
+    assert git(repo, "rev-parse", "--short", "HEAD") == head[:12]
+    git(repo, "config", "core.abbrev", "no")
+    assert GitMetadata(str(repo)).short_head_commit() == head
+
+
+def test_short_head_commit_fallback(repo, tmpdir, monkeypatch):
+    monkeypatch.setenv("HOME", str(repo))
+    repo.join(".git", "objects", "info", "alternates").ensure()
+    flexmock.flexmock(git_metadata).should_call("_run_git").once()
+    assert GitMetadata(str(repo)).short_head_commit() == git(
+        repo, "rev-parse", "--short", "HEAD"
+    )
+    assert GitMetadata(str(tmpdir.mkdir("empty"))).short_head_commit() is None
+
+
+@pytest.mark.parametrize(
+    "revision, expected",
+    [
+        ("master", True),
+        ("refs/heads/master", True),
+        ("v1", True),
+        ("HEAD", True),
+        ("nonexistent", False),
+        ("HEAD~1", False),
+    ],
+)
+def test_has_revision(repo, revision, expected):
+    metadata = GitMetadata(str(repo))
+    assert metadata.has_revision(revision) == expected
+    git(repo, "pack-refs", "--all")
+    assert metadata.has_revision(revision) == expected
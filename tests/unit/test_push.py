@@ -6,45 +6,41 @@ import subprocess
 
 import flexmock
 
-from apigentools import utils
 from apigentools.commands.push import PushCommand
+from apigentools.git_metadata import GitMetadata
 
 
 def test_get_push_branch():
-    # test with branch in args
+    # test with existing default branch
     default_branch = "default_branch"
     args = {"default_branch": default_branch}
-    a_hash = "a_hash"
-    push_branch = "push_branch"
 
-    mock_utils = flexmock(utils)
-    mock_utils.should_call("run_command")
-    mock_utils.should_receive("run_command").with_args(
-        "git", "rev-parse", "--verify", push_branch
-    ).and_return(a_hash)
+    flexmock.flexmock(GitMetadata).should_receive("has_revision").with_args(
+        default_branch
+    ).and_return(True)
 
     lang_name = "lang_name"
     cmd = PushCommand({}, args)
 
     branch = cmd.get_push_branch(lang_name)
 
-    assert branch == default_branch
+    assert lang_name in branch
 
 
-def test_get_push_branch_subprocess_error():
+def test_get_push_branch_nonexistent():
     default_branch = "default_branch"
     args = {"default_branch": default_branch}
 
-    flexmock(subprocess).should_receive("run").and_return(
-        subprocess.CalledProcessError(1, 1)
-    )
+    flexmock.flexmock(GitMetadata).should_receive("has_revision").with_args(
+        default_branch
+    ).and_return(False)
 
     lang_name = "lang_name"
     cmd = PushCommand({}, args)
 
     branch = cmd.get_push_branch(lang_name)
 
-    assert lang_name in branch
+    assert branch == default_branch
 
 
 def test_git_status_empty_false():
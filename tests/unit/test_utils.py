@@ -3,32 +3,50 @@
 # This product includes software developed at Datadog (https://www.datadoghq.com/).
 # Copyright 2019-Present Datadog, Inc.
 import copy
+import datetime
+import io
+import json
 import logging
 import os
+import pickle
 import subprocess
 
 import flexmock
 import pytest
 import yaml
-from yaml import CSafeLoader
+from yaml import CSafeDumper, CSafeLoader
 
+from apigentools import utils
 from apigentools.constants import REDACTED_OUT_SECRET
 from apigentools.errors import SpecSectionNotFoundError
+from apigentools.git_metadata import GitMetadata
 from apigentools.utils import (
     change_cwd,
+    clear_spec_sections_cache,
+    dump_full_spec,
     env_or_val,
+    evict_parsed_cache,
+    filter_operations,
     fmt_cmd_out_for_log,
     get_current_commit,
+    get_full_spec_file_name_for_format,
     glob_re,
+    load_spec_sections,
     log,
     logging_enabled,
+    prune_keys,
+    prune_unused_components,
     run_command,
     set_log,
     set_log_level,
+    SpecMerger,
     validate_duplicates,
     write_full_spec,
+    write_full_specs,
 )
 
+SHARED_OBJECT = {"get": {"operationId": "shared"}}
+
 
 @pytest.mark.parametrize(
     "env_var, default, args, typ, kwargs, set_env_to, expected",
@@ -142,10 +160,10 @@ def test_get_current_commit(caplog, tmpdir):
         get_current_commit(target_dir)
         for record in caplog.records:
             assert "Failed getting current git commit" in record
-    flexmock(subprocess).should_receive("run").and_return(
-        subprocess.CompletedProcess(1, 0, "some_hash")
+    flexmock.flexmock(GitMetadata).should_receive("short_head_commit").and_return(
+        "some_ha"
     )
-    assert get_current_commit(".") == "some_hash"
+    assert get_current_commit(".") == "some_ha"
 
 
 def test_validate_duplicates():
@@ -198,7 +216,8 @@ def test_set_log_default(caplog):
         assert "INFO" in record
 
 
-def test_write_full_spec(tmpdir):
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_full_spec(tmpdir, jobs):
     s1 = {
         "components": {
             "schemas": {
@@ -292,12 +311,34 @@ def test_write_full_spec(tmpdir):
         "v1",
         ["header.yaml", "s1.yaml", "s2.yaml"],
         os.path.join(str(versiondir), "full.yaml"),
+        jobs=jobs,
     )
 
     with open(written, "r") as f:
         assert yaml.load(f, Loader=CSafeLoader) == expected
 
 
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_full_spec_duplicates(tmpdir, jobs):
+    s1 = {"components": {"schemas": {"MySchema": {"type": "object"}}}}
+    s2 = {"components": {"schemas": {"MySchema": {"type": "string"}}}}
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    for name, section in [("s1.yaml", s1), ("s2.yaml", s2)]:
+        with open(str(versiondir.join(name)), "w") as f:
+            yaml.dump(section, f)
+
+    with pytest.raises(ValueError) as e:
+        write_full_spec(
+            str(specdir),
+            "v1",
+            ["s1.yaml", "s2.yaml"],
+            str(versiondir.join("full.yaml")),
+            jobs=jobs,
+        )
+    assert str(e.value) == "Duplicate field MySchema found in spec. Exiting"
+
+
 def test_write_full_spec_section_not_found(tmpdir):
     specdir = tmpdir.mkdir("spec")
     v1dir = specdir.mkdir("v1")
@@ -422,6 +463,563 @@ def test_write_full_spec_filter(tmpdir):
         assert yaml.load(f, Loader=CSafeLoader) == expected
 
 
+def test_write_full_spec_fingerprint(tmpdir):
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    cache_dir = str(tmpdir.join(".apigentools-cache"))
+    section = versiondir.join("s1.yaml")
+    full = str(versiondir.join("full.yaml"))
+    section.write(yaml.dump({"paths": {"/foo": {"get": {"operationId": "getFoo"}}}}))
+
+    def load_calls():
+        return flexmock.flexmock(utils).should_call("load_spec_sections")
+
+    load_calls().once()
+    write_full_spec(str(specdir), "v1", ["s1.yaml"], full, cache_dir=cache_dir)
+
+    # unchanged inputs => merge is skipped
+    load_calls().never()
+    write_full_spec(str(specdir), "v1", ["s1.yaml"], full, cache_dir=cache_dir)
+
+    # changed filter => merge again
+    load_calls().once()
+    write_full_spec(
+        str(specdir), "v1", ["s1.yaml"], full, ["x-foo"], cache_dir=cache_dir
+    )
+
+    # changed section => merge again
+    section.write(yaml.dump({"paths": {"/bar": {"get": {"operationId": "getBar"}}}}))
+    load_calls().once()
+    write_full_spec(
+        str(specdir), "v1", ["s1.yaml"], full, ["x-foo"], cache_dir=cache_dir
+    )
+    with open(full) as f:
+        assert list(yaml.load(f, Loader=CSafeLoader)["paths"]) == ["/bar"]
+
+    # modified output => merge again
+    with open(full, "a") as f:
+        f.write("x-modified: true\n")
+    load_calls().once()
+    write_full_spec(
+        str(specdir), "v1", ["s1.yaml"], full, ["x-foo"], cache_dir=cache_dir
+    )
+
+
+def test_load_spec_sections_parses_once(tmpdir):
+    clear_spec_sections_cache()
+    section = tmpdir.join("s1.yaml")
+    section.write(yaml.dump({"paths": {"/foo": {"get": {"x-foo": "bar"}}}}))
+
+    flexmock.flexmock(utils).should_call("_parse_spec_section").once()
+    first, second = load_spec_sections([str(section), str(section)])
+    assert first == second
+    # returned sections are independent copies
+    first["paths"]["/foo"]["get"]["x-foo"] = "modified"
+    assert load_spec_sections([str(section)], ["x-foo"]) == [
+        {"paths": {"/foo": {"get": {}}}}
+    ]
+    assert load_spec_sections([str(section)])[0] == second
+
+    # modified file is parsed again
+    utils.spec_section_digest(str(section))
+    section.write(yaml.dump({"paths": {}}))
+    os.utime(str(section), ns=(0, 0))
+    flexmock.flexmock(utils).should_call("_parse_spec_section").once()
+    assert load_spec_sections([str(section)]) == [{"paths": {}}]
+    # only the latest version of the file is kept in memory
+    utils.spec_section_digest(str(section))
+    assert len(utils._parsed_spec_sections) == 1
+    assert len(utils._spec_section_digests) == 1
+
+
+def test_load_spec_sections_disk_cache(tmpdir, caplog):
+    caplog.set_level(logging.DEBUG, logger=log.name)
+    clear_spec_sections_cache()
+    cache_dir = str(tmpdir.join(".apigentools-cache"))
+    section = tmpdir.join("s1.yaml")
+    section.write(yaml.dump({"paths": {"/foo": {}}}))
+
+    assert load_spec_sections([str(section)], cache_dir=cache_dir) == [
+        {"paths": {"/foo": {}}}
+    ]
+    assert "Parsed spec sections cache miss" in caplog.text
+    assert len(tmpdir.join(".apigentools-cache", "parsed").listdir()) == 1
+
+    # simulate a new process
+    clear_spec_sections_cache()
+    caplog.clear()
+    flexmock.flexmock(utils).should_receive("_parse_spec_section").never()
+    assert load_spec_sections([str(section)], cache_dir=cache_dir) == [
+        {"paths": {"/foo": {}}}
+    ]
+    assert "Parsed spec sections cache hit" in caplog.text
+
+
+def test_evict_parsed_cache(tmpdir):
+    parsed_dir = tmpdir.mkdir("parsed")
+    for i in range(4):
+        entry = parsed_dir.join("{}.pickle".format(i))
+        entry.write("x" * 10)
+        os.utime(str(entry), ns=(i, i))
+    # "0" was used recently
+    os.utime(str(parsed_dir.join("0.pickle")), ns=(10, 10))
+
+    assert evict_parsed_cache(str(tmpdir), 25) == 2
+    assert sorted(p.basename for p in parsed_dir.listdir()) == [
+        "0.pickle",
+        "3.pickle",
+    ]
+    assert evict_parsed_cache(str(tmpdir), 25) == 0
+
+
+@pytest.mark.parametrize(
+    "full_spec",
+    [
+        {},
+        {"components": {}, "paths": {}, "security": [], "tags": []},
+        {
+            "components": {
+                "schemas": {
+                    "MySchema": {
+                        "description": "a long description " * 10,
+                        "enum": ["yes", "no", "1", 1.5, None, True],
+                    },
+                },
+                "parameters": {},
+            },
+            "info": {"description": "multi\nline\n", "title": "ünicode"},
+            "openapi": "3.0.0",
+            "paths": {"/api/v1/foo": {"get": {"summary": "a: b", "x-empty": ""}}},
+            "tags": [{"name": "foo"}],
+        },
+        # shared objects are emitted as anchors/aliases
+        {"paths": {"/a": SHARED_OBJECT, "/b": SHARED_OBJECT}},
+    ],
+)
+@pytest.mark.parametrize("rendered", [None, {}])
+def test_dump_full_spec(full_spec, rendered):
+    expected = io.StringIO()
+    yaml.dump(full_spec, expected, Dumper=CSafeDumper)
+    result = io.StringIO()
+    dump_full_spec(full_spec, result, rendered=rendered)
+    assert result.getvalue() == expected.getvalue()
+
+
+def test_dump_full_spec_reuses_rendered():
+    full_spec = {
+        "components": {"schemas": {"A": {"type": "string"}, "B": {"type": "object"}}},
+        "openapi": "3.0.0",
+        "paths": {"/a/{id}": {"get": {"summary": "a"}}, "/b": {"get": {}}},
+    }
+    rendered = {}
+    dump_full_spec(full_spec, io.StringIO(), rendered=rendered)
+    unchanged = rendered[("components", "schemas", "A")]
+
+    full_spec["components"]["schemas"]["B"] = {"type": "integer"}
+    full_spec["paths"]["/b"] = {"get": {}, "post": {"summary": "new: post"}}
+    del full_spec["paths"]["/a/{id}"]
+    result = io.StringIO()
+    dump_full_spec(full_spec, result, rendered=rendered)
+    assert result.getvalue() == yaml.dump(full_spec, Dumper=CSafeDumper)
+    assert rendered[("components", "schemas", "A")] is unchanged
+    assert ("paths", "/a/{id}") not in rendered
+
+
+def test_write_full_spec_json(tmpdir):
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    versiondir.join("s1.yaml").write(
+        yaml.dump(
+            {
+                "info": {"x-date": datetime.date(2020, 1, 1)},
+                "paths": {"/foo": {"get": {"responses": {200: {}, "default": {}}}}},
+            }
+        )
+    )
+
+    written = write_full_spec(
+        str(specdir), "v1", ["s1.yaml"], str(versiondir.join("full.json"))
+    )
+    with open(written) as f:
+        loaded = json.load(f)
+    assert loaded["info"] == {"x-date": "2020-01-01"}
+    assert loaded["paths"] == {
+        "/foo": {"get": {"responses": {"200": {}, "default": {}}}}
+    }
+
+
+@pytest.mark.parametrize(
+    "default_fsf, full_spec_format, expected",
+    [
+        ("full_spec.yaml", "yaml", "full_spec.yaml"),
+        ("full_spec.yaml", "json", "full_spec.json"),
+        ("full_spec.yml", "json", "full_spec.json"),
+        ("full_spec.json", "yaml", "full_spec.yaml"),
+        ("full_spec.json", "json", "full_spec.json"),
+        ("full_spec", "json", "full_spec"),
+    ],
+)
+def test_get_full_spec_file_name_for_format(default_fsf, full_spec_format, expected):
+    assert get_full_spec_file_name_for_format(default_fsf, full_spec_format) == expected
+
+
+def test_spec_merger():
+    merger = SpecMerger()
+    merger.add_section(
+        {
+            "openapi": "3.0.0",
+            "security": [{"apiKeyAuth": [], "appKeyAuth": []}],
+            "tags": [{"name": "b"}, {"name": "c"}],
+        }
+    )
+    merger.add_section(
+        {
+            "components": {"parameters": {"P": {"in": "query"}}},
+            "paths": {"/a": {"get": {}}},
+            "security": [{"oauth": ["read"]}],
+            "tags": [{"name": "a"}],
+        }
+    )
+    merger.add_section({"paths": {"/a": {"post": {}}}})
+    full_spec = merger.full_spec()
+    assert full_spec["tags"] == [{"name": "a"}, {"name": "b"}, {"name": "c"}]
+    assert full_spec["security"] == [
+        {"apiKeyAuth": [], "appKeyAuth": []},
+        {"oauth": ["read"]},
+    ]
+    assert full_spec["paths"] == {"/a": {"get": {}, "post": {}}}
+    assert full_spec["components"]["parameters"] == {"P": {"in": "query"}}
+    assert full_spec["openapi"] == "3.0.0"
+
+
+@pytest.mark.parametrize(
+    "section, duplicate",
+    [
+        ({"paths": {"/a": {"get": {}}}}, "get"),
+        ({"tags": [{"name": "b", "description": "other"}]}, "b"),
+        (
+            {"security": [{"appKeyAuth": [], "apiKeyAuth": []}]},
+            "{'appKeyAuth': [], 'apiKeyAuth': []}",
+        ),
+        ({"components": {"schemas": {"S": {}}}}, "S"),
+        ({"openapi": "3.0.1"}, "openapi"),
+    ],
+)
+def test_spec_merger_duplicates(section, duplicate):
+    merger = SpecMerger()
+    merger.add_section(
+        {
+            "components": {"schemas": {"S": {}}},
+            "openapi": "3.0.0",
+            "paths": {"/a": {"get": {}}},
+            "security": [{"apiKeyAuth": [], "appKeyAuth": []}],
+            "tags": [{"name": "b"}],
+        }
+    )
+    with pytest.raises(ValueError) as e:
+        merger.add_section(section)
+    assert str(e.value) == "Duplicate field {} found in spec. Exiting".format(duplicate)
+
+
+def test_spec_merger_replace_sections():
+    sections = {
+        "a.yaml": {
+            "components": {"schemas": {"A": {}, "Moved": {}}},
+            "paths": {"/a": {"get": {}}, "/shared": {"get": {}}},
+            "tags": [{"name": "a"}],
+            "x-a": 1,
+        },
+        "b.yaml": {
+            "components": {"schemas": {"B": {}}},
+            "paths": {"/shared": {"post": {}}},
+            "security": [{"b": []}],
+        },
+        "c.yaml": {"paths": {"/c": {"get": {}}}, "security": [{"c": []}]},
+    }
+    merger = SpecMerger()
+    for name, section in sections.items():
+        merger.add_section(copy.deepcopy(section), name)
+
+    # move a component and a path between sections, drop a key
+    sections["a.yaml"] = {
+        "paths": {"/shared": {"get": {}}},
+        "tags": [{"name": "a"}],
+    }
+    sections["c.yaml"] = {
+        "components": {"schemas": {"Moved": {"type": "object"}}},
+        "paths": {"/a": {"get": {}}, "/c": {"get": {}}},
+        "security": [{"c": []}],
+    }
+    merger.replace_sections(
+        {n: copy.deepcopy(sections[n]) for n in ["c.yaml", "a.yaml"]}
+    )
+
+    expected = SpecMerger()
+    for name, section in sections.items():
+        expected.add_section(copy.deepcopy(section), name)
+    assert list(merger.sections) == ["a.yaml", "b.yaml", "c.yaml"]
+    assert json.dumps(merger.full_spec()) == json.dumps(expected.full_spec())
+
+
+def test_write_full_spec_incremental(tmpdir):
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    cache_dir = str(tmpdir.join(".apigentools-cache"))
+    full = str(versiondir.join("full.yaml"))
+    names = ["s{}.yaml".format(i) for i in range(3)]
+    for i, name in enumerate(names):
+        versiondir.join(name).write(
+            yaml.dump({"paths": {"/p{}".format(i): {"get": {"x-i": i}}}})
+        )
+    write_full_spec(str(specdir), "v1", names, full, cache_dir=cache_dir)
+
+    versiondir.join("s0.yaml").write(
+        yaml.dump({"paths": {"/p0": {"get": {"x-i": "changed"}}, "/new": {}}})
+    )
+    expected = str(versiondir.join("expected.yaml"))
+    write_full_spec(str(specdir), "v1", names, expected)
+
+    # only the contribution index is stored, unchanged sections come from the
+    # parse cache and only the changed one is checked for duplicates
+    (state_path,) = tmpdir.join(".apigentools-cache", "merged").listdir()
+    with open(str(state_path), "rb") as f:
+        assert pickle.load(f)["sections"]["s1.yaml"] == {
+            "paths": {"/p1": ["get"]},
+            "tags": [],
+            "security": [],
+            "components": {},
+            "other": [],
+            "shared_objects": False,
+        }
+    clear_spec_sections_cache()
+    flexmock.flexmock(utils).should_call("_parse_spec_section").with_args(
+        os.path.join(str(versiondir), "s0.yaml")
+    ).once()
+    flexmock.flexmock(utils.SpecMerger).should_call("section_definitions").once()
+    write_full_spec(str(specdir), "v1", names, full, cache_dir=cache_dir)
+    with open(full) as f, open(expected) as e:
+        assert f.read() == e.read()
+
+
+def test_write_full_spec_incremental_duplicates(tmpdir):
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    cache_dir = str(tmpdir.join(".apigentools-cache"))
+    full = str(versiondir.join("full.yaml"))
+    names = ["s{}.yaml".format(i) for i in range(3)]
+    for i, name in enumerate(names):
+        versiondir.join(name).write(
+            yaml.dump({"paths": {"/p{}".format(i): {"get": {"x-i": i}}}})
+        )
+    write_full_spec(str(specdir), "v1", names, full, cache_dir=cache_dir)
+
+    versiondir.join("s0.yaml").write(yaml.dump({"paths": {"/p2": {"get": {}}}}))
+    with pytest.raises(ValueError, match="Duplicate field get"):
+        write_full_spec(str(specdir), "v1", names, full, cache_dir=cache_dir)
+
+
+def test_write_full_specs(tmpdir):
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    sections = {
+        "a.yaml": {"openapi": "3.0.0", "paths": {"/a": {"get": {}}}},
+        "b.yaml": {"components": {"schemas": {"S": {"type": "object"}}}},
+        "c.yaml": {"components": {"schemas": {"S": {"type": "string"}}}},
+    }
+    for name, section in sections.items():
+        versiondir.join(name).write(yaml.dump(section))
+    variants = {
+        str(versiondir.join("full_spec.yaml")): ["a.yaml", "b.yaml"],
+        str(versiondir.join("full_spec.lang.yaml")): ["a.yaml", "c.yaml"],
+    }
+    expected = {}
+    for fs_path, spec_sections in variants.items():
+        write_full_spec(str(specdir), "v1", spec_sections, fs_path)
+        with open(fs_path) as f:
+            expected[fs_path] = f.read()
+
+    conflicting = dict(variants)
+    conflicting[str(versiondir.join("full_spec.other.yaml"))] = ["b.yaml", "c.yaml"]
+    with pytest.raises(ValueError) as e:
+        write_full_specs(str(specdir), "v1", conflicting)
+    assert str(e.value) == "Duplicate field S found in spec. Exiting"
+
+    flexmock.flexmock(utils).should_call("load_spec_sections").with_args(
+        [os.path.join(str(versiondir), name) for name in sections], None, 1, None
+    ).once()
+    assert write_full_specs(str(specdir), "v1", variants) == list(variants)
+    for fs_path in variants:
+        with open(fs_path) as f:
+            assert f.read() == expected[fs_path]
+
+
+def test_prune_keys():
+    shared = {"x-drop": 1, "keep": 2}
+    spec = {
+        "x-drop": {"nested": True},
+        "paths": {
+            "/a": {"get": {"x-drop": "a", "parameters": [{"x-drop": "b"}, [shared]]}}
+        },
+        "other": [shared, "x-drop"],
+    }
+    assert prune_keys(spec, ["x-drop"]) == 4
+    assert spec == {
+        "paths": {"/a": {"get": {"parameters": [{}, [{"keep": 2}]]}}},
+        "other": [{"keep": 2}, "x-drop"],
+    }
+    assert prune_keys(spec, ["x-drop"]) == 0
+
+
+def test_prune_unused_components():
+    full_spec = {
+        "components": {
+            "schemas": {
+                "Used": {"properties": {"a": {"$ref": "#/components/schemas/Nested"}}},
+                "Nested": {"items": {"$ref": "#/components/schemas/Used"}},
+                "A/B": {"type": "string"},
+                "Base": {
+                    "discriminator": {
+                        "mapping": {
+                            "cat": "#/components/schemas/Cat",
+                            "dog": "Dog",
+                        }
+                    }
+                },
+                "Cat": {"type": "object"},
+                "Dog": {"type": "object"},
+                "Unused": {"$ref": "#/components/schemas/AlsoUnused"},
+                "AlsoUnused": {"type": "string"},
+            },
+            "parameters": {
+                "Param": {"schema": {"$ref": "#/components/schemas/A~1B"}},
+                "UnusedParam": {"in": "query"},
+            },
+            "securitySchemes": {
+                "apiKeyAuth": {"type": "apiKey"},
+                "oauth": {"type": "oauth2"},
+                "unusedAuth": {"type": "http"},
+            },
+            "responses": {},
+        },
+        "paths": {
+            "/a": {
+                "get": {
+                    "parameters": [{"$ref": "#/components/parameters/Param"}],
+                    "responses": {
+                        "200": {
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/Used/properties/a"
+                                    }
+                                }
+                            }
+                        },
+                        "400": {"$ref": "#/components/schemas/Base"},
+                    },
+                    "security": [{"oauth": ["read"]}],
+                }
+            }
+        },
+        "security": [{"apiKeyAuth": []}],
+    }
+    original = copy.deepcopy(full_spec)
+
+    pruned, removed = prune_unused_components(full_spec)
+    assert full_spec == original
+    assert removed == {
+        "schemas": ["Unused", "AlsoUnused"],
+        "parameters": ["UnusedParam"],
+        "securitySchemes": ["unusedAuth"],
+    }
+    assert list(pruned["components"]["schemas"]) == [
+        "Used",
+        "Nested",
+        "A/B",
+        "Base",
+        "Cat",
+        "Dog",
+    ]
+    assert pruned["components"]["responses"] == {}
+    assert pruned["paths"] is full_spec["paths"]
+
+
+@pytest.mark.parametrize(
+    "operation_filter, paths, tags, schemas",
+    [
+        ({}, {"/a": ["get", "post"], "/b": ["get"]}, ["A", "B"], ["S", "T", "U"]),
+        ({"include_tags": ["A"]}, {"/a": ["get", "post"]}, ["A"], ["S", "U"]),
+        ({"exclude_tags": ["B"]}, {"/a": ["get", "post"]}, ["A"], ["S", "U"]),
+        # S is still used through T
+        ({"include_tags": ["B"]}, {"/b": ["get"]}, ["B"], ["S", "T", "U"]),
+        (
+            {"include_tags": ["A"], "exclude_operation_ids": ["postA"]},
+            {"/a": ["get"]},
+            ["A"],
+            ["S", "U"],
+        ),
+        (
+            {"include_operation_ids": ["postA", "getB"]},
+            {"/a": ["post"], "/b": ["get"]},
+            ["A", "B"],
+            ["S", "T", "U"],
+        ),
+    ],
+)
+def test_filter_operations(operation_filter, paths, tags, schemas):
+    def ref(name):
+        return {"$ref": "#/components/schemas/{}".format(name)}
+
+    full_spec = {
+        "components": {
+            "schemas": {
+                "S": {"type": "string"},
+                "T": {"items": ref("S")},
+                # unused by any operation, so it's never removed
+                "U": {"type": "string"},
+            }
+        },
+        "paths": {
+            "/a": {
+                "parameters": [],
+                "get": {"operationId": "getA", "tags": ["A"], "x-schema": ref("S")},
+                "post": {"operationId": "postA", "tags": ["A"]},
+            },
+            "/b": {"get": {"operationId": "getB", "tags": ["B"], "x-schema": ref("T")}},
+        },
+        "tags": [{"name": "A"}, {"name": "B"}],
+    }
+    filtered, removed = filter_operations(full_spec, operation_filter)
+    assert {
+        p: [k for k in v if k != "parameters"] for p, v in filtered["paths"].items()
+    } == paths
+    assert [t["name"] for t in filtered["tags"]] == tags
+    assert list(filtered["components"]["schemas"]) == schemas
+    assert len(removed.get("operations", [])) == 3 - sum(map(len, paths.values()))
+    assert len(full_spec["paths"]) == 2
+
+
+def test_write_full_spec_prune_components(tmpdir, caplog):
+    specdir = tmpdir.mkdir("spec")
+    versiondir = specdir.mkdir("v1")
+    versiondir.join("s1.yaml").write(
+        yaml.dump(
+            {
+                "components": {"schemas": {"Used": {}, "Unused": {}}},
+                "paths": {"/a": {"get": {"$ref": "#/components/schemas/Used"}}},
+            }
+        )
+    )
+    full = str(versiondir.join("full.yaml"))
+    caplog.set_level(logging.INFO)
+
+    write_full_spec(str(specdir), "v1", ["s1.yaml"], full, prune_components=True)
+    with open(full) as f:
+        assert yaml.load(f, Loader=CSafeLoader)["components"]["schemas"] == {"Used": {}}
+    assert "Removed 1 unused components from {}".format(full) in caplog.text
+    assert "Unused schemas: Unused" in caplog.text
+
+
 @pytest.mark.parametrize(
     "glob_pattern, regex, expected",
     [
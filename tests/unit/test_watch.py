@@ -0,0 +1,77 @@
+# Unless explicitly stated otherwise all files in this repository are licensed
+# under the 3-clause BSD style license (see LICENSE).
+# This product includes software developed at Datadog (https://www.datadoghq.com/).
+# Copyright 2019-Present Datadog, Inc.
+import os
+
+import pytest
+
+from apigentools import watch
+
+
+def get_inotify_watcher(directories):
+    try:
+        return watch.InotifyWatcher(directories)
+    except (AttributeError, OSError) as e:
+        pytest.skip("inotify is not available: {}".format(e))
+
+
+@pytest.mark.parametrize("get_watcher", [watch.PollingWatcher, get_inotify_watcher])
+def test_watcher(tmpdir, get_watcher):
+    spec_dir = tmpdir.mkdir("v1")
+    existing = spec_dir.join("existing.yaml")
+    existing.write("a: 1\n")
+    removed = spec_dir.join("removed.yaml")
+    removed.write("b: 1\n")
+    spec_dir.mkdir("nested")
+
+    with get_watcher([str(spec_dir)]) as watcher:
+        assert watcher.poll(0) == set()
+
+        # make sure the change is visible even with low resolution of mtime
+        existing.write("a: 2\n")
+        os.utime(str(existing), ns=(0, 0))
+        removed.remove()
+        spec_dir.join("nested", "new.yaml").write("c: 1\n")
+        assert watcher.wait() == {
+            str(existing),
+            str(removed),
+            str(spec_dir.join("nested", "new.yaml")),
+        }
+
+        spec_dir.mkdir("new_dir").join("new.yaml").write("d: 1\n")
+        assert str(spec_dir.join("new_dir", "new.yaml")) in watcher.wait()
+        spec_dir.join("new_dir", "other.yaml").write("e: 1\n")
+        assert watcher.wait() == {str(spec_dir.join("new_dir", "other.yaml"))}
+
+
+def test_inotify_watcher_removed_directory(tmpdir):
+    spec_dir = tmpdir.mkdir("v1")
+    with get_inotify_watcher([str(spec_dir)]) as watcher:
+        # directory removed before its creation event is read
+        spec_dir.mkdir("tmpdir").remove()
+        assert watcher.poll(1) == set()
+
+        spec_dir.mkdir("dir").join("new.yaml").write("a: 1\n")
+        assert str(spec_dir.join("dir", "new.yaml")) in watcher.wait()
+        spec_dir.join("dir").remove()
+        assert str(spec_dir.join("dir", "new.yaml")) in watcher.wait()
+        assert str(spec_dir.join("dir")) not in watcher.watches.values()
+
+
+def test_inotify_watcher_overflow(tmpdir):
+    spec_dir = tmpdir.mkdir("v1")
+    spec_dir.join("a.yaml").write("a: 1\n")
+    nested = spec_dir.mkdir("nested")
+    nested.join("b.yaml").write("b: 1\n")
+    with get_inotify_watcher([str(spec_dir)]) as watcher:
+        overflow = watcher.EVENT_HEADER.pack(-1, watcher.IN_Q_OVERFLOW, 0, 0)
+        rfd, wfd = os.pipe()
+        os.write(wfd, overflow)
+        os.close(wfd)
+        watcher.close()
+        watcher.fd = rfd
+        assert watcher.poll(1) == {
+            str(spec_dir.join("a.yaml")),
+            str(nested.join("b.yaml")),
+        }